@@ -1,20 +1,33 @@
 import uvicorn
-import os, sys, signal, time, logging, asyncio, json, psutil
+import os, sys, signal, time, logging, asyncio, json, psutil, threading
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from contextlib import asynccontextmanager
 
 from src.orchestrator import Orchestrator
-from src.utils.webserver import integrate_web_interface, set_core_reference
+from src.database import read_config
+from src.utils.webserver import integrate_web_interface, set_core_reference, sse_pipeline_response, record_traffic
 from src.utils.monitor import SoulCoreMonitor
+from src.utils.event_log import get_event_log
+from src.utils.telemetry import TelemetrySampler
+
+# Az indítási idővonal "import" fázisának vége
+IMPORTS_DONE = time.time()
 
 # --- Globális Entitások ---
 core: Orchestrator = None
 monitor: SoulCoreMonitor = None
+heartbeat_task = None
+# A boot szál (Orchestrator + boot_slots) nem szakítható meg task.cancel()-lel: leállításkor
+# a boot_stop jelzésre a slotok között megáll, a lifespan pedig megvárja a boot_future-t
+boot_stop = threading.Event()
+boot_future = None
+telemetry: TelemetrySampler = None
 consecutive_errors = 0
 ERROR_THRESHOLD = 3
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
 
 # --- Intelligens Forgalomszabályozó ---
 class TrafficController:
@@ -34,7 +47,7 @@ traffic = TrafficController()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global core, monitor
+    global monitor, telemetry
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -42,34 +55,73 @@ async def lifespan(app: FastAPI):
     
     print("\n" + "═"*60 + "\n    SOULCORE 2.1 - SZUVERÉN KERNEL AKTIVÁLÁSA\n" + "═"*60)
     
-    try:
-        monitor = SoulCoreMonitor()
-        core = Orchestrator()
-        core.start_time = time.time()
-        
+    # A kernel a háttérben ébred: a socket azonnal figyel, addig a végpontok "starting" / 503 választ adnak
+    # Esemény napló (storage.event_log): háttérszálas, kötegelt írás; a monitor ebbe naplóz
+    log_cfg = (read_config("storage") or {}).get("event_log", {})
+    get_event_log(max_bytes=int(log_cfg.get("max_mb", 10) * 1024**2),
+                  backup_count=log_cfg.get("backups", 5),
+                  ring_size=log_cfg.get("ring_size", 1000))
+    monitor = SoulCoreMonitor()
+    # Háttér mintavételezés: a /status és a heartbeat a legutóbbi pillanatképet kapja
+    tel_cfg = (read_config("hardware") or {}).get("telemetry", {})
+    telemetry = TelemetrySampler(monitor,
+                                 interval_sec=tel_cfg.get("interval_sec", 1.0),
+                                 history_sec=tel_cfg.get("history_sec", 3600)).start()
+    boot_task = asyncio.create_task(boot_kernel())
+    yield
+    
+    boot_stop.set()
+    boot_task.cancel()
+    telemetry.stop()
+    if heartbeat_task: heartbeat_task.cancel()
+    print("\n" + "═"*60 + "\n    LEÁLLÍTÁSI SZEKVENCIA - VRAM ÜRÍTÉSE\n" + "═"*60)
+    instance = core
+    if instance is None and boot_future is not None:
+        # Boot közbeni leállítás: a betöltés alatt álló slot végéig várunk, utána ürítünk
+        try:
+            instance = await boot_future
+        except Exception:
+            instance = None
+    if instance: await asyncio.to_thread(instance.shutdown)
+    monitor.events.flush()
+
+def _boot_sync():
+    """A blokkoló boot lépések a boot szálon."""
+    instance = Orchestrator()
+    instance.timeline.record("import", instance.timeline.origin, IMPORTS_DONE)
+    instance.start_time = time.time()
+    instance.telemetry = telemetry
+    if not boot_stop.is_set():
         print("Slotok ébresztése és GGUF modellek előkészítése...")
-        core.boot_slots()
+        instance.boot_slots(stop=boot_stop)
+    return instance
+
+async def boot_kernel():
+    """Orchestrator + slotok betöltése szálon; a core csak a teljes boot után válik láthatóvá."""
+    global core, heartbeat_task, boot_future
+    try:
+        boot_future = asyncio.get_running_loop().run_in_executor(None, _boot_sync)
+        # shield: a task megszakítása ne tegye várhatatlanná a még futó boot szálat
+        instance = await asyncio.shield(boot_future)
+        if boot_stop.is_set():
+            return  # a lifespan leállítja
         
         # --- FEEDBACK CIKLUS ---
-        for name, slot in core.slots.items():
+        for name, slot in instance.slots.items():
             status = "✅ Aktív" if getattr(slot, 'is_loaded', False) else "⚠️ Inaktív/Hiba"
             print(f"[{name.upper()}] status: {status}")
         
+        core = instance
         set_core_reference(core)
         heartbeat_task = asyncio.create_task(heartbeat_loop())
         
         print(f"\n✅ SoulCore Kernel Online. Üdvözöllek, Grumpy.")
-        yield
-        
-        heartbeat_task.cancel()
-        print("\n" + "═"*60 + "\n    LEÁLLÍTÁSI SZEKVENCIA - VRAM ÜRÍTÉSE\n" + "═"*60)
-        if core: core.shutdown()
-        
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         print(f"❌ KRITIKUS KERNEL HIBA: {e}")
         import traceback
         traceback.print_exc()
-        yield
 
 async def heartbeat_loop():
     """Folyamatos ellenőrzés: Slotok, VRAM és Önvizsgálat."""
@@ -81,20 +133,21 @@ async def heartbeat_loop():
             await asyncio.sleep(5)
             
             if core and monitor:
-                # JAVÍTVA: Az új hardver-lekérdező metódus használata
-                current_stats = monitor.get_hardware_stats()
+                # A mintavételező legutóbbi pillanatképe (nincs újabb NVML / psutil lekérdezés)
+                current_stats = telemetry.latest()
                 core.last_hw_stats = current_stats 
                 
-                # Slot figyelő
-                for name, slot in core.slots.items():
-                    if getattr(slot, 'enabled', False) and not getattr(slot, 'is_loaded', False):
-                        monitor.log_event("Kernel", f"Slot elakadás: {name}. Újraélesztés...", "warning")
-                        try: slot.load()
-                        except: pass
+                # Slot figyelő: csak a rögzített slotok (King) kötelezőek, a többi igény szerint töltődik
+                for name in await asyncio.to_thread(core.slot_manager.revive_pinned):
+                    monitor.log_event("Kernel", f"Slot elakadás: {name}. Újraélesztve.", "warning")
 
-                # VRAM Védelem
-                if not monitor.check_vram_safety(threshold_pct=95.0):
-                    monitor.log_event("Kernel", "VRAM KRITIKUS! Puffer ürítése javasolt.", "critical")
+                # VRAM Védelem: csak a szorongatott GPU legrégebben használt tétlen slotja ürül
+                # (a következő kérés szükség esetén visszatölti)
+                for dev in current_stats or []:
+                    if dev.get("type") == "gpu" and dev.get("vram_usage_pct", 0) > 95.0:
+                        freed = await asyncio.to_thread(core.slot_manager.relieve_pressure, dev.get("index"))
+                        monitor.log_event("Kernel", f"VRAM KRITIKUS (GPU {dev.get('index')}: {dev['vram_usage_pct']}%)! "
+                                                    f"Ürítve: {', '.join(freed) or 'nincs üríthető slot'}", "critical")
 
                 # Kognitív ciklus (percenként)
                 reflection_counter += 1
@@ -129,7 +182,7 @@ async def status(request: Request):
     return {
         "status": "online",
         "identity": core.identity,
-        "hardware": core.last_hw_stats if hasattr(core, 'last_hw_stats') else [],
+        "hardware": telemetry.latest() if telemetry else [],
         "kernel": {
             "uptime": round(time.time() - core.start_time, 1),
             "slots_active": sum(1 for s in core.slots.values() if getattr(s, 'is_loaded', False)),
@@ -146,23 +199,86 @@ async def kernel_health(request: Request):
         "memory_rss_mb": process.memory_info().rss // 1024**2,
         "cpu_threads": process.num_threads(),
         "uptime_sec": round(time.time() - (core.start_time if core else time.time()), 1),
-        "requests_total": traffic.request_count
+        "requests_total": traffic.request_count,
+        "embedding": core.db.embedding_stats() if core else {},
+        "semantic_cache": core.semantic_cache.stats() if core and core.semantic_cache else {"enabled": False},
+        "stage_memo": core.stage_memo.stats() if core and core.stage_memo else {"enabled": False},
+        "traffic_recorder": core.traffic_recorder.stats() if core and core.traffic_recorder else {"enabled": False}
     }
 
+@app.get("/kernel/startup")
+async def kernel_startup(request: Request):
+    """Indítási idővonal: import, DB, slot betöltések, embedding / reranker bemelegítés."""
+    if "user" not in request.session: raise HTTPException(status_code=401)
+    if not core: return {"status": "starting"}
+    return core.timeline.report()
+
+@app.get("/kernel/config")
+async def kernel_config(request: Request):
+    """A teljes rendszer konfig (a memóriabeli cache-ből)."""
+    if "user" not in request.session: raise HTTPException(status_code=401)
+    if not core: raise HTTPException(status_code=503, detail="SoulCore Kernel Offline")
+    return core.db.get_full_config()
+
+@app.post("/kernel/config")
+async def kernel_config_update(request: Request):
+    """Konfig kulcs módosítása; a feliratkozók (identitás, nyelvek, slot manager) azonnal átveszik."""
+    if "user" not in request.session: raise HTTPException(status_code=401)
+    if not core: raise HTTPException(status_code=503, detail="SoulCore Kernel Offline")
+    if core.db.get_user_role(request.session["user"]) != "admin": raise HTTPException(status_code=403)
+    data = await request.json()
+    if not data.get("key") or "value" not in data:
+        raise HTTPException(status_code=400, detail="key és value kötelező")
+    await asyncio.to_thread(core.db.set_config, data["key"], data["value"])
+    return {"status": "updated", "key": data["key"]}
+
+@app.get("/kernel/telemetry")
+async def kernel_telemetry(request: Request, window: float = 300):
+    """Hardver előzmény a gyűrűpufferből (az utolsó `window` másodperc) terheléselemzéshez."""
+    if "user" not in request.session: raise HTTPException(status_code=401)
+    if not telemetry: return {"status": "starting"}
+    return {**telemetry.history(window_sec=window), "sampler": telemetry.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Lépés / slot késleltetés hisztogramok és számlálók OpenMetrics formátumban (Prometheus scrape)."""
+    if not core: return PlainTextResponse("# EOF\n", media_type=OPENMETRICS_TYPE)
+    return PlainTextResponse(core.metrics_text(), media_type=OPENMETRICS_TYPE)
+
+@app.get("/kernel/events")
+async def kernel_events(request: Request, limit: int = 100, level: str = None, module: str = None):
+    """A legutóbbi események a memóriabeli gyűrűből (`level`: minimális szint, `module`: pl. KERNEL)."""
+    if "user" not in request.session: raise HTTPException(status_code=401)
+    if not monitor: return {"status": "starting"}
+    return {"events": monitor.events.recent(limit=limit, level=level, module=module),
+            "pipeline": monitor.events.stats()}
+
+@app.get("/kernel/placement")
+async def kernel_placement(request: Request):
+    """Slot -> GPU elhelyezési terv, tervezett vs. mért VRAM foglalással."""
+    if "user" not in request.session: raise HTTPException(status_code=401)
+    if not core: return {"enabled": False}
+    return core.placement_report()
+
 @app.post("/kernel/panic")
 async def system_panic(request: Request):
     """Vészhelyzeti VRAM ürítés."""
     if "user" not in request.session: raise HTTPException(status_code=403)
+    if not core: raise HTTPException(status_code=503, detail="SoulCore Kernel Offline")
     monitor.log_event("Kernel", "!!! PANIC MODE - SLOTOK ÜRÍTÉSE !!!", "critical")
-    for name, slot in core.slots.items():
-        if hasattr(slot, 'unload'): slot.unload()
-    return {"status": "flushed", "message": "VRAM felszabadítva."}
+    # A futó generálások alól nem rántjuk ki a modellt; a tétlen slotok (a King is) ürülnek
+    flushed = await asyncio.to_thread(core.slot_manager.evict_all, True)
+    return {"status": "flushed", "message": "VRAM felszabadítva.", "slots": flushed}
 
 @app.post("/process")
 async def process_api(request: Request):
     if "user" not in request.session:
         return JSONResponse(status_code=401, content={"error": "Nincs hitelesítve"})
     
+    if not core:
+        return JSONResponse(status_code=503, content={"error": "SoulCore Kernel Offline"})
+    
+    started = None
     try:
         data = await request.json()
         query = data.get("query", "")
@@ -171,14 +287,19 @@ async def process_api(request: Request):
             return JSONResponse(content={"answer": "Ismételt kérés észlelve, kérlek várj...", "type": "warning"})
 
         traffic.request_count += 1
+        if data.get("stream"):
+            return sse_pipeline_response(core, query, data.get("chat_id", "default_chat"), request.session.get("user"))
+        started = time.time()
         result = await core.process_pipeline(
             user_query=query,
             chat_id=data.get("chat_id", "default_chat"),
             user_id=request.session.get("user")
         )
+        record_traffic(core, request.session.get("user"), data.get("chat_id", "default_chat"), query, started, 200, result=result)
         return JSONResponse(content=result)
     except Exception as e:
         if monitor: monitor.log_event("API", f"Hiba: {e}", "error")
+        if started: record_traffic(core, request.session.get("user"), data.get("chat_id", "default_chat"), query, started, 500)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.get("/stream")
@@ -195,12 +316,10 @@ async def stream_output(request: Request):
 if __name__ == "__main__":
     host, port = "0.0.0.0", 8000
     try:
-        from src.database import SoulCoreDatabase
-        db = SoulCoreDatabase()
-        api_cfg = db.get_config("api")
+        # Csak a konfig kell: nincs RAG / modell betöltés a socket megnyitása előtt
+        api_cfg = read_config("api")
         if api_cfg:
             host = api_cfg.get('host', host)
             port = int(api_cfg.get('port', port))
-        db.close()
     except: pass
     uvicorn.run(app, host=host, port=port, log_level="info")
\ No newline at end of file
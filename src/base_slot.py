@@ -1,5 +1,7 @@
 import logging
 import time
+import threading
+from collections import deque
 
 class BaseSlot:
     def __init__(self, slot_name, config):
@@ -14,6 +16,12 @@ class BaseSlot:
         self.context_window = config.get("context_window", 4096) # Alapértelmezett, ha nincs megadva
         self.usage_count = 0
 
+        # Tokenszámlálás: hívásonkénti rekordok gördülő ablakban (status()["generation"])
+        self._generations = deque(maxlen=config.get("generation_stats_window", 100))
+        self._generations_lock = threading.Lock()
+        self.total_prompt_tokens = 0
+        self.total_completion_tokens = 0
+
     def load(self):
         """Modell betöltése a memóriába (implementálandó)"""
         raise NotImplementedError
@@ -28,16 +36,89 @@ class BaseSlot:
         """Válasz generálása (implementálandó)"""
         raise NotImplementedError
 
+    def generate_batch(self, prompts, params=None):
+        """
+        Több prompt egy menetben. Alapértelmezésben sorban fut, de az azonos
+        promptokat csak egyszer számolja; a többszekvenciás backendek felülírhatják.
+        """
+        unique = {p: None for p in prompts}
+        for p in unique:
+            unique[p] = self.generate(p, params)
+        return [unique[p] for p in prompts]
+
+    def generate_stream(self, prompt, params=None):
+        """Tokenenkénti generálás. Alapértelmezésben egyetlen darabban adja a teljes választ."""
+        yield self.generate(prompt, params)
+
     def safe_generate(self, prompt, params=None):
         """Hibakezelő réteg: ha a generálás elszáll, ne vigye a rendszert."""
         try:
-            self.last_used = time.time()
-            self.usage_count += 1
             return self.generate(prompt, params)
         except Exception as e:
             self.logger.error(f"Generálási hiba a {self.name} slotban: {e}")
             return None
 
+    def record_generation(self, prompt_tokens, completion_tokens, started, first_token_at=None,
+                          finished=None, cached_tokens=0):
+        """
+        Egy generálás mérése (perf_counter időpontok). A prefill az első tokenig tart;
+        a dekódolási sebesség az első token utáni tokenekből számolódik.
+        Ha a backend nem ad első-token időt, csak az összesített sebesség ismert.
+        """
+        finished = finished or time.perf_counter()
+        total = finished - started
+        record = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens,
+            "total_sec": total,
+            "ttft_sec": None,
+            "prefill_sec": None,
+            "prefill_tps": None,
+            "decode_tps": None,
+            "overall_tps": completion_tokens / total if total > 0 and completion_tokens else None,
+        }
+        if first_token_at is not None:
+            prefill = first_token_at - started
+            decode = finished - first_token_at
+            record["ttft_sec"] = record["prefill_sec"] = prefill
+            computed = prompt_tokens - cached_tokens
+            record["prefill_tps"] = computed / prefill if prefill > 0 and computed > 0 else None
+            record["decode_tps"] = (completion_tokens - 1) / decode if decode > 0 and completion_tokens > 1 else None
+        with self._generations_lock:
+            self._generations.append(record)
+            self.total_prompt_tokens += prompt_tokens
+            self.total_completion_tokens += completion_tokens
+            self.usage_count += 1
+            self.last_used = time.time()
+        return record
+
+    @staticmethod
+    def _summary(values):
+        values = sorted(v for v in values if v is not None)
+        if not values: return None
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+        return {"avg": round(sum(values) / len(values), 4), "p50": round(pick(0.5), 4),
+                "p95": round(pick(0.95), 4), "max": round(values[-1], 4)}
+
+    def generation_stats(self):
+        """Gördülő ablak statisztika: prefill vs. dekódolás (TTFT, tok/s) és tokenszámok."""
+        with self._generations_lock:
+            calls = list(self._generations)
+            totals = {"prompt_tokens": self.total_prompt_tokens, "completion_tokens": self.total_completion_tokens}
+        return {
+            "window": len(calls),
+            "totals": totals,
+            "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+            "cached_tokens": sum(c["cached_tokens"] for c in calls),
+            "completion_tokens": sum(c["completion_tokens"] for c in calls),
+            "ttft_sec": self._summary(c["ttft_sec"] for c in calls),
+            "prefill_tps": self._summary(c["prefill_tps"] for c in calls),
+            "decode_tps": self._summary(c["decode_tps"] for c in calls),
+            "overall_tps": self._summary(c["overall_tps"] for c in calls),
+            "total_sec": self._summary(c["total_sec"] for c in calls),
+        }
+
     def status(self):
         return {
             "name": self.name,
@@ -46,5 +127,6 @@ class BaseSlot:
             "is_loaded": self.is_loaded,
             "last_used": self.last_used,
             "usage_count": self.usage_count,
+            "generation": self.generation_stats(),
             "vram_allocation": self.config.get("gpu_split", "N/A") # Fontos a 2x5060 Ti miatt
         }
\ No newline at end of file
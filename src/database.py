@@ -2,25 +2,98 @@ import sqlite3
 import json
 import uuid
 import os
+import copy
+import time
+import threading
+import hashlib
+import contextlib
+import asyncio
 import logging
 from datetime import datetime
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-import networkx as nx
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from passlib.context import CryptContext
+from src.utils.sqlite_pool import SQLitePool
+from src.utils.embedding_service import EmbeddingService
+from src.utils.embedding_cache import EmbeddingCache
+
+# A nehéz könyvtárak (qdrant_client, sentence_transformers, networkx, passlib) csak az
+# adott alrendszer első használatakor töltődnek be, így a modul importja és a
+# read_config gyors marad (pl. a main.py host/port olvasásához).
+
+DEFAULT_DB_PATH = "vault/db/soulcore.db"
+
+# Verziózott séma-migrációk: az N. elem a user_version = N+1 állapotra visz.
+# Új migrációt mindig a lista VÉGÉRE fűzz, a meglévőket ne módosítsd!
+SCHEMA_MIGRATIONS = [
+    # 1: Indexek a chat történethez és a chat listához (keyset lapozás)
+    [
+        "CREATE INDEX IF NOT EXISTS idx_messages_chat_ts ON messages (chat_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_chats_user_active ON chats (user_id, last_active)",
+    ],
+    # 2: Embedding cache (float32 blob, kulcs: modell + prefixelt szöveg hash)
+    [
+        '''CREATE TABLE IF NOT EXISTS embedding_cache (
+            key TEXT PRIMARY KEY, dim INTEGER, vector BLOB, created_at TEXT)''',
+    ],
+    # 3: Determinisztikus lépések (Scribe, fordító) eredményei, kulcs: lépés + modell + prompt hash
+    [
+        '''CREATE TABLE IF NOT EXISTS stage_memo (
+            key TEXT PRIMARY KEY, stage TEXT, value TEXT, created_at TEXT)''',
+    ],
+    # 4: Strukturált audit események (az esemény napló kötegelten írja)
+    [
+        "ALTER TABLE audit_logs ADD COLUMN level TEXT",
+        "ALTER TABLE audit_logs ADD COLUMN module TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_audit_logs_ts ON audit_logs (timestamp)",
+    ],
+]
+
+_READ_ERROR = object()
+
+def _parse_config_value(raw):
+    try:
+        return json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return raw
+
+def read_config(key, db_path=DEFAULT_DB_PATH):
+    """
+    Csak-konfig olvasás a system_config táblából: nincs pool, migráció, RAG vagy modell betöltés.
+    Hiányzó adatbázis / kulcs esetén None (pl. a main.py host/port olvasásához).
+    """
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+        try:
+            res = conn.execute("SELECT value FROM system_config WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return _parse_config_value(res[0]) if res else None
 
 class SoulCoreDatabase:
-    def __init__(self, db_path="vault/db/soulcore.db"):
+    def __init__(self, db_path=DEFAULT_DB_PATH, pool_size=4, defer_models=False):
         self.logger = logging.getLogger("Database")
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.db_path = db_path
         
+        # Tartós kapcsolatkészlet (WAL) + egyetlen író szál csoportos commit-tal
+        self.pool = SQLitePool(db_path, size=pool_size)
+        
+        # Eseményfeliratkozók (pl. "knowledge": új Vault / hosszú távú memória tény)
+        self._listeners = {}
+        
+        # Feldolgozott konfig értékek memóriában (a set_config frissíti, "config" eseményt küld)
+        self._config_cache = {}
+        self._config_lock = threading.Lock()
+        # Audit események száma a legutóbbi ritkítás óta (write_audit_events)
+        self._audit_since_prune = 0
+        
         self.vector_path = "vault/db/soul_vectors"
         self.graph_path = "vault/db/social_graph.json"
         
-        # Jelszókezelő a biztonságos belépéshez
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        # Jelszókezelő a biztonságos belépéshez (lusta, lásd pwd_context)
+        self._pwd_context = None
         
         # 1. Alapvető SQL struktúra felépítése
         self._init_sqlite()
@@ -37,89 +110,140 @@ class SoulCoreDatabase:
         self.rag_cfg = self.get_config("rag_system")
         self.storage_cfg = self.get_config("storage")
 
-        # 3. VEKTOROS MOTOR (Qdrant)
+        # 3-4. VEKTOROS MOTOR (Qdrant) + RERANKER
+        # defer_models=True: a modellek később, a slotokkal párhuzamosan töltődnek (warm_up_models)
         self.client = None
-        try:
-            print(f"🧬 Szuverén Embedding betöltése: {self.rag_cfg['embedding']['local_path']}")
-            self.embedding_model = SentenceTransformer(self.rag_cfg['embedding']['local_path'])
-            self.client = QdrantClient(path=self.vector_path)
-            self._init_vector_collections()
-        except Exception as e:
-            self.logger.error(f"Vektoros motor hiba az inicializáláskor: {e}")
-
-        # 4. RERANKER
+        self.embedder = None
         self.reranker = None
-        if self.rag_cfg.get('reranker', {}).get('enabled'):
-            print(f"🔍 Szuverén Reranker aktív.")
-            try:
-                self.reranker = CrossEncoder(self.rag_cfg['reranker']['local_path'])
-            except Exception as e:
-                self.logger.error(f"Reranker hiba: {e}")
+        if not defer_models:
+            self.warm_up_models()
 
-        # 5. GRÁF MEMÓRIA
-        self.graph_db = self._load_graph()
+        # 5. GRÁF MEMÓRIA (első hozzáféréskor töltődik, lásd graph_db)
+        self._graph_db = None
         print(f"🏛️ SoulCore 2.0: SQL + RAG + Graph élesítve.")
 
     def _init_sqlite(self):
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute('CREATE TABLE IF NOT EXISTS system_config (key TEXT PRIMARY KEY, value TEXT)')
-            c.execute('''CREATE TABLE IF NOT EXISTS slots (
+        schema = [
+            'CREATE TABLE IF NOT EXISTS system_config (key TEXT PRIMARY KEY, value TEXT)',
+            '''CREATE TABLE IF NOT EXISTS slots (
                 name TEXT PRIMARY KEY, enabled INTEGER, role TEXT, engine TEXT, 
                 model_name TEXT, filename TEXT, gpu_id INTEGER, max_vram_mb INTEGER, 
-                n_ctx INTEGER, temperature REAL, model_path TEXT)''')
+                n_ctx INTEGER, temperature REAL, model_path TEXT)''',
             
             # AUTH táblák
-            c.execute('CREATE TABLE IF NOT EXISTS auth (username TEXT PRIMARY KEY, password_hash TEXT, role TEXT)')
-            c.execute('CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, username TEXT, role TEXT)')
+            'CREATE TABLE IF NOT EXISTS auth (username TEXT PRIMARY KEY, password_hash TEXT, role TEXT)',
+            'CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, username TEXT, role TEXT)',
             
-            c.execute('''CREATE TABLE IF NOT EXISTS chats (
+            '''CREATE TABLE IF NOT EXISTS chats (
                 chat_id TEXT PRIMARY KEY, user_id TEXT, title TEXT, 
-                created_at TEXT, last_active TEXT)''')
+                created_at TEXT, last_active TEXT)''',
             
-            c.execute('''CREATE TABLE IF NOT EXISTS messages (
+            '''CREATE TABLE IF NOT EXISTS messages (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id TEXT, role TEXT, 
-                content TEXT, debug_data TEXT, timestamp TEXT)''')
+                content TEXT, debug_data TEXT, timestamp TEXT)''',
             
-            c.execute('''CREATE TABLE IF NOT EXISTS long_memory (
-                key TEXT PRIMARY KEY, content TEXT, metadata TEXT, timestamp TEXT)''')
+            '''CREATE TABLE IF NOT EXISTS long_memory (
+                key TEXT PRIMARY KEY, content TEXT, metadata TEXT, timestamp TEXT)''',
             
             # ÚJ: Naplózó tábla a rendszer eseményeknek
-            c.execute('CREATE TABLE IF NOT EXISTS audit_logs (id INTEGER PRIMARY KEY, event TEXT, timestamp TEXT)')
-            conn.commit()
+            'CREATE TABLE IF NOT EXISTS audit_logs (id INTEGER PRIMARY KEY, event TEXT, timestamp TEXT)',
+        ]
+        self.pool.write([(sql, ()) for sql in schema])
+        self._run_migrations()
+
+    def _run_migrations(self):
+        """A PRAGMA user_version alapján lefuttatja a hiányzó migrációkat."""
+        with self.pool.read() as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, statements in enumerate(SCHEMA_MIGRATIONS, start=1):
+            if version <= current: continue
+            self.logger.info(f"Séma migráció: v{version - 1} -> v{version}")
+            self.pool.write([(sql, ()) for sql in statements] + [(f"PRAGMA user_version = {version}", ())])
 
     def _ensure_access_integrity(self):
         """Garantálja, hogy a rendszer soha ne zárja ki az admint."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.read() as conn:
             res = conn.execute("SELECT username FROM auth WHERE role = 'admin'").fetchone()
-            if not res:
-                self.logger.warning("Biztonsági rés észlelve: Admin hiányzik. Hozzáférés helyreállítása...")
-                self.create_user("admin", "soulcore", role="admin")
-                self.create_user("Grumpy", "soulcore_admin", role="admin")
-                conn.execute("INSERT INTO audit_logs (event, timestamp) VALUES (?, ?)", 
-                             ("Admin access restored by System", datetime.now().isoformat()))
-                conn.commit()
+        if not res:
+            self.logger.warning("Biztonsági rés észlelve: Admin hiányzik. Hozzáférés helyreállítása...")
+            self.create_user("admin", "soulcore", role="admin")
+            self.create_user("Grumpy", "soulcore_admin", role="admin")
+            self.pool.write([("INSERT INTO audit_logs (event, timestamp) VALUES (?, ?)", 
+                              ("Admin access restored by System", datetime.now().isoformat()))])
+
+    AUDIT_PRUNE_EVERY = 1000
+
+    def write_audit_events(self, events):
+        """
+        Esemény köteg az audit_logs táblába, egyetlen tranzakcióban (az esemény napló háttér szálán).
+        Minden ~1000. esemény után ugyanebben a kötegben a legrégebbi strukturált (level-lel bíró)
+        sorok törlődnek a storage.event_log.audit_max_rows korlátig; a rendszer biztonsági
+        bejegyzései (level nélkül) megmaradnak.
+        """
+        statements = [("INSERT INTO audit_logs (event, timestamp, level, module) VALUES (?, ?, ?, ?)",
+                       (e["message"], e["timestamp"], e["level"], e["module"])) for e in events]
+        self._audit_since_prune += len(events)
+        if self._audit_since_prune >= self.AUDIT_PRUNE_EVERY:
+            self._audit_since_prune = 0
+            max_rows = (self.get_config("storage") or {}).get("event_log", {}).get("audit_max_rows", 200000)
+            if max_rows:
+                statements.append(("DELETE FROM audit_logs WHERE level IS NOT NULL AND id < ("
+                                   "SELECT id FROM audit_logs WHERE level IS NOT NULL ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                                   (int(max_rows) - 1,)))
+        self.pool.write(statements)
+
+    # --- ESEMÉNYEK ---
+    def add_listener(self, event, callback):
+        """Feliratkozás egy adatbázis eseményre; a callback kulcsszavas argumentumokat kap."""
+        self._listeners.setdefault(event, []).append(callback)
+
+    def _emit(self, event, **payload):
+        for callback in self._listeners.get(event, []):
+            try:
+                callback(**payload)
+            except Exception as e:
+                self.logger.error(f"Eseménykezelő hiba ({event}): {e}")
 
     # --- KONFIGURÁCIÓ KEZELÉS ---
     def get_config(self, key):
+        """Konfig érték a memóriabeli cache-ből (első olvasáskor SQLite); a hívó saját másolatot kap."""
+        with self._config_lock:
+            if key in self._config_cache:
+                return copy.deepcopy(self._config_cache[key])
+        value = self._read_config(key)
+        if value is _READ_ERROR:
+            return None
+        with self._config_lock:
+            self._config_cache.setdefault(key, value)
+        return copy.deepcopy(value)
+
+    def _read_config(self, key):
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.read() as conn:
                 res = conn.execute("SELECT value FROM system_config WHERE key = ?", (key,)).fetchone()
-                if res:
-                    try:
-                        return json.loads(res[0])
-                    except (json.JSONDecodeError, TypeError):
-                        return res[0]
-                return None
+            return _parse_config_value(res[0]) if res else None
         except Exception as e:
             self.logger.error(f"Config olvasási hiba ({key}): {e}")
-            return None
+            return _READ_ERROR
 
     def set_config(self, key, value):
-        with sqlite3.connect(self.db_path) as conn:
-            val_to_save = json.dumps(value) if isinstance(value, (dict, list)) else json.dumps(value)
-            conn.execute("INSERT OR REPLACE INTO system_config VALUES (?, ?)", (key, val_to_save))
-            conn.commit()
+        val_to_save = json.dumps(value) if isinstance(value, (dict, list)) else json.dumps(value)
+        self.pool.write([("INSERT OR REPLACE INTO system_config VALUES (?, ?)", (key, val_to_save))])
+        with self._config_lock:
+            old = self._config_cache.get(key)
+            self._config_cache[key] = _parse_config_value(val_to_save)
+        if old != value:
+            self._emit("config", key=key, value=copy.deepcopy(value))
+
+    def reload_config(self):
+        """Külső (más folyamatból érkező) módosítások átvétele: a megváltozott kulcsokra is szól az esemény."""
+        with self._config_lock:
+            cached = dict(self._config_cache)
+            self._config_cache.clear()
+        for key, old in cached.items():
+            value = self.get_config(key)
+            if value != old:
+                self._emit("config", key=key, value=value)
 
     def get_full_config(self):
         return {
@@ -132,17 +256,14 @@ class SoulCoreDatabase:
 
     # --- SLOT / MODELL KEZELÉS ---
     def save_slot(self, name, data):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''INSERT OR REPLACE INTO slots VALUES (?,?,?,?,?,?,?,?,?,?,?)''',
-                (name, data.get('enabled', 0), data.get('role'), data.get('engine'), 
-                 data.get('model_name'), data.get('filename'), data.get('gpu_id', 0), 
-                 data.get('max_vram_mb', 0), data.get('n_ctx', 2048), 
-                 data.get('temperature', 0.7), data.get('model_path')))
-            conn.commit()
+        self.pool.write([('''INSERT OR REPLACE INTO slots VALUES (?,?,?,?,?,?,?,?,?,?,?)''',
+            (name, data.get('enabled', 0), data.get('role'), data.get('engine'), 
+             data.get('model_name'), data.get('filename'), data.get('gpu_id', 0), 
+             data.get('max_vram_mb', 0), data.get('n_ctx', 2048), 
+             data.get('temperature', 0.7), data.get('model_path')))])
 
     def get_enabled_slots(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.read(row_factory=sqlite3.Row) as conn:
             return {row['name']: dict(row) for row in conn.execute("SELECT * FROM slots WHERE enabled = 1").fetchall()}
 
     def get_sovereign_identity(self):
@@ -154,9 +275,54 @@ class SoulCoreDatabase:
         }
 
     # --- RAG / VEKTOROS FUNKCIÓK ---
+    # --- MODELLEK (EMBEDDING / RERANKER) ---
+
+    def warm_up_models(self):
+        """Embedding + reranker betöltése (defer_models esetén az Orchestrator hívja a slotokkal párhuzamosan)."""
+        self.init_vector_engine()
+        self.init_reranker()
+
+    def init_vector_engine(self):
+        """Embedding modell, batch-elő szolgáltatás és Qdrant kliens."""
+        try:
+            from sentence_transformers import SentenceTransformer
+            from qdrant_client import QdrantClient
+            emb_cfg = self.rag_cfg['embedding']
+            print(f"🧬 Szuverén Embedding betöltése: {emb_cfg['local_path']}")
+            self.embedding_model = SentenceTransformer(emb_cfg['local_path'])
+            cache_cfg = emb_cfg.get('cache', {})
+            self.embedding_cache = None
+            if cache_cfg.get('enabled', True):
+                self.embedding_cache = EmbeddingCache(
+                    self.pool, emb_cfg['local_path'],
+                    memory_entries=cache_cfg.get('memory_entries', 4096),
+                    disk_entries=cache_cfg.get('disk_entries', 200000)
+                )
+            # Párhuzamos lekérdezések egy forward passba gyűjtése
+            self.embedder = EmbeddingService(
+                self.embedding_model,
+                window_ms=emb_cfg.get('batch_window_ms', 5),
+                max_batch=emb_cfg.get('max_batch', 32),
+                cache=self.embedding_cache
+            )
+            self.client = QdrantClient(path=self.vector_path)
+            self._init_vector_collections()
+        except Exception as e:
+            self.logger.error(f"Vektoros motor hiba az inicializáláskor: {e}")
+
+    def init_reranker(self):
+        if self.rag_cfg.get('reranker', {}).get('enabled'):
+            print(f"🔍 Szuverén Reranker aktív.")
+            try:
+                from sentence_transformers import CrossEncoder
+                self.reranker = CrossEncoder(self.rag_cfg['reranker']['local_path'])
+            except Exception as e:
+                self.logger.error(f"Reranker hiba: {e}")
+
     def _init_vector_collections(self):
         if not self.client: return
         try:
+            from qdrant_client.http import models
             collections = self.client.get_collections().collections
             if not any(c.name == "soul_vectors" for c in collections):
                 dim = self.rag_cfg['embedding']['vector_dimension']
@@ -169,24 +335,51 @@ class SoulCoreDatabase:
     def query_vault(self, query_text, user_id=None, limit=None):
         try:
             if not self.client: return ""
-            limit = limit or self.rag_cfg['context']['max_chunks_per_query']
             prefix = self.rag_cfg['embedding']['instruction_type']['query']
-            vector = self.embedding_model.encode(f"{prefix}{query_text}").tolist()
-            
+            vector = self.embedder.encode(f"{prefix}{query_text}")
+            return self._search_vault(query_text, vector, user_id, limit)
+        except Exception as e: 
+            self.logger.error(f"Vault query hiba: {e}")
+            return ""
+
+    async def aembed_query(self, query_text):
+        """A kérdés embeddingje (query prefixszel, batch-elve és cache-elve)."""
+        prefix = self.rag_cfg['embedding']['instruction_type']['query']
+        return await self.embedder.aencode(f"{prefix}{query_text}")
+
+    async def aquery_vault(self, query_text, user_id=None, limit=None, trace=None):
+        """Aszinkron query_vault: az embedding batch-elve, a keresés és rerank szálon fut (span-ekkel, ha van trace)."""
+        try:
+            if not self.client: return ""
+            with trace.span("vault.embed") if trace else contextlib.nullcontext():
+                vector = await self.aembed_query(query_text)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._search_vault, query_text, vector, user_id, limit, trace)
+        except Exception as e: 
+            self.logger.error(f"Vault query hiba: {e}")
+            return ""
+
+    def _search_vault(self, query_text, vector, user_id=None, limit=None, trace=None):
+        span = trace.span if trace else (lambda stage: contextlib.nullcontext())
+        try:
+            from qdrant_client.http import models
+            limit = limit or self.rag_cfg['context']['max_chunks_per_query']
             filt = models.Filter(must=[models.FieldCondition(key="user_id", match=models.MatchValue(value=user_id))]) if user_id else None
             
-            response = self.client.query_points(
-                collection_name="soul_vectors",
-                query=vector,
-                limit=limit,
-                query_filter=filt
-            )
+            with span("vault.search"):
+                response = self.client.query_points(
+                    collection_name="soul_vectors",
+                    query=vector,
+                    limit=limit,
+                    query_filter=filt
+                )
             
             if not response or not response.points: return ""
             passages = [res.payload.get("text", "") for res in response.points]
             
             if self.reranker and len(passages) > 1:
-                scores = self.reranker.predict([[query_text, p] for p in passages])
+                with span("rerank"):
+                    scores = self.reranker.predict([[query_text, p] for p in passages])
                 ranked = sorted(zip(scores, passages), key=lambda x: x[0], reverse=True)
                 return " | ".join([p for s, p in ranked if s >= self.rag_cfg['reranker']['relevance_threshold']][:self.rag_cfg['reranker']['top_n']])
             
@@ -195,90 +388,242 @@ class SoulCoreDatabase:
             self.logger.error(f"Vault query hiba: {e}")
             return ""
 
+    def embedding_stats(self):
+        """Embedding batch és cache számlálók a diagnosztikához."""
+        return self.embedder.stats() if self.embedder else {"status": "offline"}
+
     def save_to_vault(self, text, user_id="Grumpy", chat_id="default"):
         if not self.client: return
+        self.save_to_vault_many([text], user_id=user_id, chat_id=chat_id)
+
+    def save_to_vault_many(self, texts, user_id="Grumpy", chat_id="default", encode_batch=64, upsert_batch=512):
+        """
+        Tömeges Vault feltöltés: darabolás (rag_system.context.chunk_size karakter),
+        batch-elt embedding és nagy kötegű upsert tartalom-hash alapú pont ID-kkal.
+        Az azonos tartalom újramentése nem duplikál, párhuzamos írásnál sincs ütközés.
+        Visszatér: átviteli statisztika.
+        """
+        report = {"chunks": 0, "seconds": 0.0, "chunks_per_sec": 0.0}
+        if not self.client: return report
+        start = time.time()
         try:
+            from qdrant_client.http import models
+            chunk_size = self.rag_cfg['context'].get('chunk_size', 4096)
+            chunks = {}
+            for text in texts:
+                for chunk in self._chunk_text(text, chunk_size):
+                    chunks.setdefault(self._vault_point_id(chunk, user_id), chunk)
+            if not chunks: return report
+
             prefix = self.rag_cfg['embedding']['instruction_type']['document']
-            vector = self.embedding_model.encode(f"{prefix}{text}").tolist()
-            self.client.upsert(
-                collection_name="soul_vectors",
-                points=[models.PointStruct(id=int(datetime.now().timestamp()*1000), vector=vector, payload={
-                    "user_id": user_id, "chat_id": chat_id, "text": text, "timestamp": datetime.now().isoformat()
-                })]
-            )
+            ids, bodies = list(chunks), list(chunks.values())
+            vectors = self.embedder.encode_many([f"{prefix}{c}" for c in bodies], batch_size=encode_batch)
+
+            now = datetime.now().isoformat()
+            for i in range(0, len(ids), upsert_batch):
+                self.client.upsert(
+                    collection_name="soul_vectors",
+                    points=[models.PointStruct(id=pid, vector=vec, payload={
+                        "user_id": user_id, "chat_id": chat_id, "text": body, "timestamp": now
+                    }) for pid, vec, body in zip(ids[i:i + upsert_batch], vectors[i:i + upsert_batch], bodies[i:i + upsert_batch])]
+                )
+
+            elapsed = time.time() - start
+            report = {"chunks": len(ids), "seconds": round(elapsed, 3),
+                      "chunks_per_sec": round(len(ids) / elapsed, 1) if elapsed > 0 else 0.0}
+            self.logger.info(f"Vault ingest: {report['chunks']} darab, {report['seconds']}s ({report['chunks_per_sec']} darab/s)")
+            self._emit("knowledge", user_id=user_id)
         except Exception as e:
             self.logger.error(f"Vault mentési hiba: {e}")
+        return report
+
+    @staticmethod
+    def _vault_point_id(text, user_id):
+        """Determinisztikus, ütközésmentes pont ID (UUIDv5 a felhasználó + tartalom alapján)."""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"soulcore:{user_id}:{text}"))
+
+    @staticmethod
+    def _chunk_text(text, size):
+        """Szóhatáron daraboló; a túl hosszú szavakat keményen vágja."""
+        text = (text or "").strip()
+        if len(text) <= size:
+            return [text] if text else []
+        chunks, current = [], ""
+        for word in text.split():
+            while len(word) > size:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(word[:size])
+                word = word[size:]
+            if current and len(current) + 1 + len(word) > size:
+                chunks.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        if current:
+            chunks.append(current)
+        return chunks
 
     # --- CHAT ÉS ÜZENET KEZELÉS ---
-    def save_message(self, chat_id, role, content, debug=None, user_id="Grumpy"):
+    def save_message(self, chat_id, role, content, debug=None, user_id="Grumpy", wait=True):
+        """
+        Üzenet mentése. wait=False esetén az író sorba kerül és a hívó azonnal
+        továbbmehet (a csoportos commit a háttérben történik).
+        """
         now = datetime.now().isoformat()
-        with sqlite3.connect(self.db_path) as conn:
-            try:
-                debug_val = json.dumps(debug, ensure_ascii=False) if debug is not None else None
-            except:
-                debug_val = str(debug)
+        try:
+            debug_val = json.dumps(debug, ensure_ascii=False) if debug is not None else None
+        except:
+            debug_val = str(debug)
 
-            conn.execute("INSERT INTO messages (chat_id, role, content, debug_data, timestamp) VALUES (?, ?, ?, ?, ?)",
-                         (chat_id, role, content, debug_val, now))
-            
-            res = conn.execute("SELECT chat_id FROM chats WHERE chat_id = ?", (chat_id,)).fetchone()
-            if not res:
-                title = (content[:30] + '...') if len(content) > 30 else content
-                conn.execute("INSERT INTO chats (chat_id, user_id, title, created_at, last_active) VALUES (?, ?, ?, ?, ?)",
-                             (chat_id, user_id, title, now, now))
-            else:
-                conn.execute("UPDATE chats SET last_active = ? WHERE chat_id = ?", (now, chat_id))
-            conn.commit()
+        title = (content[:30] + '...') if len(content) > 30 else content
+        fut = self.pool.write([
+            ("INSERT INTO messages (chat_id, role, content, debug_data, timestamp) VALUES (?, ?, ?, ?, ?)",
+             (chat_id, role, content, debug_val, now)),
+            # Új chat esetén létrehozzuk, meglévőnél csak az aktivitást frissítjük
+            ('''INSERT INTO chats (chat_id, user_id, title, created_at, last_active) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET last_active = excluded.last_active''',
+             (chat_id, user_id, title, now, now)),
+        ], wait=wait)
+        if not wait:
+            fut.add_done_callback(self._log_write_error)
+            return fut
+
+    def _log_write_error(self, fut):
+        if fut.exception():
+            self.logger.error(f"Háttér írási hiba: {fut.exception()}")
 
     def get_chat_history(self, chat_id, limit=20):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.read(row_factory=sqlite3.Row) as conn:
             res = conn.execute("SELECT role, content, timestamp FROM messages WHERE chat_id = ? ORDER BY timestamp DESC LIMIT ?", 
                                (chat_id, limit)).fetchall()
-            return list(reversed([dict(row) for row in res]))
+        return list(reversed([dict(row) for row in res]))
+
+    def get_chat_history_page(self, chat_id, limit=50, cursor=None):
+        """
+        Keyset lapozás a chat történetben (legújabbtól visszafelé).
+        A cursor a legrégebbi visszaadott üzenet '<timestamp>|<id>' kulcsa.
+        Visszatér: (üzenetek időrendben, következő cursor vagy None)
+        """
+        sql = "SELECT id, role, content, timestamp FROM messages WHERE chat_id = ?"
+        params = [chat_id]
+        key = self._decode_cursor(cursor)
+        if key:
+            sql += " AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+            params += [key[0], key[0], int(key[1])]
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.pool.read(row_factory=sqlite3.Row) as conn:
+            res = [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+        next_cursor = None
+        if len(res) > limit:
+            res = res[:limit]
+            next_cursor = f"{res[-1]['timestamp']}|{res[-1]['id']}"
+        for row in res: row.pop("id")
+        return list(reversed(res)), next_cursor
+
+    def get_chat_sessions_page(self, user_id=None, limit=50, cursor=None):
+        """
+        Keyset lapozás a chat listában (last_active szerint csökkenő).
+        A cursor az utolsó visszaadott chat '<last_active>|<chat_id>' kulcsa.
+        """
+        sql = "SELECT chat_id, title, last_active FROM chats"
+        where, params = [], []
+        if user_id:
+            where.append("user_id = ?")
+            params.append(user_id)
+        key = self._decode_cursor(cursor)
+        if key:
+            where.append("(last_active < ? OR (last_active = ? AND chat_id < ?))")
+            params += [key[0], key[0], key[1]]
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY last_active DESC, chat_id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.pool.read(row_factory=sqlite3.Row) as conn:
+            res = [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+        next_cursor = None
+        if len(res) > limit:
+            res = res[:limit]
+            next_cursor = f"{res[-1]['last_active']}|{res[-1]['chat_id']}"
+        return res, next_cursor
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        if not cursor or "|" not in cursor: return None
+        # Az ISO timestamp nem tartalmaz '|' jelet, így az első elválasztónál vágunk
+        return cursor.partition("|")[::2]
 
     def get_all_chat_sessions(self, user_id=None):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.read(row_factory=sqlite3.Row) as conn:
             if user_id:
                 res = conn.execute("SELECT chat_id, title, last_active FROM chats WHERE user_id = ? ORDER BY last_active DESC", (user_id,)).fetchall()
             else:
                 res = conn.execute("SELECT chat_id, title, last_active FROM chats ORDER BY last_active DESC").fetchall()
-            return [dict(row) for row in res]
+        return [dict(row) for row in res]
 
     # --- AUTH / BIZTONSÁG ---
+    @property
+    def pwd_context(self):
+        """Jelszókezelő; a passlib csak az első belépéskor / felhasználó létrehozáskor töltődik."""
+        if self._pwd_context is None:
+            from passlib.context import CryptContext
+            self._pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        return self._pwd_context
+
     def verify_user(self, username, password):
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.read() as conn:
                 res = conn.execute("SELECT password_hash FROM auth WHERE username = ?", (username,)).fetchone()
-                if res and self.pwd_context.verify(password, res[0]):
-                    return True
+            if res and self.pwd_context.verify(password, res[0]):
+                return True
         except Exception as e:
             self.logger.error(f"Auth hiba: {e}")
         return False
 
+    def get_user_role(self, username):
+        with self.pool.read() as conn:
+            res = conn.execute("SELECT role FROM auth WHERE username = ?", (username,)).fetchone()
+        return res[0] if res else None
+
     def create_user(self, username, password, role="user"):
         hashed = self.pwd_context.hash(password)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("INSERT OR REPLACE INTO auth VALUES (?, ?, ?)", (username, hashed, role))
-            conn.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?)", (username, username, role))
-            conn.commit()
+        self.pool.write([
+            ("INSERT OR REPLACE INTO auth VALUES (?, ?, ?)", (username, hashed, role)),
+            ("INSERT OR REPLACE INTO users VALUES (?, ?, ?)", (username, username, role)),
+        ])
 
     # --- HOSSZÚ TÁVÚ MEMÓRIA ---
     def set_long_memory(self, key, text, metadata=""):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("INSERT OR REPLACE INTO long_memory (key, content, metadata, timestamp) VALUES (?, ?, ?, ?)", 
-                         (key, text, metadata, datetime.now().isoformat()))
-            conn.commit()
+        self.pool.write([("INSERT OR REPLACE INTO long_memory (key, content, metadata, timestamp) VALUES (?, ?, ?, ?)", 
+                          (key, text, metadata, datetime.now().isoformat()))])
+        # A hosszú távú memória mindenkire hat
+        self._emit("knowledge", user_id=None)
+
+    def save_to_long_memory(self, text, metadata=""):
+        """Tény mentése tartalom-alapú kulccsal (az ismételt tény nem duplikálódik)."""
+        self.set_long_memory(hashlib.sha1(text.encode("utf-8")).hexdigest(), text, metadata)
 
     def get_all_long_memory(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.read() as conn:
             res = conn.execute("SELECT content FROM long_memory ORDER BY timestamp DESC").fetchall()
-            if not res: return "No long-term memories stored yet."
-            return "\n".join([row[0] for row in res])
+        if not res: return "No long-term memories stored yet."
+        return "\n".join([row[0] for row in res])
 
     # --- GRÁF ÉS SEEDING ---
+    @property
+    def graph_db(self):
+        if self._graph_db is None:
+            self._graph_db = self._load_graph()
+        return self._graph_db
+
     def _load_graph(self):
+        import networkx as nx
         if os.path.exists(self.graph_path):
             try:
                 with open(self.graph_path, 'r', encoding='utf-8') as f:
@@ -293,9 +638,16 @@ class SoulCoreDatabase:
             "character_traits": "Intelligens, szuverén, néha csípős humorú partner.",
             "user_lang": "hu", "internal_lang": "en"
         })
-        self.set_config("api", {"host": "0.0.0.0", "port": 8000, "cors": ["*"], "timeout": 60})
-        self.set_config("hardware", {"gpu_count": 2, "total_vram_limit_mb": 32768, "cuda_devices": ["cuda:0", "cuda:1"], "primary_gpu": 0})
-        self.set_config("storage", {"model_root": "./models", "vault_root": "./vault", "db_limit_gb": 1500})
+        self.set_config("api", {"host": "0.0.0.0", "port": 8000, "cors": ["*"], "timeout": 60,
+                                "traffic_recorder": {"enabled": False, "path": "vault/traces/traffic.jsonl", "sample_rate": 1.0, "max_mb": 256}})
+        self.set_config("hardware", {"gpu_count": 2, "total_vram_limit_mb": 32768, "cuda_devices": ["cuda:0", "cuda:1"], "primary_gpu": 0,
+                                     "slot_manager": {"lazy": True, "pinned": ["king"], "min_residency_sec": 60, "wait_sec": 30, "headroom_mb": 512},
+                                     "placement": {"enabled": True, "pinned": {"king": 0}, "allow_split": True},
+                                     "telemetry": {"interval_sec": 1.0, "history_sec": 3600}})
+        self.set_config("storage", {"model_root": "./models", "vault_root": "./vault", "db_limit_gb": 1500,
+                                    "kv_cache": {"enabled": False, "slots": ["king"], "max_mb": 4096},
+                                    "stage_memo": {"enabled": True, "memory_entries": 2048, "disk_entries": 50000},
+                                    "event_log": {"max_mb": 10, "backups": 5, "ring_size": 1000, "audit": True, "audit_max_rows": 200000}})
         
         self.set_config("rag_system", {
             "enabled": True,
@@ -304,7 +656,8 @@ class SoulCoreDatabase:
                 "vector_dimension": 768, "instruction_type": {"query": "query: ", "document": "passage: "}
             },
             "context": {"window_size": 131072, "chunk_size": 4096, "max_chunks_per_query": 15},
-            "reranker": {"enabled": False, "local_path": "/mnt/raid/soulcore/SoulCore2.0/models/reranker/qwen3vlreranker2B", "top_n": 5, "relevance_threshold": 0.65}
+            "reranker": {"enabled": False, "local_path": "/mnt/raid/soulcore/SoulCore2.0/models/reranker/qwen3vlreranker2B", "top_n": 5, "relevance_threshold": 0.65},
+            "semantic_cache": {"enabled": False, "threshold": 0.95, "ttl_sec": 3600, "max_entries_per_user": 256, "near_miss_margin": 0.05}
         })
 
         slots = {
@@ -321,8 +674,12 @@ class SoulCoreDatabase:
         self.create_user("Grumpy", "soulcore_admin", role="admin")
 
     def close(self):
+        if getattr(self, 'embedder', None):
+            self.embedder.close()
         if hasattr(self, 'client') and self.client: 
             try:
                 self.client.close()
             except Exception as e:
-                self.logger.error(f"Kliens lezárási hiba: {e}")
\ No newline at end of file
+                self.logger.error(f"Kliens lezárási hiba: {e}")
+        if hasattr(self, 'pool'):
+            self.pool.close()
\ No newline at end of file
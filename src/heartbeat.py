@@ -64,13 +64,20 @@ class Heartbeat:
 
     async def _check_system_health(self):
         """Ellenőrzi a slotokat és megpróbálja újraéleszteni a leállt modulokat."""
+        manager = getattr(self.core, 'slot_manager', None)
         for name, slot in self.core.slots.items():
+            # Az igény szerint töltött slotok üresen hagyása szándékos, nem elakadás
+            if manager and name not in manager.pinned:
+                continue
             try:
                 # Biztonságos státusz lekérés
-                status = slot.status() if hasattr(slot, 'status') else {"loaded": False}
-                if not status.get("loaded", False):
+                status = slot.status() if hasattr(slot, 'status') else {"is_loaded": False}
+                if not status.get("is_loaded", False):
                     self.logger.warning(f"🚨 Slot elakadás: {name}. Újratöltés...")
-                    slot.load()
+                    if manager:
+                        await asyncio.to_thread(manager.ensure_loaded, name)
+                    else:
+                        slot.load()
             except Exception as e:
                 if name == "king":
                     await self._trigger_self_restart(f"Sovereign slot hiba: {e}")
@@ -108,7 +115,7 @@ class Heartbeat:
             if dev_type == "gpu":
                 if usage > self.vram_critical_pct:
                     self.logger.critical(f"❗ VRAM KRITIKUS: {usage}%! Slot ürítés...")
-                    await self._free_up_auxiliary_slots()
+                    await self._free_up_auxiliary_slots(device.get("index"))
                 elif usage > self.vram_warning_pct:
                     self.logger.warning(f"⚠️ VRAM Magas: {usage}%")
             
@@ -116,8 +123,16 @@ class Heartbeat:
                 if usage > self.ram_threshold_pct:
                     self.logger.warning(f"❗ RENDSZER RAM KRITIKUS: {usage}%")
 
-    async def _free_up_auxiliary_slots(self):
-        """Kritikus helyzetben leüríti a segéd-slotokat."""
+    async def _free_up_auxiliary_slots(self, gpu_id=None):
+        """
+        Kritikus helyzetben leüríti a segéd-slotokat. Slot managerrel csak a szorongatott
+        GPU (`gpu_id`) legrégebben használt tétlen slotja ürül.
+        """
+        manager = getattr(self.core, 'slot_manager', None)
+        if manager:
+            for name in await asyncio.to_thread(manager.relieve_pressure, gpu_id):
+                self.logger.info(f"♻️ {name} slot leürítése memóriamentéshez.")
+            return
         for name in ["translator", "scribe"]:
             if name in self.core.slots:
                 slot = self.core.slots[name]
@@ -131,17 +146,8 @@ class Heartbeat:
         # Csak akkor fut, ha a King él és nem foglalt
         if "king" in self.core.slots and getattr(self.core.slots["king"], 'is_loaded', False):
             try:
-                prompt = (
-                    "<|im_start|>system\nYou are SoulCore Internal Sentry. "
-                    "Analyze system state. Reply 'YES' or 'NO' only.<|im_end|>\n"
-                    "<|im_start|>user\nShould we initiate proactive communication?<|im_end|>\n"
-                    "<|im_start|>assistant\n"
-                )
-                
-                # Biztonságos futtatás threadben, hogy ne blokkolja a heartbeat-et
-                decision = await self.core._run_in_thread("king", "generate", prompt, {"max_tokens": 5, "temperature": 0.0})
-                
-                if decision and "YES" in decision.upper():
+                # Háttér prioritással fut: felhasználói kérés mindig megelőzi / megszakítja
+                if await self.core.check_proactive_intent():
                     self.logger.info("🎯 Proaktív gondolat észlelve.")
                     if hasattr(self.core, 'process_proactive_thought'):
                         asyncio.create_task(self.core.process_proactive_thought())
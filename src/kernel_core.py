@@ -57,7 +57,7 @@ class SoulCoreKernel:
         keywords = intent_data.get("keywords", "")
         # Ellenőrizzük, hogy a db elérhető-e
         if self.orchestrator and hasattr(self.orchestrator, 'db'):
-            vault_data = self.orchestrator.db.query_vault(keywords)
+            vault_data = await self.orchestrator.db.aquery_vault(keywords)
         else:
             vault_data = "Vault nem érhető el."
         return {"report": vault_data}
@@ -72,12 +72,15 @@ class SoulCoreKernel:
                 yield word + " "
                 await asyncio.sleep(0.1)
         else:
-            # Valódi pipeline futtatás az Orchestratoron keresztül
-            result = await self.orchestrator.process_pipeline(user_input, chat_id=chat_id)
-            full_response = result.get("response", "...")
-            for word in full_response.split():
-                yield word + " "
-                await asyncio.sleep(0.02) # Minimális késleltetés a stream élményhez
+            # Valódi token stream az Orchestratoron keresztül
+            streamed = False
+            async for event in self.orchestrator.process_pipeline_stream(user_input, chat_id=chat_id):
+                if event["type"] == "token":
+                    streamed = True
+                    yield event["text"]
+                elif event["type"] == "done" and not streamed:
+                    # Nem érkezett <message> token (pl. fordított válasz) -> a végleges szöveg
+                    yield event["response"]
 
     async def main_pipeline(self, user_input: str, chat_id="default"):
         """A teljes kognitív lánc futtatása a konzolon."""
@@ -1,4 +1,5 @@
 import os
+import time
 import logging
 from huggingface_hub import snapshot_download
 from exllamav2 import (
@@ -61,18 +62,17 @@ class EXL2Slot(BaseSlot):
             exl2_config.model_dir = self.model_path
             exl2_config.prepare()
 
-            # 3. VRAM Allokáció (MB -> GB konverzió)
+            # 3. VRAM Allokáció (MB -> GB konverzió); a gpu_split az elhelyezés tervezőtől jön
             gpu_id = self.config.get('gpu_id', 0)
-            max_vram = float(self.config.get('max_vram_mb', 4096)) / 1024.0
-            
-            # Dinamikus split lista (max 2 GPU-ig, ahogy a tervedben szerepelt)
-            allocation = [0.0] * 2
-            if gpu_id < len(allocation):
-                allocation[gpu_id] = max_vram
+            split = self.config.get('gpu_split') or {gpu_id: self.config.get('max_vram_mb', 4096)}
+            allocation = [0.0] * (max(split) + 1)
+            for gpu, mb in split.items():
+                allocation[gpu] = float(mb) / 1024.0
+            max_vram = round(sum(allocation), 2)
             
             # 4. Modell betöltése
             self.model = ExLlamaV2(exl2_config)
-            self.logger.info(f"Modell betöltése a GPU:{gpu_id} eszközre ({max_vram} GB limit)...")
+            self.logger.info(f"Modell betöltése a GPU:{gpu_id} eszközre ({max_vram} GB limit, split: {allocation})...")
             self.model.load(allocation)
 
             # 5. Kiegészítők inicializálása
@@ -107,5 +107,12 @@ class EXL2Slot(BaseSlot):
         max_new_tokens = params.get('max_tokens', 200) if params else 200
         
         # Egyszerű generálás (a prompt levágásával a válaszról)
+        started = time.perf_counter()
         output = self.generator.generate_simple(prompt, max_new_tokens=max_new_tokens)
-        return output.replace(prompt, "").strip()
\ No newline at end of file
+        finished = time.perf_counter()
+        answer = output.replace(prompt, "").strip()
+        # A generate_simple egyben prefillel és dekódol: első-token idő nincs, csak az összesített tok/s
+        self.record_generation(self.tokenizer.encode(prompt).shape[-1],
+                               self.tokenizer.encode(answer).shape[-1] if answer else 0,
+                               started, finished=finished)
+        return answer
\ No newline at end of file
@@ -1,7 +1,11 @@
 import os
+import time
+import hashlib
+from collections import OrderedDict
 from huggingface_hub import hf_hub_download
 from llama_cpp import Llama
 from src.base_slot import BaseSlot
+from src.loaders.kv_state_store import KVStateStore
 
 class GGUFSlot(BaseSlot):
     def __init__(self, slot_name, config):
@@ -15,6 +19,16 @@ class GGUFSlot(BaseSlot):
         else:
             self.full_path = None
 
+        # Statikus prompt-prefixek llama.cpp állapota (hash -> (tokenek, LlamaState))
+        self.prefix_cache_size = config.get("prefix_cache_entries", 4)
+        self._prefix_states = OrderedDict()
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+
+        # Chatenkénti kontextus-állapot (opcionális, lásd enable_session_cache)
+        self.session_store = None
+        self._active_session = None
+
     def _ensure_model_exists(self):
         """Csak akkor reklamál vagy tölt le, ha nincs meg a fájl."""
         if not self.filename:
@@ -50,7 +64,8 @@ class GGUFSlot(BaseSlot):
                 model_path=self.full_path,
                 n_gpu_layers=-1, 
                 n_ctx=self.config.get("n_ctx", 2048), # MOST MÁR A TOKEN LIMITET HASZNÁLJUK!
-                verbose=False
+                verbose=False,
+                **self._placement_kwargs()
             )
             
             self.is_loaded = True
@@ -60,22 +75,174 @@ class GGUFSlot(BaseSlot):
             self.is_loaded = False
             raise
 
+    def _placement_kwargs(self):
+        """Az elhelyezés tervező kimenete (gpu_id / gpu_split) llama.cpp paraméterekként."""
+        split = self.config.get("gpu_split")
+        if not split:
+            return {}  # nincs terv: a llama.cpp alapértelmezése
+        gpu_id = int(self.config.get("gpu_id", 0))
+        tensor_split = [0.0] * (max(max(split), gpu_id) + 1)
+        for gpu, mb in split.items():
+            tensor_split[gpu] = float(mb)
+        return {"main_gpu": gpu_id, "tensor_split": tensor_split}
+
     def unload(self):
+        self.invalidate_prefix_cache()
         if hasattr(self, 'model') and self.model:
             self.model.close()
             del self.model
         self.is_loaded = False
         self.logger.info(f"Slot {self.name} VRAM felszabadítva.")
 
+    STOP_TOKENS = ["<|eot_id|>", "<|im_end|>", "User:", "Kópé:"]
+
+    def _restore_prefix(self, prompt, prefix):
+        """
+        A statikus prefix KV állapotának visszaállítása generálás előtt.
+        Az első alkalommal kiszámolja és elmenti; utána a llama.cpp csak a
+        változó részt prefilleli (a generate a leghosszabb közös előtagot újrahasznosítja).
+        """
+        if not prefix or not prompt.startswith(prefix):
+            return
+        key = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        try:
+            entry = self._prefix_states.get(key)
+            if entry is None:
+                tokens = self.model.tokenize(prefix.encode("utf-8"), special=True)
+                self.model.reset()
+                self.model.eval(tokens)
+                self._prefix_states[key] = (tokens, self.model.save_state())
+                while len(self._prefix_states) > self.prefix_cache_size:
+                    self._prefix_states.popitem(last=False)
+                self.prefix_misses += 1
+                return
+
+            self._prefix_states.move_to_end(key)
+            self.prefix_hits += 1
+            tokens, state = entry
+            # Ha a kontextus már ezzel a prefixszel kezdődik, a másolás is megspórolható
+            if self.model.n_tokens >= len(tokens) and list(self.model._input_ids[:len(tokens)]) == tokens:
+                return
+            self.model.load_state(state)
+        except Exception as e:
+            self.logger.warning(f"Prefix cache hiba, teljes prefill következik: {e}")
+            self._prefix_states.pop(key, None)
+
+    def enable_session_cache(self, root, max_bytes):
+        """Chatenkénti KV állapot mentése lemezre (LRU, méretkorláttal)."""
+        self.session_store = KVStateStore(os.path.join(root, self.name), max_bytes)
+
+    @staticmethod
+    def _common_prefix(a, b):
+        n = 0
+        for x, y in zip(a, b):
+            if x != y: break
+            n += 1
+        return n
+
+    def _prepare_context(self, prompt, params):
+        """Generálás előtt a lehető leghosszabb már kiszámolt előtag visszaállítása."""
+        session_id = params.get("session_id")
+        if session_id is not None and self.session_store and self._restore_session(prompt, session_id):
+            return
+        self._restore_prefix(prompt, params.get("prefix"))
+
+    def _restore_session(self, prompt, session_id):
+        """True, ha a kontextus a chat korábbi állapotából folytatódik."""
+        if self._active_session == session_id and self.model.n_tokens > 0:
+            return True  # az előző kör is ez a chat volt, a kontextus már a helyén van
+        try:
+            state = self.session_store.get(session_id)
+            if state is None:
+                return False
+            tokens = self.model.tokenize(prompt.encode("utf-8"), special=True)
+            current = self._common_prefix(self.model._input_ids[:self.model.n_tokens], tokens)
+            stored = self._common_prefix(state.input_ids[:state.n_tokens], tokens)
+            if stored <= current:
+                return False
+            self.model.load_state(state)
+            return True
+        except Exception as e:
+            self.logger.warning(f"Chat állapot visszaállítási hiba ({session_id}): {e}")
+            return False
+
+    def _save_session(self, session_id):
+        self._active_session = session_id
+        if session_id is None or not self.session_store:
+            return
+        try:
+            # A generáló szálon csak a memóriabeli másolat készül, a pickle és a lemez a tároló író szálán
+            self.session_store.put_async(session_id, self.model.save_state())
+        except Exception as e:
+            self.logger.warning(f"Chat állapot mentési hiba ({session_id}): {e}")
+
+    def invalidate_prefix_cache(self):
+        """Az elmentett prefix állapotok eldobása (pl. identitás változáskor)."""
+        self._prefix_states.clear()
+
+    def status(self):
+        data = super().status()
+        data["prefix_cache"] = {"entries": len(self._prefix_states),
+                                "hits": self.prefix_hits, "misses": self.prefix_misses}
+        if self.session_store:
+            data["session_cache"] = self.session_store.stats()
+        return data
+
+    def _completion(self, prompt, params):
+        """
+        A llama.cpp stream darabjai tokenszámlálással (a nem-stream generate is ezt használja).
+        Prefill / TTFT: a kontextus előkészítésétől az első darabig; a már kiszámolt
+        közös előtag (prefix / chat állapot) cached_tokens-ként számít.
+        """
+        started = time.perf_counter()
+        self._prepare_context(prompt, params)
+        # A kontextus a generálás közben már változik; megszakadt futás után nem mentünk
+        self._active_session = None
+        prompt_tokens = self.model.tokenize(prompt.encode("utf-8"), special=True)
+        cached = self._common_prefix(self.model._input_ids[:self.model.n_tokens], prompt_tokens)
+
+        first_token_at, parts = None, []
+        try:
+            for chunk in self.model(
+                prompt,
+                max_tokens=params.get("max_tokens", 512),
+                temperature=self.config.get("temperature", 0.7),
+                stop=self.STOP_TOKENS + params.get("stop", []),
+                stream=True
+            ):
+                text = chunk["choices"][0]["text"]
+                if text:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(text)
+                    yield text
+        finally:
+            finished = time.perf_counter()
+            completion = "".join(parts)
+            completion_tokens = len(self.model.tokenize(completion.encode("utf-8"), add_bos=False, special=True)) if completion else 0
+            self.record_generation(len(prompt_tokens), completion_tokens, started, first_token_at,
+                                   finished=finished, cached_tokens=cached)
+
     def generate(self, prompt, params=None):
         if not self.is_loaded: 
             return "Hiba: Modell nincs betöltve."
         
         params = params or {}
-        output = self.model(
-            prompt,
-            max_tokens=params.get("max_tokens", 512),
-            temperature=self.config.get("temperature", 0.7),
-            stop=["<|eot_id|>", "<|im_end|>", "User:", "Kópé:"]
-        )
-        return output["choices"][0]["text"].strip()
\ No newline at end of file
+        output = "".join(self._completion(prompt, params))
+        self._save_session(params.get("session_id"))
+        return output.strip()
+
+    def generate_stream(self, prompt, params=None):
+        """A llama.cpp stream iterátorát továbbítja darabonként (nyers, nem strip-elt szöveg)."""
+        if not self.is_loaded:
+            yield "Hiba: Modell nincs betöltve."
+            return
+
+        params = params or {}
+        try:
+            yield from self._completion(prompt, params)
+        except GeneratorExit:
+            # A hívó a válasz végén zárta le (pl. Sovereign.run_final): a kontextus ép, menthető
+            self._save_session(params.get("session_id"))
+            raise
+        self._save_session(params.get("session_id"))
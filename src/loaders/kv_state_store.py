@@ -0,0 +1,150 @@
+import os
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+class KVStateStore:
+    """
+    Lemezes, méretkorlátos (LRU) tároló a llama.cpp kontextus-állapotokhoz, chat_id szerint.
+
+    Egy beszélgetés folytatásakor a slot visszatölti az előző kör állapotát, így
+    a llama.cpp a közös előtagot nem számolja újra. A legrégebben használt
+    állapotok törlődnek, ha az összméret meghaladja a `max_bytes` értéket.
+    A lemezre írás (pickle) háttér szálon fut (`put_async`); chatenként csak a
+    legfrissebb, még ki nem írt állapot marad a sorban.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.logger = logging.getLogger("KVStateStore")
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()   # key -> (session_id, állapot), kiírásra vár
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._writer = None
+
+        # key -> méret (bájt); sorrend = LRU (a legrégebbi elöl)
+        self._index = OrderedDict()
+        files = [f for f in os.listdir(root) if f.endswith(".kv")]
+        for name in sorted(files, key=lambda f: os.path.getmtime(os.path.join(root, f))):
+            self._index[name[:-3]] = os.path.getsize(os.path.join(root, name))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.superseded = 0
+
+    @staticmethod
+    def _key(session_id):
+        return hashlib.sha1(str(session_id).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.kv")
+
+    def get(self, session_id):
+        key = self._key(session_id)
+        with self._lock:
+            if key in self._pending:
+                self.hits += 1
+                return self._pending[key][1]
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                state = pickle.load(f)
+            os.utime(self._path(key))
+            self.hits += 1
+            return state
+        except Exception as e:
+            self.logger.warning(f"Sérült KV állapot ({session_id}), eldobva: {e}")
+            self._remove(key)
+            self.misses += 1
+            return None
+
+    def put_async(self, session_id, state):
+        """Kiírás a háttér szálon; a generáló szál nem vár a pickle-re és a lemezre."""
+        key = self._key(session_id)
+        with self._wakeup:
+            if self._closed:
+                return
+            if key in self._pending:
+                self.superseded += 1
+            self._pending[key] = (session_id, state)
+            self._pending.move_to_end(key)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="KVStateWriter", daemon=True)
+                self._writer.start()
+            self._wakeup.notify()
+
+    def _write_loop(self):
+        while True:
+            with self._wakeup:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if not self._pending:
+                    return
+                key, (session_id, state) = self._pending.popitem(last=False)
+            self.put(session_id, state)
+
+    def close(self, timeout=30.0):
+        """A függő állapotok kiírása, majd az író szál leállítása (slot ürítéskor)."""
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+            writer = self._writer
+        if writer is not None:
+            writer.join(timeout)
+            if writer.is_alive():
+                self.logger.warning("A KV állapot író szál nem állt le időben.")
+
+    def put(self, session_id, state):
+        key = self._key(session_id)
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception as e:
+            self.logger.error(f"KV állapot mentési hiba ({session_id}): {e}")
+            if os.path.exists(tmp): os.remove(tmp)
+            return
+        with self._lock:
+            self._index[key] = os.path.getsize(path)
+            self._index.move_to_end(key)
+            victims = []
+            while sum(self._index.values()) > self.max_bytes and len(self._index) > 1:
+                victims.append(self._index.popitem(last=False)[0])
+        for victim in victims:
+            self.evictions += 1
+            self._remove(victim)
+
+    def _remove(self, key):
+        with self._lock:
+            self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            entries, used = len(self._index), sum(self._index.values())
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes_on_disk": used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "pending_writes": len(self._pending),
+            "superseded": self.superseded,
+        }
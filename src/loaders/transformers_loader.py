@@ -1,7 +1,24 @@
+import time
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers.generation.streamers import BaseStreamer
 from src.base_slot import BaseSlot
 
+class _TokenClock(BaseStreamer):
+    """A generate() streamere csak időméréshez: az első put a prompt, a második az első új token."""
+
+    def __init__(self):
+        self.puts = 0
+        self.first_token_at = None
+
+    def put(self, value):
+        self.puts += 1
+        if self.puts == 2:
+            self.first_token_at = time.perf_counter()
+
+    def end(self):
+        pass
+
 class TransformersSlot(BaseSlot):
     def load(self):
         self.logger.info(f"Hivatalos Transformers modell betöltése: {self.config['repo_id']}")
@@ -23,6 +40,11 @@ class TransformersSlot(BaseSlot):
         self.is_loaded = False
 
     def generate(self, prompt, params=None):
+        params = params or {}
+        started = time.perf_counter()
         inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
-        outputs = self.model.generate(**inputs, max_new_tokens=params.get('max_tokens', 200))
+        clock = _TokenClock()
+        outputs = self.model.generate(**inputs, max_new_tokens=params.get('max_tokens', 200), streamer=clock)
+        prompt_tokens = inputs["input_ids"].shape[-1]
+        self.record_generation(prompt_tokens, outputs.shape[-1] - prompt_tokens, started, clock.first_token_at)
         return self.tokenizer.decode(outputs[0], skip_special_tokens=True).replace(prompt, "")
@@ -2,25 +2,43 @@ import logging
 import time
 import asyncio
 import os
-import re
 import json
-import contextlib
 import psutil
-from datetime import datetime
+import contextlib
 from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from src.database import SoulCoreDatabase
 from src.prompts import staff_prompts
 from src.utils.monitor import SoulCoreMonitor # Bekötjük a valódi monitort
+from src.utils.tag_parser import StreamingTagParser
+from src.scheduler import SlotScheduler, Priority, SlotPreempted
+from src.pipeline_graph import Stage, StageGraph
+from src.slot_manager import SlotManager, SlotUnavailable
+from src.placement import plan_placement, primary_gpu, compare_usage
+from src.utils.stage_memo import StageMemo
+from src.utils.startup_timeline import StartupTimeline
+from src.utils.metrics import Trace, pipeline_registry
 
 class Orchestrator:
     def __init__(self, db_path="vault/db/soulcore.db"):
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger("Kernel.Orchestrator")
-        self.db = SoulCoreDatabase(db_path=db_path)
+        # Indítási idővonal a folyamat indulásától (import, DB, slotok, bemelegítés)
+        self.timeline = StartupTimeline(origin=psutil.Process().create_time())
+        with self.timeline.phase("db_init"):
+            # Az embedding / reranker a slotokkal párhuzamosan töltődik (boot_slots)
+            self.db = SoulCoreDatabase(db_path=db_path, defer_models=True)
         
         # Monitor inicializálása a pontos telemetriához
         self.monitor = SoulCoreMonitor()
         self.start_time = self.monitor.start_time
+        # Az események kötegelten az audit_logs táblába is kerülnek (storage.event_log)
+        if (self.db.get_config("storage") or {}).get("event_log", {}).get("audit", True):
+            self.monitor.events.attach_sink(self.db.write_audit_events)
+        # Háttér mintavételező (TelemetrySampler); ha be van kötve, a telemetria abból jön
+        self.telemetry = None
+        # Lépés / slot késleltetés hisztogramok és számlálók (/metrics)
+        self.metrics = pipeline_registry()
         
         # Identitás betöltése az adatbázisból
         self.sovereign_info = self.db.get_sovereign_identity()
@@ -31,10 +49,182 @@ class Orchestrator:
         self.internal_lang = project_cfg.get('internal_lang', 'en')
         
         self.slots = {}
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # VRAM keret GPU-nként (hardware config); a slotok igény szerint töltődnek / ürülnek
+        self.hardware_cfg = self.db.get_config("hardware") or {}
+        self.slot_manager = self._build_slot_manager(self.hardware_cfg)
+        self.placement = None
+        # Opt-in forgalomrögzítés a /process kérésekről (tools/replay_traffic.py)
+        self.traffic_recorder = self._build_traffic_recorder(self.db.get_config("api") or {})
+        # Konfig módosítás élőben (DB "config" esemény)
+        self.db.add_listener("config", self._on_config_change)
+        # Slotonkénti sor + szál; a rövid, determinisztikus lépések sorban álló azonos
+        # kérései összevonhatók (hardware.scheduler.max_batch, alapból 1 = nincs összevonás)
+        self.scheduler = SlotScheduler(self.slots, batchable={
+            "scribe": {"analyze"},
+            "translator": {"generate"},
+        }, max_batch=int(self.hardware_cfg.get("scheduler", {}).get("max_batch", 1)), manager=self.slot_manager)
+
+        # Determinisztikus lépések (Scribe, fordító) eredményeinek memoizálása (storage.stage_memo)
+        memo_cfg = (self.db.get_config("storage") or {}).get("stage_memo", {})
+        self.stage_memo = None
+        if memo_cfg.get("enabled", True):
+            self.stage_memo = StageMemo(self.db.pool,
+                                        memory_entries=memo_cfg.get("memory_entries", 2048),
+                                        disk_entries=memo_cfg.get("disk_entries", 50000))
+
+        # Szemantikus válasz-cache (opcionális): új tudás esetén az érintett bejegyzések törlődnek
+        self.semantic_cache = None
+        sc_cfg = (self.db.get_config("rag_system") or {}).get("semantic_cache", {})
+        if sc_cfg.get("enabled", False):
+            from src.utils.semantic_cache import SemanticCache
+            self.semantic_cache = SemanticCache(
+                threshold=sc_cfg.get("threshold", 0.95),
+                ttl_sec=sc_cfg.get("ttl_sec", 3600),
+                max_entries_per_user=sc_cfg.get("max_entries_per_user", 256),
+                near_miss_margin=sc_cfg.get("near_miss_margin", 0.05)
+            )
+            self.db.add_listener("knowledge", lambda user_id=None: self.semantic_cache.invalidate(user_id))
+
+    def _slot_manager_settings(self, hw_cfg):
+        """A hardware configból képzett SlotManager beállítások (induláskor és élő módosításkor is)."""
+        mgr_cfg = hw_cfg.get("slot_manager", {})
+        budgets = {int(g): mb for g, mb in (hw_cfg.get("vram_budget_mb") or {}).items()}
+        if not budgets and hw_cfg.get("total_vram_limit_mb"):
+            gpu_count = max(1, hw_cfg.get("gpu_count", 1))
+            budgets = {g: hw_cfg["total_vram_limit_mb"] // gpu_count for g in range(gpu_count)}
+        headroom = mgr_cfg.get("headroom_mb", 0)
+        return {
+            "budgets_mb": {g: mb - headroom for g, mb in budgets.items()},
+            "pinned": mgr_cfg.get("pinned", ["king"]),
+            "lazy": mgr_cfg.get("lazy", True),
+            "min_residency_sec": mgr_cfg.get("min_residency_sec", 60),
+            "wait_sec": mgr_cfg.get("wait_sec", 30),
+        }
+
+    def _build_slot_manager(self, hw_cfg):
+        return SlotManager(self.slots, measure=self._gpu_used_mb, **self._slot_manager_settings(hw_cfg))
+
+    def _on_config_change(self, key, value):
+        """Élő konfig módosítás: identitás, nyelvek és VRAM keret újraindítás nélkül."""
+        if key == "project":
+            project_cfg = value or {}
+            self.user_lang = project_cfg.get('user_lang', 'hu')
+            self.internal_lang = project_cfg.get('internal_lang', 'en')
+            self.refresh_identity()
+            self.logger.info(f"🔧 Projekt konfig frissítve (nyelvek: {self.user_lang}/{self.internal_lang})")
+        elif key == "hardware":
+            self.hardware_cfg = value or {}
+            self.slot_manager.configure(**self._slot_manager_settings(self.hardware_cfg))
+            self.logger.info("🔧 Hardver konfig frissítve (slot manager keretek)")
+        elif key == "api":
+            # Csak a traffic_recorder beállításainak változása cseréli a rögzítőt (és a szálát)
+            if (value or {}).get("traffic_recorder", {}) != self._traffic_cfg:
+                previous = self.traffic_recorder
+                self.traffic_recorder = self._build_traffic_recorder(value or {})
+                if previous: previous.close()
+                self.logger.info(f"🔧 Forgalomrögzítés: {'be' if self.traffic_recorder else 'ki'}")
+
+    def _build_traffic_recorder(self, api_cfg):
+        """Opt-in /process forgalomrögzítő (api.traffic_recorder); kikapcsolva None."""
+        rec_cfg = api_cfg.get("traffic_recorder", {})
+        self._traffic_cfg = rec_cfg
+        if not rec_cfg.get("enabled", False):
+            return None
+        from src.utils.traffic_recorder import TrafficRecorder
+        return TrafficRecorder(path=rec_cfg.get("path", "vault/traces/traffic.jsonl"),
+                               sample_rate=rec_cfg.get("sample_rate", 1.0),
+                               salt=rec_cfg.get("salt"),
+                               max_mb=rec_cfg.get("max_mb", 256),
+                               max_chats=rec_cfg.get("max_chats", 100000))
 
-    def boot_slots(self):
-        """Slotok dinamikus betöltése az adatbázis alapján."""
+    def _slot_requirement_mb(self, slot):
+        """Becsült VRAM igény: mért > konfigurált max_vram_mb > modellfájl mérete (+15% KV / puffer)."""
+        measured = self.slot_manager.measured_mb.get(slot.name)
+        if measured:
+            return measured
+        if slot.config.get("max_vram_mb"):
+            return int(slot.config["max_vram_mb"])
+        path = getattr(slot, "full_path", None)
+        if path and os.path.exists(path):
+            return int(os.path.getsize(path) / 1024**2 * 1.15)
+        return 0
+
+    def _gpu_capacities(self):
+        """Eszközönkénti kapacitás: NVML összméret, a slot manager keretével korlátozva."""
+        budgets = self.slot_manager.budgets
+        caps = {dev["index"]: dev["vram_total_mb"] for dev in self._hardware_snapshot()
+                if dev.get("type") == "gpu"}
+        if not caps:
+            return dict(budgets)
+        return {g: min(mb, budgets.get(g, mb)) for g, mb in caps.items()}
+
+    def apply_slot_placement(self):
+        """Elhelyezési terv számítása és alkalmazása a (még be nem töltött) slotok konfigurációjára."""
+        place_cfg = self.hardware_cfg.get("placement", {})
+        capacities = self._gpu_capacities()
+        if not place_cfg.get("enabled", True) or not capacities:
+            return None
+        pending = {n: s for n, s in self.slots.items() if not s.is_loaded}
+        plan = plan_placement(
+            {name: self._slot_requirement_mb(slot) for name, slot in pending.items()},
+            capacities,
+            pinned={n: int(g) for n, g in place_cfg.get("pinned", {}).items() if n in pending},
+            allow_split=place_cfg.get("allow_split", True)
+        )
+        for name, parts in plan["assignments"].items():
+            cfg = self.slots[name].config
+            cfg["gpu_id"] = primary_gpu(parts)
+            # Ismeretlen méretű slotnál csak az eszközt jelöljük ki, arányt nem
+            if sum(parts.values()):
+                cfg["gpu_split"] = parts
+            else:
+                cfg.pop("gpu_split", None)
+            self.logger.info(f"🧩 Elhelyezés: {name} -> {parts}")
+        for name in plan["unplaced"]:
+            self.logger.warning(f"⚠️ {name} nem fér el a terv szerint, marad a konfigurált GPU {self.slots[name].config.get('gpu_id', 0)}.")
+        self.placement = plan
+        return plan
+
+    def placement_report(self):
+        """Tervezett vs. tényleges VRAM foglalás (eszközönként és slotonként)."""
+        if not self.placement:
+            return {"enabled": False}
+        actual = {g: self._gpu_used_mb(g) for g in self.placement["predicted_mb"]}
+        return {
+            "assignments": self.placement["assignments"],
+            "unplaced": self.placement["unplaced"],
+            "devices": compare_usage(self.placement, {g: mb for g, mb in actual.items() if mb is not None}),
+            "slots": {name: {
+                "predicted_mb": sum(parts.values()),
+                "measured_mb": self.slot_manager.measured_mb.get(name),
+                "loaded": self.slots[name].is_loaded,
+            } for name, parts in self.placement["assignments"].items()},
+        }
+
+    def _hardware_snapshot(self, fresh=False):
+        """
+        Hardver adatok a közös TelemetrySampler-ből (egyetlen NVML gazda); `fresh` esetén
+        új mintát kér tőle. Mintavételező nélkül (pl. konzolos futás) a saját monitor.
+        """
+        if self.telemetry:
+            stats = self.telemetry.sample() if fresh else None
+            return stats if stats is not None else self.telemetry.latest()
+        return self.monitor.get_hardware_stats()
+
+    def _gpu_used_mb(self, gpu_id):
+        """Az adott GPU foglalt VRAM-ja (NVML); None, ha nem mérhető."""
+        # Betöltés előtti / utáni mérés: a másodperces pillanatkép itt elavult lehet
+        for dev in self._hardware_snapshot(fresh=True):
+            if dev.get("type") == "gpu" and dev.get("index") == gpu_id:
+                return dev.get("vram_used_mb")
+        return None
+
+    def boot_slots(self, stop=None):
+        """
+        Slotok dinamikus betöltése az adatbázis alapján.
+        `stop` (threading.Event): leállításkor a következő slot már nem töltődik be;
+        a folyamatban lévő betöltés nem szakítható meg, az a végéig fut.
+        """
         from src.slots.specialized_slots import Scribe, Valet, Sovereign
         from src.loaders.gguf_loader import GGUFSlot
         
@@ -46,155 +236,504 @@ class Orchestrator:
             "king": Sovereign
         }
 
+        # Chatenkénti KV állapot cache (storage.kv_cache), alapból kikapcsolva: a King sablon
+        # nem hordoz chat előzményt, így a statikus prefix cache-en felül nem nyer semmit
+        storage_cfg = self.db.get_config("storage") or {}
+        kv_cfg = storage_cfg.get("kv_cache", {})
+        kv_root = os.path.join(storage_cfg.get("vault_root", "./vault"), "kv_cache")
+
         for name, cfg in active_slots.items():
             cls = slot_class_map.get(name, GGUFSlot)
             instance = cls(name, cfg)
             self.slots[name] = instance
-            try:
-                # Elnémítjuk a felesleges C++ logokat a betöltéskor
-                with open(os.devnull, "w") as fnull:
-                    with contextlib.redirect_stderr(fnull):
-                        instance.load()
-                self.logger.info(f"✅ Slot aktív: {name} (Class: {cls.__name__})")
-            except Exception as e:
-                self.logger.error(f"❌ Hiba a {name} betöltésekor: {e}")
+            if kv_cfg.get("enabled", False) and name in kv_cfg.get("slots", ["king"]) and hasattr(instance, "enable_session_cache"):
+                instance.enable_session_cache(kv_root, int(kv_cfg.get("max_mb", 4096)) * 1024**2)
+
+        # GPU elhelyezés a tényleges eszközök alapján (a statikus gpu_id helyett)
+        with self.timeline.phase("placement"):
+            self.apply_slot_placement()
+
+        # Lusta módban induláskor csak a rögzített slotok töltődnek, a többi első használatkor
+        manager = self.slot_manager
+        to_load = []
+        for name in self.slots:
+            if manager.lazy and name not in manager.pinned:
+                self.logger.info(f"💤 Slot igény szerint töltődik: {name}")
+            else:
+                to_load.append(name)
+
+        # Eszközönként egy sor: a különböző GPU-kon ülő slotok és a RAG modellek egyszerre töltődnek
+        groups = {}
+        for name in to_load:
+            groups.setdefault(tuple(manager.gpus_of(name)), []).append(name)
+
+        def load_group(names):
+            for name in names:
+                if stop is not None and stop.is_set():
+                    self.logger.info(f"⏹️ Boot megszakítva, kihagyva: {name}")
+                    continue
+                try:
+                    with self.timeline.phase(f"slot:{name}", gpus=manager.gpus_of(name)):
+                        manager.ensure_loaded(name)
+                    self.logger.info(f"✅ Slot aktív: {name} (Class: {type(self.slots[name]).__name__})")
+                except SlotUnavailable as e:
+                    self.logger.error(f"❌ Hiba a {name} betöltésekor: {e}")
+
+        def warm_up(phase, fn):
+            if stop is not None and stop.is_set():
+                return
+            with self.timeline.phase(phase):
+                fn()
+
+        with self.timeline.phase("boot_slots"):
+            with ThreadPoolExecutor(max_workers=len(groups) + 2, thread_name_prefix="Boot") as pool:
+                tasks = [pool.submit(load_group, names) for names in groups.values()]
+                if not self.db.embedder:
+                    tasks.append(pool.submit(warm_up, "warmup:embedding", self.db.init_vector_engine))
+                if not self.db.reranker and self.db.rag_cfg.get("reranker", {}).get("enabled"):
+                    tasks.append(pool.submit(warm_up, "warmup:reranker", self.db.init_reranker))
+                for task in tasks:
+                    task.result()
+        self.timeline.log_summary()
 
     def get_hardware_stats(self):
         """
         Bővített telemetria: Most már a GPU adatokat is tartalmazza 
         a korábbi csak CPU/RAM helyett.
         """
-        hw_data = self.monitor.get_hardware_stats()
+        hw_data = self._hardware_snapshot()
         return {
             "hardware": hw_data,
             "uptime": round(time.time() - self.start_time, 2),
-            "slots": {name: slot.status() for name, slot in self.slots.items()}
+            "slots": {name: slot.status() for name, slot in self.slots.items()},
+            "scheduler": self.scheduler.stats(),
+            "slot_manager": self.slot_manager.stats()
         }
 
+    def _slot_available(self, slot_name):
+        # Lusta módban a be nem töltött slot is hívható: a slot manager első használatkor tölti be
+        slot = self.slots.get(slot_name)
+        return slot is not None and (slot.is_loaded or self.slot_manager.lazy)
+
     async def _run_in_thread(self, slot_name, method_name, *args, **kwargs):
-        """Biztonságos futtatás külön szálon a blokkolás elkerülésére."""
-        if slot_name not in self.slots or not self.slots[slot_name].is_loaded:
+        """
+        Biztonságos futtatás a slot saját sorában és szálán (a Llama nem párhuzamosítható).
+        Háttérmunkához add meg: priority=Priority.BACKGROUND (interaktív kérés kiszoríthatja).
+        """
+        if not self._slot_available(slot_name):
             self.logger.warning(f"Slot {slot_name} nem elérhető!")
             return None
         
-        slot_instance = self.slots[slot_name]
-        method = getattr(slot_instance, method_name)
+        start, status = time.perf_counter(), "ok"
+        try:
+            return await self.scheduler.submit(slot_name, method_name, *args, **kwargs)
+        except SlotUnavailable as e:
+            status = "unavailable"
+            self.logger.warning(f"Slot {slot_name} nem elérhető: {e}")
+            return None
+        except SlotPreempted:
+            status = "preempted"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self._observe_slot_call(slot_name, method_name, start, status)
+
+    async def _stream_in_thread(self, slot_name, method_name, *args, **kwargs):
+        """Egy slot generátor metódusának darabjai a slot során át, async generátorként."""
+        if not self._slot_available(slot_name):
+            self.logger.warning(f"Slot {slot_name} nem elérhető!")
+            return
         
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, lambda: method(*args, **kwargs))
+        start, status = time.perf_counter(), "ok"
+        try:
+            # A lezárás továbbmegy a scheduler streamjére is (ott áll le a slot generálása)
+            async with contextlib.aclosing(self.scheduler.stream(slot_name, method_name, *args, **kwargs)) as stream:
+                async for chunk in stream:
+                    yield chunk
+        except SlotUnavailable as e:
+            status = "unavailable"
+            self.logger.warning(f"Slot {slot_name} nem elérhető: {e}")
+        except GeneratorExit:
+            # A hívó lezárta a streamet (pl. a válasz kész) – ez nem hiba
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self._observe_slot_call(slot_name, method_name, start, status)
+
+    def _observe_slot_call(self, slot_name, method_name, start, status):
+        self.metrics.observe("slot_call_duration_seconds", time.perf_counter() - start, slot=slot_name, method=method_name)
+        self.metrics.inc("slot_calls", slot=slot_name, method=method_name, status=status)
+
+    def metrics_text(self):
+        """OpenMetrics kimenet; a slot állapotok a lekérés pillanatában frissülnek."""
+        mgr = self.slot_manager.stats()
+        for name, info in mgr["slots"].items():
+            self.metrics.set("slot_loaded", 1 if info["loaded"] else 0, slot=name)
+        for name, slot in self.slots.items():
+            self.metrics.set("slot_prompt_tokens", slot.total_prompt_tokens, slot=name)
+            self.metrics.set("slot_completion_tokens", slot.total_completion_tokens, slot=name)
+        self.metrics.set("slot_loads", mgr["loads"])
+        self.metrics.set("slot_evictions", mgr["evictions"])
+        return self.metrics.render()
+
+    async def _memoized(self, stage, slot_name, prompt, compute, keep=bool):
+        """
+        Determinisztikus lépés memoizálva (kulcs: lépés + slot modell + teljes prompt).
+        Találatnál a modell és a slot sora is kimarad; csak a `keep` szerint érvényes eredmény kerül tárolásra.
+        """
+        slot = self.slots.get(slot_name)
+        if not self.stage_memo or slot is None or prompt is None:
+            return await compute()
+        model_id = slot.config.get("filename") or slot.config.get("model_name", slot_name)
+        # A memória szint az eseményhurokon fut, az SQLite olvasás szálon
+        cached = self.stage_memo.get_memory(stage, model_id, prompt)
+        if cached is None:
+            cached = await asyncio.to_thread(self.stage_memo.get_disk, stage, model_id, prompt)
+        if cached is not None:
+            return cached
+        result = await compute()
+        if keep(result):
+            self.stage_memo.put(stage, model_id, prompt, result)
+        return result
+
+    @staticmethod
+    def _scribe_result_ok(result):
+        # A hibás / fallback elemzés nem kerülhet a memo-ba
+        if isinstance(result, dict):
+            return bool(result) and result.get("intent") not in ("error", "unknown") and result.get("day_is") != "unknown"
+        return bool(result)
+
+    async def _scribe(self, method, text):
+        """Scribe.analyze / Scribe.run_keywords memoizálva."""
+        slot = self.slots.get("scribe")
+        prompt = slot.memo_prompt(method, text) if hasattr(slot, "memo_prompt") else None
+        return await self._memoized(f"scribe.{method}", "scribe", prompt,
+                                    lambda: self._run_in_thread("scribe", method, text),
+                                    keep=self._scribe_result_ok)
 
     async def _translate(self, text, to_lang="en"):
         if "translator" not in self.slots or not text: return text
         
-        prompt = (f"<|start_header_id|>system<|end_header_id|>\n\nTranslate to {to_lang}. "
-                  f"Provide ONLY the translated text, no chatter.<|eot_id|><|start_header_id|>user<|end_header_id|>\n\n{text}<|eot_id|>"
-                  f"<|start_header_id|>assistant<|end_header_id|>\n\n")
+        prefix = (f"<|start_header_id|>system<|end_header_id|>\n\nTranslate to {to_lang}. "
+                  f"Provide ONLY the translated text, no chatter.<|eot_id|><|start_header_id|>user<|end_header_id|>\n\n")
+        prompt = f"{prefix}{text}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
         
-        res = await self._run_in_thread("translator", "generate", prompt, {"max_tokens": 512, "temperature": 0.1})
-        return res.strip() if res else text
-
-    def _parse_tags(self, text):
-        """Kinyeri a tag-eket a Sovereign válaszából."""
-        tags = ["note", "message", "translate"]
-        extracted_map = {tag: None for tag in tags}
-        
-        if not text:
-            return {**extracted_map, "clean_text": ""}
-
-        for tag in tags:
-            pattern = rf"<{tag}>(.*?)(?:</{tag}>|$)"
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-            if match:
-                extracted_map[tag] = match.group(1).strip()
+        async def run():
+            res = await self._run_in_thread("translator", "generate", prompt,
+                                            {"max_tokens": 512, "temperature": 0.1, "prefix": prefix})
+            return res.strip() if res else None
         
-        # Tiszta szöveg kinyerése
-        if extracted_map["message"]:
-            extracted_map["clean_text"] = extracted_map["message"]
-        elif extracted_map["translate"]:
-            extracted_map["clean_text"] = extracted_map["translate"]
-        else:
-            temp = re.sub(r'<[^>]+>.*?</[^>]+>', '', text, flags=re.DOTALL)
-            extracted_map["clean_text"] = re.sub(r'<[^>]+>', '', temp).strip()
-            
-        return extracted_map
+        return await self._memoized("translate", "translator", prompt, run) or text
 
-    async def process_pipeline(self, user_query, chat_id="default_chat", user_id="Grumpy"):
-        start_process = time.time()
-        self.logger.info(f"--- Pipeline Start: {user_query[:50]}... ---")
-        
-        # Üzenet mentése a DB-be
-        self.db.save_message(chat_id, "user", user_query)
-        
-        # 1. SCRIBE - Elemzés
-        scribe_info = {}
-        if "scribe" in self.slots:
-            scribe_info = await self._run_in_thread("scribe", "analyze", user_query)
-        self.logger.info(f"Scribe Info: {scribe_info}")
-
-        # 2. VALET - RAG és Helyzetjelentés
-        keywords = scribe_info.get("keywords", user_query) if isinstance(scribe_info, dict) else user_query
-        vault_data = self.db.query_vault(keywords, user_id=user_id)
-        
-        situational_report = ""
-        if "valet" in self.slots:
-            situational_report = await self._run_in_thread(
-                "valet", "run_report", 
-                vault_data=vault_data, 
-                scribe_info=scribe_info, 
-                raw_input=user_query
-            )
-        self.logger.info(f"Valet Report Kész.")
+    def _king_fallback(self):
+        return getattr(self.slots.get("king"), "FALLBACK_REPLY",
+                       "Hiba történt a belső gondolatmenetemben. Kérlek, próbáld újra!")
 
-        # 3. ELŐKÉSZÍTÉS A KIRÁLYNAK (Belső nyelv használata)
-        english_query = await self._translate(user_query, to_lang=self.internal_lang)
-        
-        # 4. KING - Szuverén döntéshozatal
-        raw_king_response = ""
-        if "king" in self.slots:
-            raw_king_response = await self._run_in_thread(
-                "king", "run_final",
-                report=situational_report,
-                user_input=english_query,
-                identity_data=self.sovereign_info
-            )
-        
-        # Tag parszolás
-        parsed_king = self._parse_tags(raw_king_response)
+    def _parse_tags(self, text, initial_tag="note"):
+        """Kinyeri a tag-eket a Sovereign válaszából (a King prompt <note>-tal zárul)."""
+        return StreamingTagParser.parse(text, initial_tag=initial_tag)
+
+    async def _prepare_king_context(self, user_query, chat_id, user_id, trace):
+        """
+        A King előtti lépések deklarált gráfként, maximális párhuzamossággal.
+        A kérdés fordítása független a Scribe -> Vault -> Valet ágtól, így azzal együtt fut.
+        Visszatér: (situational_report, english_query); a lépések a `trace` span-jei közé kerülnek.
+        """
+        async def save_user(_):
+            # Üzenet mentése a DB-be (a commit ideje külön span)
+            trace.track("db.save_user", self.db.save_message(chat_id, "user", user_query, user_id=user_id, wait=False))
+
+        async def scribe(_):
+            # 1. SCRIBE - Elemzés
+            scribe_info = {}
+            if "scribe" in self.slots:
+                scribe_info = await self._scribe("analyze", user_query)
+            self.logger.info(f"Scribe Info: {scribe_info}")
+            return scribe_info
+
+        async def vault(results):
+            # 2. VALET - RAG
+            scribe_info = results["scribe"]
+            keywords = scribe_info.get("keywords", user_query) if isinstance(scribe_info, dict) else user_query
+            return await self.db.aquery_vault(keywords, user_id=user_id, trace=trace)
+
+        async def valet(results):
+            # Helyzetjelentés
+            situational_report = ""
+            if "valet" in self.slots:
+                situational_report = await self._run_in_thread(
+                    "valet", "run_report", 
+                    vault_data=results["vault"], 
+                    scribe_info=results["scribe"], 
+                    raw_input=user_query
+                )
+            self.logger.info(f"Valet Report Kész.")
+            return situational_report
+
+        async def translate_in(_):
+            # 3. ELŐKÉSZÍTÉS A KIRÁLYNAK (Belső nyelv használata)
+            return await self._translate(user_query, to_lang=self.internal_lang)
+
+        graph = StageGraph([
+            Stage("save_user", save_user),
+            Stage("scribe", scribe, slot="scribe"),
+            Stage("vault", vault, deps=["scribe"]),
+            Stage("valet", valet, deps=["scribe", "vault"], slot="valet"),
+            Stage("translate_in", translate_in, slot="translator"),
+        ])
+        results, _ = await graph.run(trace=trace)
+        return results["valet"], results["translate_in"]
+
+    async def _finalize_king_response(self, parsed_king, situational_report, english_query, chat_id, user_id, trace):
+        """A King utáni lépések: memória trigger, visszafordítás, mentés."""
         self.logger.info(f"King Note: {parsed_king.get('note', 'Nincs megjegyzés')}")
 
         # 5. SCRIBE - Mentés (Trigger alapú memória)
         if parsed_king.get("note") and "trigger_scribe" in parsed_king["note"].lower():
             self.logger.info("🎯 Scribe Trigger aktív - Mentés folyamatban...")
             # Biztonságosabb szintézis futtatás
-            scribe_data = await self._run_in_thread("scribe", "run_synthesis", english_query, situational_report)
+            with trace.span("scribe.synthesis", slot="scribe"):
+                scribe_data = await self._run_in_thread("scribe", "run_synthesis", english_query, situational_report)
             if isinstance(scribe_data, dict) and "new_facts" in scribe_data:
                 for fact in scribe_data.get("new_facts", []):
                     self.db.save_to_long_memory(fact, metadata="auto-extracted")
 
         # 6. VÉGSŐ VÁLASZ
         if parsed_king.get("translate"):
-            final_response = await self._translate(parsed_king["translate"], to_lang=self.user_lang)
+            with trace.span("translate_out", slot="translator"):
+                final_response = await self._translate(parsed_king["translate"], to_lang=self.user_lang)
         else:
             final_response = parsed_king.get("clean_text") or "..."
 
         # Mentés és Debug adatok eltárolása
-        self.db.save_message(chat_id, "assistant", final_response, 
-                               debug={"note": parsed_king.get("note"), "report": situational_report})
+        trace.track("db.save_assistant", self.db.save_message(
+            chat_id, "assistant", final_response,
+            debug={"note": parsed_king.get("note"), "report": situational_report},
+            user_id=user_id, wait=False))
+        return final_response
+
+    async def _semantic_lookup(self, user_query, user_id, trace):
+        """Visszatér: (vektor, cache-elt válasz vagy None, hasonlóság). Kikapcsolt cache-nél (None, None, 0.0)."""
+        if not self.semantic_cache or not getattr(self.db, "embedder", None):
+            return None, None, 0.0
+        with trace.span("semantic_lookup"):
+            try:
+                vector = await self.db.aembed_query(user_query)
+            except Exception as e:
+                self.logger.warning(f"Szemantikus cache lekérdezési hiba: {e}")
+                return None, None, 0.0
+            response, score = self.semantic_cache.lookup(user_id, vector)
+        return vector, response, score
+
+    def _semantic_hit(self, user_query, response, score, chat_id, user_id, start_process, trace):
+        """Cache találat: a beszélgetés naplója ugyanúgy bővül, mint teljes futásnál."""
+        self.logger.info(f"⚡ Szemantikus cache találat ({round(score, 3)})")
+        self.db.save_message(chat_id, "user", user_query, user_id=user_id, wait=False)
+        self.db.save_message(chat_id, "assistant", response, debug={"note": "semantic_cache", "similarity": score},
+                             user_id=user_id, wait=False)
+        return {
+            "identity": self.identity,
+            "response": response,
+            "chat_id": chat_id,
+            "metadata": {"time": round(time.time() - start_process, 3), "trace_id": trace.trace_id,
+                         "cache": "hit", "similarity": round(score, 4), "stages": trace.report()}
+        }
+
+    def _semantic_store(self, user_id, vector, user_query, final_response, answered):
+        """Csak valódi King válasz kerülhet a cache-be (`answered`), hiba / fallback szöveg soha."""
+        if answered and vector is not None and final_response:
+            self.semantic_cache.store(user_id, vector, final_response, user_query)
+
+    async def process_pipeline(self, user_query, chat_id="default_chat", user_id="Grumpy"):
+        start_process = time.time()
+        trace = Trace(self.metrics, kind="process")
+        self.logger.info(f"--- Pipeline Start [{trace.trace_id}]: {user_query[:50]}... ---")
+        try:
+            result = await self._process_traced(user_query, chat_id, user_id, start_process, trace)
+        except BaseException:
+            trace.finish("error")
+            raise
+        trace.finish("ok", cache=result["metadata"].get("cache", "miss"))
+        return result
+
+    async def _process_traced(self, user_query, chat_id, user_id, start_process, trace):
+        query_vector, cached, score = await self._semantic_lookup(user_query, user_id, trace)
+        if cached is not None:
+            return self._semantic_hit(user_query, cached, score, chat_id, user_id, start_process, trace)
+        
+        situational_report, english_query = await self._prepare_king_context(user_query, chat_id, user_id, trace)
+        
+        # 4. KING - Szuverén döntéshozatal
+        raw_king_response, king_failed = "", False
+        if "king" in self.slots:
+            try:
+                with trace.span("king", slot="king"):
+                    raw_king_response = await self._run_in_thread(
+                        "king", "run_final",
+                        report=situational_report,
+                        user_input=english_query,
+                        identity_data=self.sovereign_info,
+                        session_id=chat_id
+                    )
+            except Exception as e:
+                self.logger.critical(f"Sovereign (King) hiba a végső generálásnál: {e}")
+                raw_king_response, king_failed = self._king_fallback(), True
         
-        self.logger.info(f"--- Pipeline End ({round(time.time() - start_process, 2)}s) ---")
+        parsed_king = self._parse_tags(raw_king_response)
+        final_response = await self._finalize_king_response(
+            parsed_king, situational_report, english_query, chat_id, user_id, trace)
+        
+        answered = not king_failed and bool(parsed_king.get("message") or parsed_king.get("translate"))
+        self._semantic_store(user_id, query_vector, user_query, final_response, answered)
+        self.logger.info(f"--- Pipeline End [{trace.trace_id}] ({round(time.time() - start_process, 2)}s) ---")
 
         return {
             "identity": self.identity,
             "response": final_response,
             "chat_id": chat_id,
-            "metadata": {"time": round(time.time() - start_process, 3)}
+            "metadata": {"time": round(time.time() - start_process, 3), "trace_id": trace.trace_id,
+                         "stages": trace.report()}
         }
 
+    async def process_pipeline_stream(self, user_query, chat_id="default_chat", user_id="Grumpy"):
+        """
+        A process_pipeline streamelő változata (async generator).
+        Események: {"type": "token", "text": ...} a <message> tartalmából, amint megjelenik,
+        végül {"type": "done", ...} a process_pipeline-nal azonos eredménnyel.
+        """
+        start_process = time.time()
+        trace = Trace(self.metrics, kind="stream")
+        self.logger.info(f"--- Stream Pipeline Start [{trace.trace_id}]: {user_query[:50]}... ---")
+        outcome, cache = "error", "miss"
+        try:
+            query_vector, cached, score = await self._semantic_lookup(user_query, user_id, trace)
+            if cached is not None:
+                outcome, cache = "ok", "hit"
+                first_token_at = time.time()
+                yield {"type": "token", "text": cached}
+                hit = self._semantic_hit(user_query, cached, score, chat_id, user_id, start_process, trace)
+                hit["metadata"]["ttft"] = round(first_token_at - start_process, 3)
+                yield {"type": "done", **hit}
+                return
+            
+            situational_report, english_query = await self._prepare_king_context(user_query, chat_id, user_id, trace)
+            
+            # 4. KING - tokenenként; csak a <message> tartalma mehet ki, a <note> rejtve marad
+            parser = StreamingTagParser(initial_tag="note")
+            first_token_at, king_failed = None, False
+            if "king" in self.slots:
+                king_start, king_status = time.perf_counter(), "ok"
+                try:
+                    # aclosing: a break (vagy a kliens bontása) azonnal lezárja a streamet, ami
+                    # a slot szálán futó generálást is leállítja – nem a GC-re várunk
+                    async with contextlib.aclosing(self._stream_in_thread(
+                        "king", "run_final_stream",
+                        report=situational_report,
+                        user_input=english_query,
+                        identity_data=self.sovereign_info,
+                        session_id=chat_id
+                    )) as king_stream:
+                        async for chunk in king_stream:
+                            visible = parser.feed(chunk)
+                            if visible:
+                                if first_token_at is None:
+                                    first_token_at = time.time()
+                                yield {"type": "token", "text": visible}
+                            if parser.finished:
+                                # A válasz (és az esetleges <translate>) kész
+                                break
+                except Exception as e:
+                    self.logger.critical(f"Sovereign (King) hiba a streamelt generálásnál: {e}")
+                    king_failed, king_status = True, "error"
+                    visible = parser.feed(f"<message>{self._king_fallback()}</message>")
+                    if visible:
+                        yield {"type": "token", "text": visible}
+                trace.record("king", king_start, time.perf_counter(), slot="king", status=king_status)
+                visible = parser.flush()
+                if visible:
+                    yield {"type": "token", "text": visible}
+            
+            parsed_king = parser.result()
+            final_response = await self._finalize_king_response(
+                parsed_king, situational_report, english_query, chat_id, user_id, trace)
+            
+            answered = not king_failed and bool(parsed_king.get("message") or parsed_king.get("translate"))
+            self._semantic_store(user_id, query_vector, user_query, final_response, answered)
+            self.logger.info(f"--- Stream Pipeline End [{trace.trace_id}] ({round(time.time() - start_process, 2)}s) ---")
+            outcome = "ok"
+            yield {
+                "type": "done",
+                "identity": self.identity,
+                "response": final_response,
+                "chat_id": chat_id,
+                "metadata": {
+                    "time": round(time.time() - start_process, 3),
+                    "ttft": round(first_token_at - start_process, 3) if first_token_at else None,
+                    "trace_id": trace.trace_id,
+                    "stages": trace.report()
+                }
+            }
+        except GeneratorExit:
+            # A kliens a válasz vége előtt bontott
+            outcome = "aborted"
+            raise
+        finally:
+            trace.finish(outcome, cache=cache)
+
+    def refresh_identity(self):
+        """
+        Identitás újraolvasása. Ha változott, a King statikus prefix állapotai elavultak,
+        ezért eldobjuk őket (a hash-alapú kulcs miatt úgysem találnának többé).
+        """
+        info = self.db.get_sovereign_identity()
+        if info == self.sovereign_info:
+            return False
+        self.sovereign_info = info
+        self.identity = info["name"]
+        king = self.slots.get("king")
+        if king and hasattr(king, "invalidate_prefix_cache"):
+            king.invalidate_prefix_cache()
+        self.logger.info(f"Identitás frissítve: {self.identity}")
+        return True
+
+    async def check_proactive_intent(self):
+        """
+        Háttér reflexió: kezdeményezzen-e a King proaktív kommunikációt?
+        BACKGROUND prioritással fut, így egy felhasználói kérés megszakítja.
+        """
+        if "king" not in self.slots or not getattr(self.slots["king"], 'is_loaded', False):
+            return False
+        prompt = (
+            "<|im_start|>system\nYou are SoulCore Internal Sentry. "
+            "Analyze system state. Reply 'YES' or 'NO' only.<|im_end|>\n"
+            "<|im_start|>user\nShould we initiate proactive communication?<|im_end|>\n"
+            "<|im_start|>assistant\n"
+        )
+        try:
+            decision = await self._run_in_thread("king", "generate", prompt, {"max_tokens": 5, "temperature": 0.0},
+                                                 priority=Priority.BACKGROUND)
+        except SlotPreempted:
+            self.logger.info("Reflexió elhalasztva: interaktív kérés élvez elsőbbséget.")
+            return False
+        return bool(decision and "YES" in decision.upper())
+
     def shutdown(self):
         self.logger.info("SoulCore rendszerek leállítása...")
         # Leállás előtt egy utolsó hardver státusz logolás (elhagyható, ha zavar)
         self.monitor.log_event("Orchestrator", "Rendszer leállítása kezdeményezve.")
+        # Előbb a sorok leállítása, hogy futó feladat ne kapjon kiürített modellt
+        self.scheduler.shutdown()
+        self.slot_manager.evict_all(include_pinned=True)
+        if self.traffic_recorder: self.traffic_recorder.close()
         for slot in self.slots.values():
-            if hasattr(slot, 'unload'): slot.unload()
-        self.db.close()
-        self.executor.shutdown(wait=False)
\ No newline at end of file
+            # Amit a slot manager nem tudott üríteni (pl. még futó hívás alatt álló slot)
+            if getattr(slot, "is_loaded", False) and hasattr(slot, 'unload'): slot.unload()
+            if getattr(slot, "session_store", None): slot.session_store.close()
+        # A sorban álló események még az adatbázis lezárása előtt kiíródnak
+        self.monitor.events.flush()
+        self.monitor.events.detach_sink(self.db.write_audit_events)
+        self.db.close()
\ No newline at end of file
@@ -0,0 +1,83 @@
+import time
+import asyncio
+import logging
+
+class Stage:
+    """Egy pipeline lépés: név, függőségek, használt slot és egy async függvény."""
+
+    def __init__(self, name, fn, deps=(), slot=None):
+        self.name = name
+        self.fn = fn            # async fn(results) -> érték; a results a függőségek eredményeit tartalmazza
+        self.deps = tuple(deps)
+        self.slot = slot        # csak megfigyelhetőséghez / tervezéshez
+
+class StageGraph:
+    """
+    Deklarált lépésgráf maximális párhuzamossággal.
+
+    Minden lépés azonnal elindul, amint a függőségei elkészültek; a független
+    ágak (pl. a kérdés fordítása vs. Scribe -> Vault -> Valet) egyszerre futnak.
+    A futás lépésenkénti kezdő/záró időket is visszaad.
+    """
+
+    def __init__(self, stages):
+        self.logger = logging.getLogger("Kernel.StageGraph")
+        self.stages = {s.name: s for s in stages}
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done: return
+            if name in visiting:
+                raise ValueError(f"Körkörös függőség a pipeline gráfban: {name}")
+            if name not in self.stages:
+                raise ValueError(f"Ismeretlen lépés a függőségek között: {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    async def run(self, trace=None):
+        """
+        Visszatér: (eredmények lépésnévvel, időzítések másodpercben a futás kezdetéhez képest).
+        Ha `trace` adott (src.utils.metrics.Trace), minden lépés span-ként is rögzül.
+        """
+        results, timings, tasks = {}, {}, {}
+        origin = time.perf_counter()
+
+        async def execute(stage):
+            if stage.deps:
+                await asyncio.gather(*(tasks[d] for d in stage.deps))
+            started, status = time.perf_counter(), "ok"
+            try:
+                results[stage.name] = await stage.fn(results)
+            except BaseException:
+                status = "error"
+                raise
+            finally:
+                ended = time.perf_counter()
+                timings[stage.name] = {
+                    "slot": stage.slot,
+                    "start": round(started - origin, 4),
+                    "end": round(ended - origin, 4),
+                }
+                if trace:
+                    trace.record(stage.name, started, ended, slot=stage.slot, status=status)
+
+        for name in self.order:
+            tasks[name] = asyncio.ensure_future(execute(self.stages[name]))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return results, timings
@@ -0,0 +1,76 @@
+"""
+Slot -> GPU elhelyezés tervező.
+
+Tiszta függvények (nincs GPU / NVML / modell hívás), így új hardver elrendezés
+is megtervezhető és ellenőrizhető egy sima gépen:
+
+    plan = plan_placement({"king": 14000, "valet": 4000}, {0: 16000, 1: 16000}, pinned={"king": 0})
+    plan["assignments"]  # {"king": {0: 14000}, "valet": {1: 4000}}
+"""
+
+def plan_placement(requirements, capacities, pinned=None, allow_split=True, headroom_mb=0):
+    """
+    Bin-packing elhelyezés.
+
+    requirements: {slot: MB}, capacities: {gpu: MB}, pinned: {slot: gpu} (kötelező eszköz).
+    Először a rögzített slotok kerülnek a helyükre, majd a többi méret szerint csökkenő
+    sorrendben a legszűkebb, de még elegendő eszközre (best-fit). Ha egyetlen eszközre
+    sem fér, és `allow_split`, a modell több eszköz között oszlik meg (a legtöbb szabad hellyel kezdve).
+
+    Visszatér: {"assignments": {slot: {gpu: MB}}, "predicted_mb": {gpu: MB},
+                "free_mb": {gpu: MB}, "unplaced": [slot, ...]}
+    """
+    pinned = pinned or {}
+    free = {gpu: cap - headroom_mb for gpu, cap in capacities.items()}
+    assignments, unplaced = {}, []
+
+    def take(name, gpu, mb):
+        assignments.setdefault(name, {})[gpu] = assignments.get(name, {}).get(gpu, 0) + mb
+        free[gpu] -= mb
+
+    # 1. Rögzített slotok: csak a kijelölt eszközre kerülhetnek
+    for name in sorted((n for n in requirements if n in pinned), key=lambda n: -requirements[n]):
+        gpu, mb = pinned[name], requirements[name]
+        if gpu in free and free[gpu] >= mb:
+            take(name, gpu, mb)
+        else:
+            unplaced.append(name)
+
+    # 2. A többi: csökkenő méret, best-fit, szükség esetén megosztva
+    for name in sorted((n for n in requirements if n not in pinned), key=lambda n: (-requirements[n], n)):
+        mb = requirements[name]
+        fitting = [g for g in free if free[g] >= mb]
+        if fitting:
+            take(name, min(fitting, key=lambda g: (free[g], g)), mb)
+        elif allow_split and sum(max(f, 0) for f in free.values()) >= mb:
+            remaining = mb
+            for gpu in sorted(free, key=lambda g: (-free[g], g)):
+                part = min(remaining, free[gpu])
+                if part <= 0: break
+                take(name, gpu, part)
+                remaining -= part
+        else:
+            unplaced.append(name)
+
+    predicted = {gpu: 0 for gpu in capacities}
+    for parts in assignments.values():
+        for gpu, mb in parts.items():
+            predicted[gpu] += mb
+
+    return {"assignments": assignments, "predicted_mb": predicted, "free_mb": free, "unplaced": unplaced}
+
+def primary_gpu(parts):
+    """A megosztott elhelyezés fő eszköze (ahol a legnagyobb rész van)."""
+    return max(parts, key=lambda g: (parts[g], -g))
+
+def compare_usage(plan, actual_mb):
+    """Tervezett vs. mért foglalás eszközönként (actual_mb: {gpu: MB}, hiányzó érték = nem mérhető)."""
+    report = {}
+    for gpu, predicted in plan["predicted_mb"].items():
+        actual = actual_mb.get(gpu)
+        report[gpu] = {
+            "predicted_mb": predicted,
+            "actual_mb": actual,
+            "delta_mb": actual - predicted if actual is not None else None,
+        }
+    return report
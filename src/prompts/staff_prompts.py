@@ -32,4 +32,13 @@ KING = {
 }
 
 # Ez biztosítja, hogy a specialized_slots.py Sovereign osztálya ne kapjon KeyError-t
-SOVEREIGN = KING
\ No newline at end of file
+SOVEREIGN = KING
+
+def render_prefix(template, variable_fields, **static_values):
+    """
+    A sablon statikus eleje: az első kérésenként változó mező előtti rész, kitöltve.
+    A GGUF slotok ennek a KV állapotát tartják meg és állítják vissza (prefix cache).
+    """
+    cut = min((template.index("{" + f + "}") for f in variable_fields if "{" + f + "}" in template),
+              default=len(template))
+    return template[:cut].format(**static_values)
\ No newline at end of file
@@ -0,0 +1,311 @@
+import time
+import asyncio
+import logging
+import threading
+import contextlib
+from enum import IntEnum
+from collections import deque
+
+class Priority(IntEnum):
+    """Kisebb érték = előbb fut."""
+    INTERACTIVE = 0     # felhasználói kérés
+    BACKGROUND = 1      # heartbeat reflexió, proaktív szándék
+    MAINTENANCE = 2     # karbantartás, előmelegítés
+
+class SlotPreempted(Exception):
+    """A háttérfeladatot egy interaktív kérés kedvéért megszakítottuk."""
+
+class _Job:
+    __slots__ = ("method", "args", "kwargs", "future", "loop", "enqueued_at", "on_chunk", "stop", "priority")
+
+    def __init__(self, method, args, kwargs, future, loop, on_chunk=None, priority=Priority.INTERACTIVE):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.loop = loop
+        self.enqueued_at = time.time()
+        self.on_chunk = on_chunk      # streaming job esetén: darabonkénti callback
+        self.stop = threading.Event() # leállítás: bontott stream vagy preempció
+        self.priority = Priority(priority)
+
+    @property
+    def preemptible(self):
+        return self.priority > Priority.INTERACTIVE
+
+    def batch_key(self):
+        # Csak azonos metódusú és azonos kiegészítő paraméterű kérések vonhatók össze
+        return (self.method, repr(self.args[1:]), repr(sorted(self.kwargs.items())))
+
+class SlotWorker:
+    """Egy slot saját, sorrendtartó sora és dedikált végrehajtó szála."""
+
+    def __init__(self, name, slots, batchable=(), max_batch=1, manager=None):
+        self.name = name
+        self.slots = slots
+        self.manager = manager      # SlotManager: lusta betöltés + ürítés elleni védelem futás közben
+        self.batchable = set(batchable)
+        self.max_batch = max_batch
+        self.logger = logging.getLogger(f"Scheduler.{name}")
+
+        # Prioritásonként külön FIFO; azonos prioritáson belül a sorrend megmarad
+        self._queues = {p: deque() for p in Priority}
+        self._cond = threading.Condition()
+        self._running = True
+        self._current = None
+
+        # Metrikák
+        self.processed = 0
+        self.batches = 0
+        self.preempted = 0
+        self.cancelled = 0
+        self.wait = {p: {"count": 0, "total": 0.0, "max": 0.0} for p in Priority}
+
+        self._thread = threading.Thread(target=self._loop, name=f"Slot-{name}", daemon=True)
+        self._thread.start()
+
+    def put(self, job):
+        with self._cond:
+            self._queues[job.priority].append(job)
+            # Interaktív kérés érkezett: a futó háttérmunka tokenhatáron megszakad
+            current = self._current
+            if current and current.preemptible and job.priority < current.priority:
+                current.stop.set()
+            self._cond.notify()
+
+    def cancel_pending(self, min_priority=Priority.BACKGROUND):
+        """A sorban álló (még el nem indult) alacsonyabb prioritású feladatok törlése."""
+        with self._cond:
+            dropped = []
+            for p in Priority:
+                if p >= min_priority:
+                    dropped.extend(self._queues[p])
+                    self._queues[p].clear()
+        for job in dropped:
+            self.cancelled += 1
+            self._resolve(job, error=SlotPreempted(f"{self.name}: háttérfeladat törölve."))
+        return len(dropped)
+
+    def _take(self):
+        """Következő feladat; batch-elhető metódusnál a sorban álló társait is összegyűjti."""
+        with self._cond:
+            while self._running and not any(self._queues.values()):
+                self._cond.wait()
+            if not self._running:
+                return []
+            queue = next(q for q in self._queues.values() if q)
+            first = queue.popleft()
+            batch = [first]
+            if first.method in self.batchable and first.on_chunk is None and self.max_batch > 1:
+                key = first.batch_key()
+                rest = deque()
+                while queue and len(batch) < self.max_batch:
+                    job = queue.popleft()
+                    (batch if job.on_chunk is None and job.batch_key() == key else rest).append(job)
+                rest.extend(queue)
+                queue.clear()
+                queue.extend(rest)
+            self._current = first
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = [job for job in self._take() if not job.future.cancelled()]
+            if not self._running:
+                break
+            if not batch:
+                self._current = None
+                continue
+
+            now = time.time()
+            for job in batch:
+                waited = now - job.enqueued_at
+                w = self.wait[job.priority]
+                w["count"] += 1
+                w["total"] += waited
+                w["max"] = max(w["max"], waited)
+
+            try:
+                self._execute(batch)
+            finally:
+                self._current = None
+                self.processed += len(batch)
+                self.batches += 1
+
+    def _execute(self, batch):
+        slot = self.slots.get(self.name)
+        first = batch[0]
+        try:
+            if slot is None:
+                raise RuntimeError(f"Slot {self.name} nem létezik.")
+            with (self.manager.use(self.name) if self.manager else contextlib.nullcontext()):
+                self._run(slot, batch)
+        except SlotPreempted as e:
+            self.preempted += 1
+            self.logger.info(f"Preempció: {e}")
+            for job in batch:
+                self._resolve(job, error=e)
+        except Exception as e:
+            self.logger.error(f"Végrehajtási hiba ({first.method}, {len(batch)} kérés): {e}")
+            for job in batch:
+                self._resolve(job, error=e)
+
+    def _run(self, slot, batch):
+        first = batch[0]
+        if len(batch) > 1:
+            batch_method = getattr(slot, f"{first.method}_batch", None)
+            if batch_method is not None:
+                results = batch_method([job.args[0] for job in batch], *first.args[1:], **first.kwargs)
+                for job, res in zip(batch, results):
+                    self._resolve(job, res)
+                return
+            # Nincs <metódus>_batch: kérésenként, egymás hibájától függetlenül
+            for job in batch:
+                try:
+                    self._resolve(job, getattr(slot, job.method)(*job.args, **job.kwargs))
+                except Exception as e:
+                    self._resolve(job, error=e)
+            return
+        method = getattr(slot, first.method)
+        if first.on_chunk is not None:
+            for chunk in method(*first.args, **first.kwargs):
+                if first.stop.is_set():
+                    if first.preemptible: raise SlotPreempted(f"{self.name}: stream megszakítva.")
+                    break
+                first.on_chunk(chunk)
+            self._resolve(first, None)
+        elif first.preemptible and first.method == "generate" and hasattr(slot, "generate_stream"):
+            # Háttér generálás streamként fut, így tokenhatáron megszakítható
+            parts = []
+            for chunk in slot.generate_stream(*first.args, **first.kwargs):
+                if first.stop.is_set():
+                    raise SlotPreempted(f"{self.name}: háttér generálás megszakítva.")
+                parts.append(chunk)
+            self._resolve(first, "".join(parts).strip())
+        else:
+            self._resolve(first, method(*first.args, **first.kwargs))
+
+    @staticmethod
+    def _resolve(job, result=None, error=None):
+        def apply():
+            if job.future.done(): return
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        job.loop.call_soon_threadsafe(apply)
+
+    def stats(self):
+        now = time.time()
+        with self._cond:
+            depth = {p.name.lower(): len(q) for p, q in self._queues.items()}
+            heads = [q[0].enqueued_at for q in self._queues.values() if q]
+            current = self._current
+        wait = {p.name.lower(): {
+                    "count": w["count"],
+                    "avg_sec": round(w["total"] / w["count"], 4) if w["count"] else 0.0,
+                    "max_sec": round(w["max"], 3),
+                } for p, w in self.wait.items()}
+        return {
+            "queue_depth": sum(depth.values()),
+            "queue_by_priority": depth,
+            "busy": current is not None,
+            "running_priority": current.priority.name.lower() if current else None,
+            "oldest_wait_sec": round(now - min(heads), 3) if heads else 0.0,
+            "processed": self.processed,
+            "batches": self.batches,
+            "preempted": self.preempted,
+            "cancelled": self.cancelled,
+            "wait_by_priority": wait,
+        }
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            pending = [job for q in self._queues.values() for job in q]
+            for q in self._queues.values(): q.clear()
+            self._cond.notify_all()
+        for job in pending:
+            self._resolve(job, error=RuntimeError("Ütemező leállítva."))
+
+class SlotScheduler:
+    """
+    Slotonkénti sorok és végrehajtók.
+
+    Egy llama.cpp `Llama` objektum nem használható párhuzamosan, ezért minden
+    slot saját szálon, sorrendben kapja a munkát. `max_batch` > 1 esetén a
+    `batchable` metódusoknál (pl. Scribe.analyze, fordító) a sorban álló azonos
+    paraméterű kérések egyetlen `<metódus>_batch` hívásba kerülnek. Ez összevonás,
+    nem többszekvenciás inferencia: a GGUF slotok sorban generálnak, csak az
+    azonos promptokat számolják egyszer – ezért alapból kikapcsolva (max_batch=1).
+    """
+
+    def __init__(self, slots, batchable=None, max_batch=1, manager=None):
+        self.slots = slots
+        self.manager = manager
+        self.batchable = batchable or {}
+        self.max_batch = max_batch
+        self.workers = {}
+        self._lock = threading.Lock()
+
+    def _worker(self, slot_name):
+        with self._lock:
+            if slot_name not in self.workers:
+                self.workers[slot_name] = SlotWorker(
+                    slot_name, self.slots, self.batchable.get(slot_name, ()), self.max_batch, self.manager)
+            return self.workers[slot_name]
+
+    async def submit(self, slot_name, method_name, *args, priority=Priority.INTERACTIVE, **kwargs):
+        """
+        Feladat a slot sorába. A `priority` a metódus számára nem látszik.
+        Háttérfeladatnál SlotPreempted jelezheti, hogy interaktív munka kiszorította.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._worker(slot_name).put(_Job(method_name, args, kwargs, future, loop, priority=priority))
+        return await future
+
+    async def stream(self, slot_name, method_name, *args, priority=Priority.INTERACTIVE, **kwargs):
+        """Generátor metódus futtatása a slot szálán; a darabokat async generátorként adja."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        chunks = asyncio.Queue()
+        job = _Job(method_name, args, kwargs, future, loop,
+                   on_chunk=lambda c: loop.call_soon_threadsafe(chunks.put_nowait, c), priority=priority)
+        stop = job.stop
+        self._worker(slot_name).put(job)
+
+        getter = None
+        try:
+            while True:
+                getter = asyncio.ensure_future(chunks.get())
+                done, _ = await asyncio.wait({getter, future}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                # A feladat véget ért: a már sorban lévő darabok kiürítése
+                while not chunks.empty():
+                    yield chunks.get_nowait()
+                future.result()
+                break
+        finally:
+            if getter and not getter.done():
+                getter.cancel()
+            # Ha a fogyasztó kilép (pl. a kliens bontott), a generálás is álljon le
+            stop.set()
+            if not future.done():
+                future.cancel()
+
+    def cancel_background(self, slot_name=None, min_priority=Priority.BACKGROUND):
+        """Sorban álló háttérmunka törlése (egy slotnál vagy mindenhol)."""
+        workers = [self.workers[slot_name]] if slot_name in self.workers else \
+                  ([] if slot_name else list(self.workers.values()))
+        return sum(w.cancel_pending(min_priority) for w in workers)
+
+    def stats(self):
+        return {name: worker.stats() for name, worker in self.workers.items()}
+
+    def shutdown(self):
+        for worker in self.workers.values():
+            worker.shutdown()
@@ -0,0 +1,295 @@
+import os
+import sys
+import time
+import logging
+import threading
+import contextlib
+
+_quiet_lock = threading.Lock()
+_quiet_depth = 0
+_quiet_saved = None
+
+@contextlib.contextmanager
+def _quiet_stderr():
+    """
+    Szálbiztos stderr némítás: a párhuzamos betöltések egyetlen közös átirányítást használnak
+    (a contextlib.redirect_stderr egymásba ágyazva, több szálból rossz stream-et állítana vissza).
+    """
+    global _quiet_depth, _quiet_saved
+    with _quiet_lock:
+        if _quiet_depth == 0:
+            _quiet_saved = sys.stderr
+            sys.stderr = open(os.devnull, "w")
+        _quiet_depth += 1
+    try:
+        yield
+    finally:
+        with _quiet_lock:
+            _quiet_depth -= 1
+            if _quiet_depth == 0:
+                sys.stderr.close()
+                sys.stderr = _quiet_saved
+
+class SlotUnavailable(RuntimeError):
+    """A slot nem tölthető be (hiba, vagy nincs elég VRAM a keretben)."""
+
+class SlotManager:
+    """
+    VRAM-tudatos slot kezelő.
+
+    Minden slot költsége a betöltés után mért VRAM növekmény (ha van NVML),
+    különben a konfigurált `max_vram_mb`. A slotok első használatkor töltődnek be;
+    ha a GPU kerete (hardware config) nem elég, a legrégebben használt, nem rögzített
+    (`pinned`) és éppen nem dolgozó slotok ürülnek. A frissen betöltött slotok
+    `min_residency_sec` ideig nem üríthetők, így két slot nem pörgetheti egymást.
+    """
+
+    def __init__(self, slots, budgets_mb=None, pinned=(), lazy=True, min_residency_sec=60.0,
+                 wait_sec=30.0, retry_after_sec=30.0, measure=None):
+        self.logger = logging.getLogger("Kernel.SlotManager")
+        self.slots = slots
+        self.budgets = budgets_mb or {}    # gpu_id -> MB (hiányzó GPU = korlátlan)
+        self.pinned = set(pinned)
+        self.lazy = lazy
+        self.min_residency = min_residency_sec
+        self.wait_sec = wait_sec
+        self.retry_after = retry_after_sec
+        self.measure = measure              # gpu_id -> foglalt MB (vagy None)
+
+        self._lock = threading.Condition()  # könyvelés; a felszabaduló slotok jeleznek
+        self._device_locks = {}             # GPU-nként: betöltés / ürítés sorosítva (koherens VRAM mérleg)
+        self._in_use = {}
+        self._evicting = set()
+        self._loaded_at = {}
+        self._last_used = {}
+        self._failed_at = {}
+        self.measured_mb = {}
+
+        self.loads = 0
+        self.evictions = 0
+        self.denied = 0
+
+    def configure(self, budgets_mb=None, pinned=None, lazy=None, min_residency_sec=None, wait_sec=None):
+        """Beállítások élő módosítása; a már betöltött slotok maradnak, az új keret a következő betöltéstől él."""
+        with self._lock:
+            if budgets_mb is not None: self.budgets = budgets_mb
+            if pinned is not None: self.pinned = set(pinned)
+            if lazy is not None: self.lazy = lazy
+            if min_residency_sec is not None: self.min_residency = min_residency_sec
+            if wait_sec is not None: self.wait_sec = wait_sec
+            self._lock.notify_all()
+
+    # --- Költségek ---
+
+    def gpu_of(self, name):
+        return int(self.slots[name].config.get("gpu_id", 0))
+
+    def gpus_of(self, name):
+        """Az összes eszköz, amin a slot ül (megosztott elhelyezésnél több is)."""
+        split = self.slots[name].config.get("gpu_split")
+        return sorted(split) if split else [self.gpu_of(name)]
+
+    def cost_mb(self, name):
+        split = self.slots[name].config.get("gpu_split")
+        planned = sum(split.values()) if split else int(self.slots[name].config.get("max_vram_mb", 0) or 0)
+        return self.measured_mb.get(name) or planned
+
+    def share_mb(self, name, gpu_id):
+        """A slot költségéből az adott eszközre eső rész (megosztásnál a terv arányában)."""
+        split = self.slots[name].config.get("gpu_split")
+        if not split:
+            return self.cost_mb(name) if self.gpu_of(name) == gpu_id else 0
+        total = sum(split.values()) or 1
+        return round(self.cost_mb(name) * split.get(gpu_id, 0) / total)
+
+    def used_mb(self, gpu_id):
+        return sum(self.share_mb(n, gpu_id) for n, s in self.slots.items()
+                   if s.is_loaded and n not in self._evicting)
+
+    def _measure_total(self, gpus):
+        if not self.measure: return None
+        values = [self.measure(g) for g in gpus]
+        return None if any(v is None for v in values) else sum(values)
+
+    def _devices(self, gpus):
+        """Az eszköz zárak megszerzése rögzített sorrendben (különböző GPU-k párhuzamosan tölthetnek)."""
+        stack = contextlib.ExitStack()
+        with self._lock:
+            locks = [self._device_locks.setdefault(g, threading.Lock()) for g in sorted(set(gpus))]
+        for lock in locks:
+            stack.enter_context(lock)
+        return stack
+
+    def _all_gpus(self):
+        return sorted({g for n in self.slots for g in self.gpus_of(n)})
+
+    # --- Használat ---
+
+    @contextlib.contextmanager
+    def use(self, name):
+        """A slot a blokk idejére betöltve marad és nem üríthető."""
+        with self._lock:
+            self._in_use[name] = self._in_use.get(name, 0) + 1
+            self._last_used[name] = time.time()
+            ready = self.slots[name].is_loaded and name not in self._evicting
+        try:
+            if not ready:
+                self._load(name)
+            yield self.slots[name]
+        finally:
+            with self._lock:
+                self._in_use[name] -= 1
+                self._lock.notify_all()
+
+    def ensure_loaded(self, name):
+        with self.use(name):
+            pass
+
+    def _load(self, name):
+        slot = self.slots[name]
+        failed = self._failed_at.get(name)
+        if failed and time.time() - failed < self.retry_after:
+            raise SlotUnavailable(f"{name}: a legutóbbi betöltés sikertelen, újrapróbálás később.")
+
+        gpus = self.gpus_of(name)
+        with self._devices(gpus):
+            if slot.is_loaded and name not in self._evicting:
+                return
+            for gpu in gpus:
+                self._make_room(name, gpu)
+            before = self._measure_total(gpus)
+            try:
+                # Elnémítjuk a felesleges C++ logokat a betöltéskor
+                with _quiet_stderr():
+                    slot.load()
+            except Exception as e:
+                self._failed_at[name] = time.time()
+                raise SlotUnavailable(f"{name}: betöltési hiba: {e}") from e
+            after = self._measure_total(gpus)
+            if before is not None and after is not None and after > before:
+                self.measured_mb[name] = after - before
+
+            with self._lock:
+                self._failed_at.pop(name, None)
+                self._loaded_at[name] = time.time()
+                self.loads += 1
+            self.logger.info(f"📥 Slot betöltve: {name} (GPU {', '.join(map(str, gpus))}, ~{self.cost_mb(name)} MB)")
+
+    def _make_room(self, name, gpu):
+        """Hely felszabadítása a slot egy GPU-ján; szükség esetén vár, hogy egy áldozat szabaddá váljon."""
+        budget = self.budgets.get(gpu)
+        if budget is None:
+            return
+        need = self.share_mb(name, gpu)
+        deadline = time.time() + self.wait_sec
+        with self._lock:
+            while True:
+                victims, free = [], budget - self.used_mb(gpu)
+                for victim in self._eviction_order(gpu, exclude=name):
+                    if free >= need: break
+                    victims.append(victim)
+                    free += self.share_mb(victim, gpu)
+                if free >= need:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.denied += 1
+                    raise SlotUnavailable(
+                        f"{name}: nincs elég VRAM a GPU {gpu} keretében ({need} MB kell, {budget} MB keret).")
+                self._lock.wait(timeout=min(remaining, 1.0))
+            self._evicting.update(victims)
+        for victim in victims:
+            self._unload(victim)
+
+    def _eviction_order(self, gpu_id, exclude=None):
+        """Üríthető slotok LRU sorrendben: betöltve, nem rögzített, tétlen, letöltötte a minimális időt."""
+        now = time.time()
+        candidates = [n for n, s in self.slots.items()
+                      if n != exclude and s.is_loaded and n not in self.pinned and n not in self._evicting
+                      and gpu_id in self.gpus_of(n) and not self._in_use.get(n)
+                      and now - self._loaded_at.get(n, 0) >= self.min_residency]
+        return sorted(candidates, key=lambda n: self._last_used.get(n, 0))
+
+    def _unload(self, name):
+        try:
+            self.slots[name].unload()
+            self.logger.info(f"♻️ Slot ürítve (LRU): {name}")
+        except Exception as e:
+            self.logger.error(f"Hiba a(z) {name} ürítésekor: {e}")
+        finally:
+            with self._lock:
+                self._evicting.discard(name)
+                self._loaded_at.pop(name, None)
+                self.evictions += 1
+                self._lock.notify_all()
+
+    # --- Karbantartás (heartbeat / panic) ---
+
+    def relieve_pressure(self, gpu_id=None):
+        """
+        VRAM szorongatottság: a legrégebben használt üríthető slot ürítése. `gpu_id` megadásával
+        csak azon az eszközön (a heartbeat így hívja); nélküle minden GPU-n egy-egy.
+        """
+        freed = []
+        if gpu_id is not None:
+            gpus = [gpu_id]
+            # A megosztott slotok a többi eszközüket is érintik: azok zárja is kell
+            locked = sorted({g for n in self.slots if gpu_id in self.gpus_of(n) for g in self.gpus_of(n)} | {gpu_id})
+        else:
+            gpus = locked = self._all_gpus()
+        with self._devices(locked):
+            with self._lock:
+                for gpu in gpus:
+                    order = self._eviction_order(gpu)
+                    if order and order[0] not in freed:
+                        freed.append(order[0])
+                self._evicting.update(freed)
+            for name in freed:
+                self._unload(name)
+        return freed
+
+    def evict_all(self, include_pinned=False):
+        """Minden tétlen slot ürítése (a futó munkát nem szakítja meg)."""
+        with self._devices(self._all_gpus()):
+            with self._lock:
+                victims = [n for n, s in self.slots.items()
+                           if s.is_loaded and not self._in_use.get(n) and n not in self._evicting
+                           and (include_pinned or n not in self.pinned)]
+                self._evicting.update(victims)
+            for name in victims:
+                self._unload(name)
+        return victims
+
+    def revive_pinned(self):
+        """A rögzített slotoknak mindig betöltve kell lenniük (pl. King)."""
+        revived = []
+        for name in self.pinned:
+            if name in self.slots and not self.slots[name].is_loaded:
+                try:
+                    self.ensure_loaded(name)
+                    revived.append(name)
+                except SlotUnavailable as e:
+                    self.logger.error(f"❌ {e}")
+        return revived
+
+    def stats(self):
+        with self._lock:
+            gpus = sorted(set(self._all_gpus()) | set(self.budgets))
+            return {
+                "lazy": self.lazy,
+                "budgets_mb": {g: self.budgets.get(g) for g in gpus},
+                "used_mb": {g: self.used_mb(g) for g in gpus},
+                "slots": {n: {
+                    "gpu": self.gpu_of(n),
+                    "split_mb": {g: self.share_mb(n, g) for g in self.gpus_of(n)} if s.config.get("gpu_split") else None,
+                    "loaded": s.is_loaded,
+                    "pinned": n in self.pinned,
+                    "cost_mb": self.cost_mb(n),
+                    "measured": n in self.measured_mb,
+                    "in_use": self._in_use.get(n, 0),
+                    "last_used": self._last_used.get(n),
+                } for n, s in self.slots.items()},
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "denied": self.denied,
+            }
@@ -3,6 +3,7 @@ import json
 import re
 from datetime import datetime
 from src.loaders.gguf_loader import GGUFSlot
+from src.utils.tag_parser import StreamingTagParser
 from src.prompts import staff_prompts
 
 logger = logging.getLogger("Slots")
@@ -10,19 +11,34 @@ logger = logging.getLogger("Slots")
 class Scribe(GGUFSlot):
     """Az Írnok: Elemzés, kulcsszó kinyerés és logikai szintézis."""
 
+    ANALYZE_PARAMS = {"max_tokens": 128, "temperature": 0.1}
+    KEYWORDS_PROMPT = "### System: Extract 3-5 search keywords in English.\n### Input: {user_input}\n### Keywords:"
+
+    def _analyze_request(self):
+        """A sablon statikus mezői és a generálási paraméterek (a statikus prefixszel)."""
+        # Biztosítjuk, hogy minden kulcs megvan a formázáshoz
+        fields = {
+            "system": staff_prompts.SCRIBE.get("system", ""),
+            "timestamp": datetime.now().strftime('%Y-%m-%d %A')
+        }
+        prefix = staff_prompts.render_prefix(staff_prompts.SCRIBE["template"], ["user_input"], **fields)
+        return fields, {**self.ANALYZE_PARAMS, "prefix": prefix}
+
+    def memo_prompt(self, method, user_input):
+        """A memoizálható metódusok teljes promptja (ez a stage memo kulcsa)."""
+        if method == "analyze":
+            fields, _ = self._analyze_request()
+            return staff_prompts.SCRIBE["template"].format(user_input=user_input, **fields)
+        if method == "run_keywords":
+            return self.KEYWORDS_PROMPT.format(user_input=user_input)
+        return None
+
     def analyze(self, user_input):
         """Alapvető szándék- és metaadat elemzés."""
-        now = datetime.now().strftime('%Y-%m-%d %A')
-        
         try:
-            # Biztosítjuk, hogy minden kulcs megvan a formázáshoz
-            prompt = staff_prompts.SCRIBE["template"].format(
-                system=staff_prompts.SCRIBE.get("system", ""),
-                timestamp=now,
-                user_input=user_input
-            )
-            
-            raw = self.generate(prompt, params={"max_tokens": 128, "temperature": 0.1})
+            fields, params = self._analyze_request()
+            prompt = staff_prompts.SCRIBE["template"].format(user_input=user_input, **fields)
+            raw = self.generate(prompt, params=params)
             return self._clean_json(raw)
         except KeyError as e:
             logger.error(f"Scribe formázási hiba (hiányzó kulcs): {e}")
@@ -31,9 +47,19 @@ class Scribe(GGUFSlot):
             logger.error(f"Scribe kritikus hiba: {e}")
             return {"category": "chat", "intent": "error"}
 
+    def analyze_batch(self, user_inputs):
+        """Az ütemező által összegyűjtött analyze kérések egy menetben."""
+        try:
+            fields, params = self._analyze_request()
+            prompts = [staff_prompts.SCRIBE["template"].format(user_input=u, **fields) for u in user_inputs]
+            return [self._clean_json(raw) for raw in self.generate_batch(prompts, params=params)]
+        except Exception as e:
+            logger.error(f"Scribe batch hiba: {e}")
+            return [self.analyze(u) for u in user_inputs]
+
     def run_keywords(self, user_input_english):
         """Kulcsszavak a Vault (vektoros) kereséshez."""
-        prompt = f"### System: Extract 3-5 search keywords in English.\n### Input: {user_input_english}\n### Keywords:"
+        prompt = self.KEYWORDS_PROMPT.format(user_input=user_input_english)
         return self.generate(prompt, params={"max_tokens": 32, "temperature": 0.1}).strip()
 
     def run_synthesis(self, user_input, vault_data):
@@ -72,39 +98,70 @@ class Valet(GGUFSlot):
     
     def run_report(self, vault_data, scribe_info, raw_input):
         try:
-            prompt = staff_prompts.VALET["template"].format(
-                system=staff_prompts.VALET.get("system", ""),
+            template = staff_prompts.VALET["template"]
+            system = staff_prompts.VALET.get("system", "")
+            prompt = template.format(
+                system=system,
                 vault_data=vault_data,
                 scribe_info=json.dumps(scribe_info, ensure_ascii=False),
                 user_input=raw_input
             )
-            return self.generate(prompt, params={"max_tokens": 256, "temperature": 0.05})
+            prefix = staff_prompts.render_prefix(template, ["vault_data", "scribe_info", "user_input"], system=system)
+            return self.generate(prompt, params={"max_tokens": 256, "temperature": 0.05, "prefix": prefix})
         except Exception as e:
             logger.error(f"Valet hiba: {e}")
             return f"Error in synthesis: {vault_data}"
 
 class Sovereign(GGUFSlot):
     """A Király (Kópé): A végső, öntudattal rendelkező entitás válasza."""
+
+    # Nincs "</message>" stop: utána még jöhet <translate> blokk. A leállítás a
+    # StreamingTagParser.finished alapján történik (run_final itt, a stream az Orchestratorban).
+    FINAL_PARAMS = {"max_tokens": 512, "temperature": 0.7}
+    # A generálás hibáját az Orchestrator kezeli: ezt a választ kapja a felhasználó (cache-be nem kerül)
+    FALLBACK_REPLY = "Hiba történt a belső gondolatmenetemben. Kérlek, próbáld újra!"
     
-    def run_final(self, report, user_input, identity_data):
+    def _build_prompt(self, report, user_input, identity_data, session_id=None):
+        # Összehangolva a staff_prompts.KING["identity"] mezőivel
+        # Fontos: a .format() a staff_prompts-ban definiált neveket kapja meg
+        identity_text = staff_prompts.SOVEREIGN["identity"].format(
+            name=identity_data.get('name', 'Kópé'),
+            character_traits=identity_data.get('traits', 'Szuverén, intelligens entitás.'),
+            codename=identity_data.get('codename', 'Origó-0')
+        )
+        
+        # Végső prompt összeállítása
+        template = staff_prompts.SOVEREIGN["template"]
+        prompt = template.format(
+            identity=identity_text,
+            report=report,
+            protocol=staff_prompts.SOVEREIGN.get("protocol", "Standard protocol."),
+            user_input=user_input
+        )
+        # Az identitás fejléc kérésenként azonos: ennek KV állapota újrahasznosítható
+        prefix = staff_prompts.render_prefix(template, ["report", "user_input", "protocol"], identity=identity_text)
+        return prompt, {**self.FINAL_PARAMS, "prefix": prefix, "session_id": session_id}
+
+    def run_final(self, report, user_input, identity_data, session_id=None):
+        """
+        A nyers King kimenet; hiba esetén kivételt dob (a FALLBACK_REPLY-t az Orchestrator adja).
+        Streamként generál, és a válasz lezárulásakor bezárja a streamet (nem dekódol max_tokens-ig).
+        """
+        prompt, params = self._build_prompt(report, user_input, identity_data, session_id)
+        parser = StreamingTagParser(initial_tag="note")
+        parts = []
+        stream = self.generate_stream(prompt, params=params)
         try:
-            # Összehangolva a staff_prompts.KING["identity"] mezőivel
-            # Fontos: a .format() a staff_prompts-ban definiált neveket kapja meg
-            identity_text = staff_prompts.SOVEREIGN["identity"].format(
-                name=identity_data.get('name', 'Kópé'),
-                character_traits=identity_data.get('traits', 'Szuverén, intelligens entitás.'),
-                codename=identity_data.get('codename', 'Origó-0')
-            )
-            
-            # Végső prompt összeállítása
-            prompt = staff_prompts.SOVEREIGN["template"].format(
-                identity=identity_text,
-                report=report,
-                protocol=staff_prompts.SOVEREIGN.get("protocol", "Standard protocol."),
-                user_input=user_input
-            )
-            
-            return self.generate(prompt, params={"max_tokens": 512, "temperature": 0.7})
-        except Exception as e:
-            logger.critical(f"Sovereign (King) hiba a végső generálásnál: {e}")
-            return "Hiba történt a belső gondolatmenetemben. Kérlek, próbáld újra!"
\ No newline at end of file
+            for chunk in stream:
+                parts.append(chunk)
+                parser.feed(chunk)
+                if parser.finished:
+                    break
+        finally:
+            stream.close()
+        return "".join(parts).strip()
+
+    def run_final_stream(self, report, user_input, identity_data, session_id=None):
+        """A run_final streamelő párja: a nyers King kimenetet adja darabonként."""
+        prompt, params = self._build_prompt(report, user_input, identity_data, session_id)
+        yield from self.generate_stream(prompt, params=params)
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+class EmbeddingCache:
+    """
+    Kétszintű embedding cache.
+
+    1. szint: korlátos, memóriabeli LRU.
+    2. szint: SQLite `embedding_cache` tábla, a vektor tömör float32 blobként.
+    A kulcs a modell útvonalából és az (instrukciós prefixszel ellátott) szövegből képzett hash.
+    """
+
+    def __init__(self, pool, model_id, memory_entries=4096, disk_entries=200000):
+        self.logger = logging.getLogger("Database.EmbeddingCache")
+        self.pool = pool
+        self.model_id = model_id
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts_since_prune = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_memory(self, text):
+        """Csak a memóriát nézi (olcsó, hívható az event loopról)."""
+        k = self.key(text)
+        with self._lock:
+            vec = self._lru.get(k)
+            if vec is not None:
+                self._lru.move_to_end(k)
+                self.memory_hits += 1
+        return vec
+
+    def get_many_disk(self, texts):
+        """Lemezes keresés egy lekérdezéssel; a találatok a memóriába is bekerülnek."""
+        keys = {self.key(t): t for t in texts}
+        if not keys: return {}
+        found = {}
+        try:
+            marks = ",".join("?" * len(keys))
+            with self.pool.read() as conn:
+                rows = conn.execute(f"SELECT key, vector FROM embedding_cache WHERE key IN ({marks})",
+                                    list(keys)).fetchall()
+            for k, blob in rows:
+                vec = array("f")
+                vec.frombytes(blob)
+                found[keys[k]] = vec.tolist()
+        except Exception as e:
+            self.logger.error(f"Embedding cache olvasási hiba: {e}")
+
+        with self._lock:
+            self.disk_hits += len(found)
+            self.misses += len(set(texts) - set(found))
+        self._remember({self.key(t): v for t, v in found.items()})
+        return found
+
+    def put_many(self, items):
+        """items: {szöveg: vektor}. Memóriába azonnal, lemezre a háttér író soron át."""
+        if not items: return
+        now = datetime.now().isoformat()
+        rows = [(self.key(t), len(v), array("f", v).tobytes(), now) for t, v in items.items()]
+        self._remember({r[0]: v for r, v in zip(rows, items.values())})
+
+        statements = [("INSERT OR IGNORE INTO embedding_cache (key, dim, vector, created_at) VALUES (?, ?, ?, ?)", r)
+                      for r in rows]
+        self._inserts_since_prune += len(rows)
+        if self._inserts_since_prune >= 1000:
+            # FIFO jellegű ritkítás: a legrégebbi sorok törlése a limit felett
+            statements.append(("DELETE FROM embedding_cache WHERE rowid <= (SELECT MAX(rowid) FROM embedding_cache) - ?",
+                               (self.disk_entries,)))
+            self._inserts_since_prune = 0
+        self.pool.write(statements, wait=False)
+
+    def _remember(self, entries):
+        with self._lock:
+            for k, v in entries.items():
+                self._lru[k] = v
+                self._lru.move_to_end(k)
+            while len(self._lru) > self.memory_entries:
+                self._lru.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._lru),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,135 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+
+class EmbeddingService:
+    """
+    Mikro-batch-elő embedding szolgáltatás.
+
+    A beérkező encode kéréseket egy háttérszál gyűjti: az első kérés után
+    legfeljebb `window_ms` ideig vár a többire, majd egyetlen batch-elt
+    `model.encode` hívással szolgálja ki mindet. Az asyncio hívók az
+    `aencode`-ot használják, így az event loop sosem blokkol a modellen.
+    Opcionális `cache` (EmbeddingCache) esetén az ismert szövegek kihagyják a modellt.
+    """
+
+    def __init__(self, model, window_ms=5.0, max_batch=32, cache=None):
+        self.logger = logging.getLogger("Database.Embedding")
+        self.model = model
+        self.cache = cache
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._requests = queue.Queue()
+        self._closed = False
+        # A modellt egyszerre csak egy szál hajtja (batcher vagy tömeges ingest)
+        self._model_lock = threading.Lock()
+
+        # Statisztika: hány kérés hány forward passban ment le
+        self.requests_total = 0
+        self.batches_total = 0
+
+        self._worker = threading.Thread(target=self._loop, name="EmbeddingBatcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """Egy szöveg beküldése; concurrent.futures.Future-t ad vissza (a vektor listaként)."""
+        if self._closed:
+            raise RuntimeError("Az embedding szolgáltatás le van állítva.")
+        fut = Future()
+        if self.cache:
+            vec = self.cache.get_memory(text)
+            if vec is not None:
+                fut.set_result(vec)
+                return fut
+        self._requests.put((text, fut))
+        return fut
+
+    def encode(self, text):
+        """Szinkron hívók számára (pl. háttérszálak)."""
+        return self.submit(text).result()
+
+    async def aencode(self, text):
+        """Awaitable változat a pipeline számára."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _loop(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+
+            self._run_batch(batch)
+            if stop:
+                break
+
+    def encode_many(self, texts, batch_size=64):
+        """
+        Tömeges (ingest) kódolás a hívó szálán, `batch_size` méretű forward passokban.
+        A vektorokat a bemenet sorrendjében adja vissza.
+        """
+        known = {}
+        for i in range(0, len(texts), batch_size):
+            known.update(self._embed(texts[i:i + batch_size]))
+        self.requests_total += len(texts)
+        return [known[text] for text in texts]
+
+    def _embed(self, texts):
+        """{szöveg: vektor} – cache-elt szövegek nélkül, duplikátumokat egyszer kódolva."""
+        known = self.cache.get_many_disk(texts) if self.cache else {}
+        missing = list(dict.fromkeys(text for text in texts if text not in known))
+        if missing:
+            with self._model_lock:
+                vectors = self.model.encode(missing, batch_size=len(missing), show_progress_bar=False)
+            fresh = {text: vec.tolist() for text, vec in zip(missing, vectors)}
+            if self.cache:
+                self.cache.put_many(fresh)
+            known.update(fresh)
+            self.batches_total += 1
+        return known
+
+    def _run_batch(self, batch):
+        try:
+            known = self._embed([text for text, _ in batch])
+            self.requests_total += len(batch)
+            for text, fut in batch:
+                fut.set_result(known[text])
+        except Exception as e:
+            self.logger.error(f"Batch embedding hiba ({len(batch)} kérés): {e}")
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+
+    def stats(self):
+        data = {
+            "requests": self.requests_total,
+            "batches": self.batches_total,
+            "avg_batch": round(self.requests_total / self.batches_total, 2) if self.batches_total else 0.0,
+        }
+        if self.cache:
+            data["cache"] = self.cache.stats()
+        return data
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        self._requests.put(None)
+        self._worker.join(timeout=10)
@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "critical": 50}
+ICONS = {"info": "📡", "warning": "⚠️", "error": "❌", "critical": "🔥"}
+
+class EventLog:
+    """
+    Nem blokkoló esemény napló.
+
+    A hívó (`emit`) csak sorba tesz: a strukturált esemény a memóriabeli gyűrűbe és egy
+    korlátos sorba kerül, a konzolra / fájlba / audit_logs táblába írást egy háttér szál
+    végzi kötegekben (egy fájl írás és egy tranzakció kötegenként). Ha a lemez lassú és
+    a sor megtelik, az esemény a fájlból kimarad (a gyűrűben megmarad), a hívó sosem vár.
+    """
+
+    def __init__(self, log_path="vault/logs/system.log", max_bytes=10 * 1024**2, backup_count=5,
+                 ring_size=1000, queue_size=10000, batch_limit=256, flush_interval_sec=0.5, console=True):
+        self.logger = logging.getLogger("SoulCore.EventLog")
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_limit = batch_limit
+        self.flush_interval = flush_interval_sec
+        self.console = console
+
+        self._ring = deque(maxlen=ring_size)
+        self._ring_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._sinks = []
+        self._file = None
+        self._seq = 0
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.sink_errors = 0
+        self._thread = threading.Thread(target=self._loop, name="EventLog", daemon=True)
+        self._thread.start()
+
+    def configure(self, max_bytes=None, backup_count=None, ring_size=None, console=None):
+        if max_bytes is not None: self.max_bytes = max_bytes
+        if backup_count is not None: self.backup_count = backup_count
+        if console is not None: self.console = console
+        if ring_size is not None and ring_size != self._ring.maxlen:
+            with self._ring_lock:
+                self._ring = deque(self._ring, maxlen=ring_size)
+
+    def attach_sink(self, callback):
+        """Kötegelt fogyasztó (pl. audit_logs); a callback az események listáját kapja a háttér szálon."""
+        if callback not in self._sinks:
+            self._sinks.append(callback)
+
+    def detach_sink(self, callback):
+        if callback in self._sinks:
+            self._sinks.remove(callback)
+
+    # --- Hívói oldal ---
+
+    def emit(self, module, message, level="info", **fields):
+        lvl = level.lower() if level.lower() in LEVELS else "info"
+        now = time.time()
+        with self._ring_lock:
+            self._seq += 1
+            event = {"id": self._seq, "time": now, "timestamp": datetime.fromtimestamp(now).isoformat(),
+                     "level": lvl, "module": module.upper(), "message": str(message), **fields}
+            self._ring.append(event)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+        return event
+
+    def recent(self, limit=100, level=None, module=None):
+        """A legutóbbi események (legújabb elöl); `level` minimális szint, `module` pontos egyezés."""
+        min_level = LEVELS.get((level or "debug").lower(), 0)
+        module = module.upper() if module else None
+        with self._ring_lock:
+            events = list(self._ring)
+        out = []
+        for event in reversed(events):
+            if LEVELS[event["level"]] < min_level: continue
+            if module and event["module"] != module: continue
+            out.append(event)
+            if len(out) >= limit: break
+        return out
+
+    def flush(self, timeout=5.0):
+        """Megvárja, hogy a sorban álló események kiíródjanak (leállításkor)."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stats(self):
+        return {
+            "buffered": len(self._ring),
+            "ring_size": self._ring.maxlen,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "sink_errors": self.sink_errors,
+            "sinks": len(self._sinks),
+        }
+
+    # --- Háttér szál ---
+
+    def _loop(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch, waiters = [], []
+            while item is not None:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_limit:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch):
+        lines = []
+        for e in batch:
+            stamp = datetime.fromtimestamp(e["time"]).strftime("%Y-%m-%d %H:%M:%S")
+            lines.append(f"{stamp},{int(e['time'] % 1 * 1000):03d} | {e['level'].upper()} | "
+                         f"SoulCore.Monitor | [{e['module']}] {e['message']}\n")
+        try:
+            self._write_file("".join(lines))
+        except OSError as ex:
+            self.logger.error(f"Napló fájl írási hiba: {ex}")
+
+        if self.console:
+            out = [f"[{datetime.fromtimestamp(e['time']).strftime('%H:%M:%S')}] "
+                   f"{ICONS.get(e['level'], '📝')} [{e['module']}] {e['message']}\n" for e in batch]
+            try:
+                sys.stdout.write("".join(out))
+                sys.stdout.flush()
+            except (OSError, ValueError):
+                pass
+
+        for sink in list(self._sinks):
+            try:
+                sink(batch)
+            except Exception as ex:
+                self.sink_errors += 1
+                self.logger.error(f"Esemény fogyasztó hiba: {ex}")
+
+        self.written += len(batch)
+        self.batches += 1
+
+    def _write_file(self, text):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            self._file = open(self.log_path, "a", encoding="utf-8")
+        self._file.write(text)
+        self._file.flush()
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """Méret alapú forgatás: system.log -> system.log.1 -> ... -> system.log.N."""
+        self._file.close()
+        self._file = None
+        if self.backup_count <= 0:
+            os.remove(self.log_path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.log_path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.log_path}.{i + 1}")
+        os.replace(self.log_path, f"{self.log_path}.1")
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_event_log(log_path="vault/logs/system.log", **settings):
+    """A folyamat közös esemény naplója (a main és az orchestrator monitora ugyanabba ír)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = EventLog(log_path, **settings)
+        elif settings:
+            _shared.configure(**{k: v for k, v in settings.items()
+                                 if k in ("max_bytes", "backup_count", "ring_size", "console")})
+        return _shared
@@ -0,0 +1,166 @@
+import time
+import uuid
+import threading
+import contextlib
+
+# Másodpercben; a King generálás a felső tartományban, a Scribe / fordító / DB az alsóban mozog
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(pairs, extra=()):
+    items = list(pairs) + list(extra)
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def _num(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """
+    Minimális, szálbiztos metrika gyűjtő OpenMetrics szöveges kimenettel (/metrics).
+
+    Számlálók (counter), pillanatnyi értékek (gauge) és fix vödrös hisztogramok
+    címkénként; külső függőség (prometheus_client) nélkül.
+    """
+
+    def __init__(self, namespace="soulcore", buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._meta = {}         # név -> (típus, leírás)
+        self._series = {}       # név -> {címke tuple: érték / hisztogram állapot}
+
+    def describe(self, name, kind, help_text):
+        with self._lock:
+            self._meta[name] = (kind, help_text)
+            self._series.setdefault(name, {})
+
+    def _key(self, labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name, value=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series.setdefault(name, {})[key] = float(value)
+
+    def observe(self, name, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self):
+        """OpenMetrics 1.0 szöveges formátum."""
+        out = []
+        with self._lock:
+            for name in sorted(self._series):
+                kind, help_text = self._meta.get(name, ("gauge", ""))
+                full = f"{self.namespace}_{name}"
+                out.append(f"# TYPE {full} {kind}")
+                if help_text:
+                    out.append(f"# HELP {full} {_escape(help_text)}")
+                for key, value in sorted(self._series[name].items()):
+                    if kind == "histogram":
+                        for bound, count in zip(self.buckets, value["buckets"]):
+                            out.append(f"{full}_bucket{_labels(key, [('le', _num(float(bound)))])} {count}")
+                        out.append(f"{full}_bucket{_labels(key, [('le', '+Inf')])} {value['count']}")
+                        out.append(f"{full}_sum{_labels(key)} {_num(round(value['sum'], 6))}")
+                        out.append(f"{full}_count{_labels(key)} {value['count']}")
+                    elif kind == "counter":
+                        out.append(f"{full}_total{_labels(key)} {_num(value)}")
+                    else:
+                        out.append(f"{full}{_labels(key)} {_num(value)}")
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+    def snapshot(self, name):
+        """Egy metrika aktuális értékei (diagnosztikához / teszteléshez)."""
+        with self._lock:
+            return {key: (dict(v, buckets=list(v["buckets"])) if isinstance(v, dict) else v)
+                    for key, v in self._series.get(name, {}).items()}
+
+class Trace:
+    """
+    Egy kérés nyomkövetése: egyedi trace id és lépésenkénti span-ek a kérés kezdetéhez képest.
+    Minden lezárt span a registry lépés hisztogramjába is bekerül (stage + slot címkével).
+    """
+
+    def __init__(self, registry, kind="pipeline"):
+        self.registry = registry
+        self.kind = kind
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def record(self, stage, start, end, slot=None, status="ok"):
+        with self._lock:
+            self._spans[stage] = {
+                "slot": slot,
+                "start": round(start - self.origin, 4),
+                "end": round(end - self.origin, 4),
+                "status": status,
+            }
+        if self.registry:
+            self.registry.observe("stage_duration_seconds", end - start, stage=stage, slot=slot or "none")
+            self.registry.inc("stage_runs", stage=stage, slot=slot or "none", status=status)
+
+    @contextlib.contextmanager
+    def span(self, stage, slot=None):
+        start, status = time.perf_counter(), "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record(stage, start, time.perf_counter(), slot=slot, status=status)
+
+    def track(self, stage, future):
+        """Háttérben befejeződő írás (concurrent.futures.Future) span-je, a commit idejéig."""
+        start = time.perf_counter()
+        future.add_done_callback(lambda f: self.record(
+            stage, start, time.perf_counter(), slot="db", status="error" if f.exception() else "ok"))
+
+    def finish(self, outcome="ok", **labels):
+        elapsed = time.perf_counter() - self.origin
+        if self.registry:
+            self.registry.observe("request_duration_seconds", elapsed, kind=self.kind, **labels)
+            self.registry.inc("requests", kind=self.kind, outcome=outcome, **labels)
+        return elapsed
+
+    def report(self):
+        with self._lock:
+            return dict(sorted(self._spans.items(), key=lambda item: item[1]["start"]))
+
+def pipeline_registry():
+    """A kernel metrikái leírásokkal."""
+    registry = MetricsRegistry()
+    registry.describe("stage_duration_seconds", "histogram", "Pipeline lépés futási ideje (stage, slot).")
+    registry.describe("stage_runs", "counter", "Lefutott pipeline lépések (stage, slot, status).")
+    registry.describe("slot_call_duration_seconds", "histogram", "Slot hívás ideje sorban állással együtt (slot, method).")
+    registry.describe("slot_calls", "counter", "Slot hívások (slot, method, status).")
+    registry.describe("request_duration_seconds", "histogram", "Teljes kérés ideje (kind, cache).")
+    registry.describe("requests", "counter", "Feldolgozott kérések (kind, outcome, cache).")
+    registry.describe("slot_loaded", "gauge", "A slot be van-e töltve (1/0).")
+    registry.describe("slot_loads", "counter", "Slot betöltések száma a slot manager szerint.")
+    registry.describe("slot_evictions", "counter", "Slot ürítések száma a slot manager szerint.")
+    registry.describe("slot_prompt_tokens", "counter", "A slot által feldolgozott prompt tokenek.")
+    registry.describe("slot_completion_tokens", "counter", "A slot által generált tokenek.")
+    return registry
@@ -1,9 +1,8 @@
 import psutil
-import logging
 import os
 import time
-from datetime import datetime
 from typing import List, Dict, Union, Any
+from src.utils.event_log import get_event_log
 
 # --- OKOS IMPORT A PY3.12 KOMPATIBILITÁSHOZ ---
 try:
@@ -24,6 +23,7 @@ class SoulCoreMonitor:
         self._initial_error = None
         self.has_gpu = False
         self.device_count = 0
+        self._devices = []
         
         # NVML inicializálása
         if pynvml:
@@ -31,20 +31,21 @@ class SoulCoreMonitor:
                 pynvml.nvmlInit()
                 self.has_gpu = True
                 self.device_count = pynvml.nvmlDeviceGetCount()
+                # Handle-ök és nevek egyszer; mintavételenként csak a mérőszámokat kérdezzük
+                for i in range(self.device_count):
+                    handle = pynvml.nvmlDeviceGetHandleByIndex(i)
+                    name = pynvml.nvmlDeviceGetName(handle)
+                    if isinstance(name, bytes):
+                        name = name.decode('utf-8')
+                    self._devices.append((handle, name))
             except Exception as e:
                 self.has_gpu = False
                 self._initial_error = str(e)
         else:
             self._initial_error = "NVML nincs telepítve (nvidia-ml-py hiányzik)."
 
-        # Logging beállítása
-        self.logger = logging.getLogger("SoulCore.Monitor")
-        if not self.logger.handlers:
-            handler = logging.FileHandler(log_path, encoding='utf-8')
-            formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(name)s | %(message)s')
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.INFO)
+        # Naplózás: a közös, háttérszálas esemény napló (forgatott fájl + audit_logs + gyűrű)
+        self.events = get_event_log(log_path)
 
         # Kezdeti állapot jelzése a logban és konzolon
         if self.has_gpu:
@@ -59,15 +60,10 @@ class SoulCoreMonitor:
         # 1. VALÓDI GPU-K LEKÉRDEZÉSE
         if self.has_gpu and pynvml:
             try:
-                for i in range(self.device_count):
-                    handle = pynvml.nvmlDeviceGetHandleByIndex(i)
+                for i, (handle, name) in enumerate(self._devices):
                     temp = pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)
                     mem = pynvml.nvmlDeviceGetMemoryInfo(handle)
                     util = pynvml.nvmlDeviceGetUtilizationRates(handle)
-                    name = pynvml.nvmlDeviceGetName(handle)
-                    
-                    if isinstance(name, bytes):
-                        name = name.decode('utf-8')
 
                     stats.append({
                         "type": "gpu",
@@ -101,24 +97,14 @@ class SoulCoreMonitor:
         return stats
 
     def log_event(self, module: str, message: str, level: str = "info"):
-        """Egységes naplózás konzolra és fájlba."""
-        full_msg = f"[{module.upper()}] {message}"
-        lvl = level.lower()
-        icons = {"info": "📡", "warning": "⚠️", "error": "❌", "critical": "🔥"}
-        icon = icons.get(lvl, "📝")
-
-        if lvl == "info": self.logger.info(full_msg)
-        elif lvl == "warning": self.logger.warning(full_msg)
-        elif lvl == "error": self.logger.error(full_msg)
-        elif lvl == "critical": self.logger.critical(full_msg)
-
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        print(f"[{timestamp}] {icon} {full_msg}")
+        """Egységes naplózás konzolra, fájlba és az audit táblába; csak sorba tesz, sosem blokkol."""
+        self.events.emit(module, message, level)
 
-    def check_vram_safety(self, threshold_pct: float = 90.0) -> bool:
-        """VRAM vészfék."""
+    def check_vram_safety(self, threshold_pct: float = 90.0, stats: List[Dict[str, Any]] = None) -> bool:
+        """VRAM vészfék. A `stats` egy már meglévő pillanatkép (pl. a mintavételezőé), így nincs új lekérdezés."""
         if not self.has_gpu: return True
-        stats = self.get_hardware_stats()
+        if stats is None:
+            stats = self.get_hardware_stats()
         for s in stats:
             if s["type"] == "gpu" and s["vram_usage_pct"] > threshold_pct:
                 self.log_event("Safety", f"VRAM kritikus szint: {s['vram_usage_pct']}%", level="critical")
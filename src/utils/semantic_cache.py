@@ -0,0 +1,96 @@
+import time
+import logging
+import threading
+import numpy as np
+
+class SemanticCache:
+    """
+    Felhasználónkénti szemantikus válasz-cache.
+
+    A kérdés embeddingje alapján keres: ha egy korábbi kérdés koszinusz-hasonlósága
+    eléri a küszöböt és a bejegyzés nem járt le (TTL), a tárolt választ adjuk vissza.
+    Új Vault / hosszú távú memória írásakor az érintett bejegyzések érvénytelenné válnak.
+    """
+
+    def __init__(self, threshold=0.95, ttl_sec=3600, max_entries_per_user=256, near_miss_margin=0.05):
+        self.logger = logging.getLogger("Kernel.SemanticCache")
+        self.threshold = threshold
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries_per_user
+        self.near_miss_margin = near_miss_margin
+        self._lock = threading.Lock()
+        # user_id -> {"vectors": ndarray (n, dim), "entries": [(response, created_at, query)]}
+        self._users = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, user_id, vector):
+        """Visszatér: (válasz, hasonlóság) találat esetén, különben (None, legjobb hasonlóság)."""
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            bucket = self._users.get(user_id)
+            if bucket:
+                self._expire(bucket, now)
+            if not bucket or not bucket["entries"]:
+                self.misses += 1
+                return None, 0.0
+            scores = bucket["vectors"] @ query
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score >= self.threshold:
+                self.hits += 1
+                return bucket["entries"][best][0], score
+            self.misses += 1
+            if score >= self.threshold - self.near_miss_margin:
+                self.near_misses += 1
+            return None, score
+
+    def store(self, user_id, vector, response, query=""):
+        vec = self._normalize(vector)
+        with self._lock:
+            bucket = self._users.setdefault(user_id, {"vectors": np.empty((0, vec.shape[0]), dtype=np.float32), "entries": []})
+            bucket["vectors"] = np.vstack([bucket["vectors"], vec[None, :]])
+            bucket["entries"].append((response, time.time(), query[:80]))
+            overflow = len(bucket["entries"]) - self.max_entries
+            if overflow > 0:
+                bucket["vectors"] = bucket["vectors"][overflow:]
+                bucket["entries"] = bucket["entries"][overflow:]
+
+    def _expire(self, bucket, now):
+        keep = [i for i, (_, created, _) in enumerate(bucket["entries"]) if now - created < self.ttl_sec]
+        if len(keep) != len(bucket["entries"]):
+            bucket["vectors"] = bucket["vectors"][keep]
+            bucket["entries"] = [bucket["entries"][i] for i in keep]
+
+    def invalidate(self, user_id=None):
+        """Egy felhasználó (vagy None esetén mindenki) bejegyzéseinek törlése."""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            entries = sum(len(b["entries"]) for b in self._users.values())
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "near_misses": self.near_misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,137 @@
+import sqlite3
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+class SQLitePool:
+    """
+    Hosszú életű SQLite kapcsolatok készlete.
+
+    Olvasás: több, előre megnyitott kapcsolat (WAL alatt párhuzamosan olvashatnak).
+    Írás: egyetlen író szál, amely a sorban álló írásokat egy tranzakcióba
+    fogja össze (group commit), így egyidejű pipeline-ok sem fsync-elnek külön-külön.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",     # WAL mellett biztonságos, commitonként nincs fsync
+        "PRAGMA cache_size=-16000",      # ~16 MB lap-cache kapcsolatonként
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA busy_timeout=5000",
+    )
+
+    def __init__(self, db_path, size=4, batch_limit=64):
+        self.logger = logging.getLogger("Database.Pool")
+        self.db_path = db_path
+        self.batch_limit = batch_limit
+        self._closed = False
+
+        self._readers = queue.Queue()
+        for _ in range(max(1, size)):
+            self._readers.put(self._connect())
+
+        # Az író kapcsolat autocommit módban van, a tranzakciót mi vezéreljük
+        self._write_conn = self._connect(isolation_level=None)
+        self._jobs = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="SQLiteWriter", daemon=True)
+        self._writer.start()
+
+    def _connect(self, isolation_level=""):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5.0,
+                               isolation_level=isolation_level)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def read(self, row_factory=None):
+        """Kölcsönad egy olvasó kapcsolatot a készletből."""
+        conn = self._readers.get()
+        try:
+            conn.row_factory = row_factory
+            yield conn
+        finally:
+            conn.row_factory = None
+            self._readers.put(conn)
+
+    def write(self, statements, wait=True):
+        """
+        Írási feladat beküldése az író szálnak.
+
+        :param statements: [(sql, params), ...] – egy feladaton belül atomikusan fut le.
+        :param wait: True esetén megvárja a commitot (és továbbdobja a hibát),
+                     False esetén a Future-t adja vissza.
+        """
+        if self._closed:
+            raise RuntimeError("Az adatbázis-készlet már le van zárva.")
+        fut = Future()
+        self._jobs.put((list(statements), fut))
+        return fut.result() if wait else fut
+
+    def _write_loop(self):
+        try:
+            self._drain_writes(self._write_conn)
+        finally:
+            # Az író kapcsolatot a saját szála zárja: close() nem húzhatja ki egy futó commit alól
+            self._write_conn.close()
+
+    def _drain_writes(self, conn):
+        running = True
+        while running:
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            # Group commit: ami közben beérkezett, ugyanabba a tranzakcióba kerül
+            batch = [job]
+            while len(batch) < self.batch_limit:
+                try:
+                    nxt = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    running = False
+                    break
+                batch.append(nxt)
+
+            outcomes = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for statements, fut in batch:
+                    # Savepoint: egy hibás feladat nem rántja magával a többit
+                    conn.execute("SAVEPOINT job")
+                    try:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+                        conn.execute("RELEASE job")
+                        outcomes.append((fut, None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO job")
+                        conn.execute("RELEASE job")
+                        outcomes.append((fut, e))
+                conn.execute("COMMIT")
+            except Exception as e:
+                self.logger.error(f"Csoportos commit hiba ({len(batch)} feladat): {e}")
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                outcomes = [(fut, e) for _, fut in batch]
+
+            for fut, err in outcomes:
+                if err is not None:
+                    fut.set_exception(err)
+                else:
+                    fut.set_result(None)
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        self._jobs.put(None)
+        self._writer.join(timeout=10)
+        if self._writer.is_alive():
+            self.logger.warning("Az író szál 10 mp után is fut; a kapcsolatát a szál maga zárja le.")
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
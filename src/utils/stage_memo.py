@@ -0,0 +1,101 @@
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+class StageMemo:
+    """
+    Determinisztikus pipeline lépések (Scribe elemzés, kulcsszavak, fordítás) eredmény-cache-e.
+
+    A kulcs a lépés nevéből, a slot modelljéből és a teljes (sablonból + bemenetből
+    összeállt) promptból képzett hash, így sablon- vagy modellcsere esetén magától elavul.
+    1. szint: korlátos, memóriabeli LRU; 2. szint: SQLite `stage_memo` tábla (JSON érték).
+    """
+
+    def __init__(self, pool, memory_entries=2048, disk_entries=50000):
+        self.logger = logging.getLogger("Kernel.StageMemo")
+        self.pool = pool
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts_since_prune = 0
+
+        # lépés -> {"memory_hits", "disk_hits", "misses"}
+        self._stats = {}
+
+    @staticmethod
+    def key(stage, model_id, prompt):
+        return hashlib.sha1(f"{stage}\0{model_id}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _count(self, stage, field):
+        counters = self._stats.setdefault(stage, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        counters[field] += 1
+
+    def get(self, stage, model_id, prompt):
+        """A tárolt eredmény, vagy None, ha még nem számoltuk."""
+        value = self.get_memory(stage, model_id, prompt)
+        if value is not None:
+            return value
+        return self.get_disk(stage, model_id, prompt)
+
+    def get_memory(self, stage, model_id, prompt):
+        """Csak a memóriabeli LRU (nem blokkol; eseményhurokról is hívható). Tévesztést nem számol."""
+        k = self.key(stage, model_id, prompt)
+        with self._lock:
+            if k in self._lru:
+                self._lru.move_to_end(k)
+                self._count(stage, "memory_hits")
+                return self._lru[k]
+        return None
+
+    def get_disk(self, stage, model_id, prompt):
+        """SQLite kikeresés (blokkoló: async kódból asyncio.to_thread-del); találat a memóriába is bekerül."""
+        k = self.key(stage, model_id, prompt)
+        value = None
+        try:
+            with self.pool.read() as conn:
+                row = conn.execute("SELECT value FROM stage_memo WHERE key = ?", (k,)).fetchone()
+            if row:
+                value = json.loads(row[0])
+        except Exception as e:
+            self.logger.error(f"Stage memo olvasási hiba: {e}")
+
+        with self._lock:
+            self._count(stage, "disk_hits" if value is not None else "misses")
+            if value is not None:
+                self._remember(k, value)
+        return value
+
+    def put(self, stage, model_id, prompt, value):
+        """Memóriába azonnal, lemezre a háttér író soron át."""
+        if value is None: return
+        k = self.key(stage, model_id, prompt)
+        with self._lock:
+            self._remember(k, value)
+
+        statements = [("INSERT OR REPLACE INTO stage_memo (key, stage, value, created_at) VALUES (?, ?, ?, ?)",
+                       (k, stage, json.dumps(value, ensure_ascii=False), datetime.now().isoformat()))]
+        self._inserts_since_prune += 1
+        if self._inserts_since_prune >= 1000:
+            statements.append(("DELETE FROM stage_memo WHERE rowid <= (SELECT MAX(rowid) FROM stage_memo) - ?",
+                               (self.disk_entries,)))
+            self._inserts_since_prune = 0
+        self.pool.write(statements, wait=False)
+
+    def _remember(self, k, value):
+        self._lru[k] = value
+        self._lru.move_to_end(k)
+        while len(self._lru) > self.memory_entries:
+            self._lru.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            stages = {}
+            for stage, c in self._stats.items():
+                lookups = c["memory_hits"] + c["disk_hits"] + c["misses"]
+                stages[stage] = {**c, "hit_rate": round((c["memory_hits"] + c["disk_hits"]) / lookups, 3) if lookups else 0.0}
+            return {"memory_entries": len(self._lru), "stages": stages}
@@ -0,0 +1,55 @@
+import time
+import logging
+import threading
+import contextlib
+from datetime import datetime
+
+class StartupTimeline:
+    """
+    Indítási idővonal: fázisonkénti kezdő/záró idő a folyamat indulásához képest.
+
+    A párhuzamosan futó fázisok (slot betöltések, embedding bemelegítés) szálbiztosan
+    rögzíthetők; a riport a hidegindítás szűk keresztmetszetét mutatja meg.
+    """
+
+    def __init__(self, origin=None):
+        self.logger = logging.getLogger("Kernel.Startup")
+        self.origin = origin or time.time()
+        self._phases = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, end, **info):
+        with self._lock:
+            self._phases.append({
+                "phase": name,
+                "start": round(start - self.origin, 3),
+                "end": round(end - self.origin, 3),
+                "duration": round(end - start, 3),
+                **info,
+            })
+
+    @contextlib.contextmanager
+    def phase(self, name, **info):
+        start, status = time.time(), "ok"
+        try:
+            yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.record(name, start, time.time(), status=status, thread=threading.current_thread().name, **info)
+
+    def report(self):
+        with self._lock:
+            phases = sorted(self._phases, key=lambda p: (p["start"], p["phase"]))
+        return {
+            "origin": datetime.fromtimestamp(self.origin).isoformat(),
+            "total_sec": max((p["end"] for p in phases), default=0.0),
+            "phases": phases,
+        }
+
+    def log_summary(self):
+        report = self.report()
+        self.logger.info(f"⏱️ Indítási idővonal ({report['total_sec']}s):")
+        for p in report["phases"]:
+            self.logger.info(f"   {p['start']:>8.3f}s -> {p['end']:>8.3f}s  ({p['duration']:.3f}s)  {p['phase']}")
@@ -0,0 +1,106 @@
+class StreamingTagParser:
+    """
+    Inkrementális állapotgép a King <note>/<message>/<translate> kimenetéhez.
+
+    A tokeneket darabonként kapja (`feed`), a <message> tartalmát azonnal
+    visszaadja kiküldésre, a <note>-ot és a <translate>-et pufferel.
+    A félbevágott tag-eket (pl. "</mes" + "sage>") a következő darabig visszatartja.
+    A `finished` jelzi, ha a válasz lezárult és utána nem következik <translate> blokk –
+    ekkor a generálás leállítható.
+    """
+
+    TAGS = ("note", "message", "translate")
+
+    def __init__(self, initial_tag=None):
+        # A King prompt "<note>"-tal zárul, így a kimenet eleve a note-on belül kezdődik
+        self.state = initial_tag
+        self.parts = {tag: [] for tag in self.TAGS}
+        self.outside = []
+        self.trailing = []          # a </message> utáni, tag-en kívüli szöveg
+        self.closed = set()
+        self._pending = ""
+
+    @property
+    def message_closed(self):
+        return "message" in self.closed
+
+    @property
+    def finished(self):
+        if not self.message_closed or self.state is not None or self._pending:
+            return False
+        # A </message> után jöhet még <translate>; ha más szöveg jön, az már csak fecsegés
+        return "translate" in self.closed or bool("".join(self.trailing).strip())
+
+    def feed(self, chunk):
+        """Feldolgoz egy darabot; visszaadja a most kiküldhető <message> szöveget."""
+        emitted = []
+        for ch in chunk:
+            if self._pending:
+                self._pending += ch
+                self._resolve_pending(emitted)
+            elif ch == "<":
+                self._pending = ch
+            else:
+                self._append(ch, emitted)
+        return "".join(emitted)
+
+    def _resolve_pending(self, emitted):
+        token = self._pending.lower()
+        for tag in self.TAGS:
+            if token == f"<{tag}>":
+                self.state = tag
+                self._pending = ""
+                return
+            if token == f"</{tag}>":
+                if self.state == tag:
+                    self.state = None
+                self.closed.add(tag)
+                self._pending = ""
+                return
+        if any(f"<{t}>".startswith(token) or f"</{t}>".startswith(token) for t in self.TAGS):
+            return  # még lehet belőle ismert tag, várunk
+        # Nem tag (pl. "a < b"): a '<' sima szöveg, a maradékot újra feldolgozzuk
+        text, self._pending = self._pending, ""
+        self._append(text[0], emitted)
+        emitted.append(self.feed(text[1:]))
+
+    def _append(self, text, emitted):
+        if self.state is None:
+            self.outside.append(text)
+            if self.message_closed:
+                self.trailing.append(text)
+        else:
+            self.parts[self.state].append(text)
+            if self.state == "message":
+                emitted.append(text)
+
+    def flush(self):
+        """Stream vége: a visszatartott (nem tag) maradék is a helyére kerül."""
+        emitted = []
+        pending, self._pending = self._pending, ""
+        # Csonka záró tag a stream végén (pl. "</mess") -> eldobjuk
+        if pending and not any(f"</{t}>".startswith(pending.lower()) for t in self.TAGS):
+            self._append(pending, emitted)
+        return "".join(emitted)
+
+    def result(self):
+        """Az Orchestrator._parse_tags-szal azonos szerkezetű eredmény."""
+        self.flush()
+        extracted = {tag: "".join(self.parts[tag]).strip() or None for tag in self.TAGS}
+        if extracted["message"]:
+            clean = extracted["message"]
+        elif extracted["translate"]:
+            clean = extracted["translate"]
+        else:
+            clean = "".join(self.outside).strip()
+            # Protokollt figyelmen kívül hagyó modell: nincs egyetlen záró tag sem -> a teljes szöveg a válasz
+            if not clean and not self.closed:
+                clean = (extracted["note"] or "").strip()
+        return {**extracted, "clean_text": clean}
+
+    @classmethod
+    def parse(cls, text, initial_tag=None):
+        """Teljes (nem streamelt) szöveg feldolgozása egy lépésben."""
+        parser = cls(initial_tag=initial_tag)
+        parser.feed(text or "")
+        return parser.result()
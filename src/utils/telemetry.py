@@ -0,0 +1,114 @@
+import time
+import logging
+import threading
+from array import array
+
+class TelemetrySampler:
+    """
+    Háttér hardver mintavételező gyűrűpufferes előzménnyel.
+
+    Egy szál `interval_sec` időközönként lekérdezi a monitort; a legutóbbi pillanatképet
+    a /status és a heartbeat újralekérdezés nélkül kapja. Az előzmény eszközönként és
+    mérőszámonként fix méretű `array('d')` gyűrűben él (nincs dict-lista halmozódás).
+    """
+
+    CHANNELS = ("load_pct", "temp", "vram_used_mb", "vram_usage_pct")
+
+    def __init__(self, monitor, interval_sec=1.0, history_sec=3600):
+        self.logger = logging.getLogger("SoulCore.Telemetry")
+        self.monitor = monitor
+        self.interval = max(0.1, float(interval_sec))
+        self.capacity = max(1, round(history_sec / self.interval))
+
+        self._lock = threading.Lock()
+        self._query_lock = threading.Lock()     # egyszerre egy NVML lekérdezés (szál vagy sample() hívó)
+        self._timestamps = array("d", bytes(8 * self.capacity))
+        self._series = {}       # eszköz neve -> {csatorna: array('d')}
+        self._head = 0          # a következő írás helye
+        self._count = 0
+        self._latest = []
+        self._latest_at = 0.0
+
+        self.samples = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.sample()
+            self._thread = threading.Thread(target=self._loop, name="Telemetry", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Friss mérés (a gyűrűbe is bekerül); hibánál None. Az időzítéshez kellő pontosságú
+        mérést igénylő hívók (pl. slot betöltés előtti / utáni VRAM) is ezt hívják."""
+        try:
+            with self._query_lock:
+                stats = self.monitor.get_hardware_stats()
+        except Exception as e:
+            self.errors += 1
+            self.logger.error(f"Telemetria mintavételi hiba: {e}")
+            return None
+        now = time.time()
+        with self._lock:
+            slot = self._head
+            self._timestamps[slot] = now
+            seen = set()
+            for dev in stats:
+                series = self._series.get(dev["name"])
+                if series is None:
+                    # Később megjelenő eszköz: a korábbi mintái 0-k
+                    series = {ch: array("d", bytes(8 * self.capacity)) for ch in self.CHANNELS}
+                    self._series[dev["name"]] = series
+                for ch in self.CHANNELS:
+                    series[ch][slot] = float(dev.get(ch) or 0)
+                seen.add(dev["name"])
+            for name, series in self._series.items():
+                if name not in seen:
+                    for ch in self.CHANNELS:
+                        series[ch][slot] = 0.0
+            self._head = (slot + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self._latest = stats
+            self._latest_at = now
+            self.samples += 1
+        return stats
+
+    def latest(self):
+        """A legutóbbi pillanatkép (a monitor get_hardware_stats formátumában)."""
+        with self._lock:
+            return list(self._latest)
+
+    def history(self, window_sec=300):
+        """Az utolsó `window_sec` másodperc mintái eszközönként, időrendben."""
+        with self._lock:
+            n = min(self._count, max(1, round(window_sec / self.interval)))
+            start = (self._head - n) % self.capacity
+            order = [(start + i) % self.capacity for i in range(n)]
+            return {
+                "interval_sec": self.interval,
+                "samples": n,
+                "timestamps": [round(self._timestamps[i], 3) for i in order],
+                "devices": {name: {ch: [series[ch][i] for i in order] for ch in self.CHANNELS}
+                            for name, series in self._series.items()},
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval_sec": self.interval,
+                "capacity": self.capacity,
+                "buffered": self._count,
+                "samples": self.samples,
+                "errors": self.errors,
+                "latest_age_sec": round(time.time() - self._latest_at, 2) if self._latest_at else None,
+            }
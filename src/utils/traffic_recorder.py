@@ -0,0 +1,128 @@
+import os
+import hmac
+import json
+import time
+import queue
+import random
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+class TrafficRecorder:
+    """
+    Opt-in forgalomrögzítő a /process kérésekhez (JSONL, a tools/replay_traffic.py bemenete).
+
+    Csak anonim adat kerül a fájlba: a rögzítés kezdetéhez mért időpont, a kérdés hossza
+    (karakter / szó), a felhasználó és a chat sózott hash-e, a chat hányadik köre,
+    stream-e, státusz és késleltetés. A kérdés szövege és az azonosítók nem.
+    Az írás háttér szálon történik; a kérés útjában csak egy sorba tevés van.
+    A chat körszámlálója LRU: legfeljebb `max_chats` chat köre marad a memóriában.
+    """
+
+    def __init__(self, path="vault/traces/traffic.jsonl", sample_rate=1.0, salt=None, max_mb=256, max_chats=100000):
+        self.logger = logging.getLogger("SoulCore.TrafficRecorder")
+        self.path = path
+        self.sample_rate = float(sample_rate)
+        # Konfigurált só nélkül folyamatonként új: a hash-ek újraindítás után nem köthetők össze
+        self._salt = (salt.encode("utf-8") if salt else os.urandom(16))
+        self.max_bytes = int(max_mb * 1024**2)
+        self.origin = time.time()
+        self.max_chats = int(max_chats)
+        self._turns = OrderedDict() # chat hash -> eddigi körök száma (LRU)
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+        self.recorded = 0
+        self.skipped = 0
+        self.dropped = 0
+        self._full = False
+        self._closed = False
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._loop, name="TrafficRecorder", daemon=True)
+        self._thread.start()
+
+    def _anon(self, value):
+        return hmac.new(self._salt, str(value).encode("utf-8"), hashlib.sha256).hexdigest()[:12]
+
+    def record(self, user_id, chat_id, query, started, latency_sec, status=200, stream=False,
+               ttft_sec=None, cache=None):
+        """Egy lezárt kérés rögzítése (`started`: time.time() a kérés elején)."""
+        if self._closed or self._full or (self.sample_rate < 1.0 and self._rng.random() >= self.sample_rate):
+            self.skipped += 1
+            return
+        chat = self._anon(chat_id)
+        with self._lock:
+            turn = self._turns.get(chat, 0) + 1
+            self._turns[chat] = turn
+            self._turns.move_to_end(chat)
+            while len(self._turns) > self.max_chats:
+                self._turns.popitem(last=False)
+        query = query or ""
+        entry = {
+            "t": round(started - self.origin, 3),
+            "user": self._anon(user_id),
+            "chat": chat,
+            "chat_turn": turn,
+            "query_chars": len(query),
+            "query_words": len(query.split()),
+            "stream": bool(stream),
+            "status": status,
+            "latency_sec": round(latency_sec, 4),
+            "ttft_sec": round(ttft_sec, 4) if ttft_sec is not None else None,
+            "cache": cache,
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _loop(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # None: a close() jelzése; az előtte sorba került bejegyzések még kiíródnak
+            if None in batch:
+                stopping = True
+                batch = [e for e in batch if e is not None]
+                if not batch:
+                    break
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(e) + "\n" for e in batch))
+                    size = f.tell()
+                self.recorded += len(batch)
+                if self.max_bytes and size >= self.max_bytes and not self._full:
+                    self._full = True
+                    self.logger.warning(f"Forgalom trace elérte a méretkorlátot ({self.path}), rögzítés leállítva.")
+            except OSError as e:
+                self.dropped += len(batch)
+                self.logger.error(f"Forgalom trace írási hiba: {e}")
+
+    def close(self, timeout=5.0):
+        """A sorban álló bejegyzések kiírása és a háttér szál leállítása (konfig csere / leállítás)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.logger.warning(f"A forgalom trace írója nem állt le időben ({self.path}).")
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "chats": len(self._turns),
+            "full": self._full,
+        }
@@ -3,8 +3,10 @@ import logging
 import psutil
 import time
 import uuid
+import json
+from typing import Optional
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 logger = logging.getLogger("soulcore.web")
@@ -68,16 +70,25 @@ def integrate_web_interface(app: FastAPI):
         return "Main GUI missing."
 
     @app.get("/chats/list")
-    async def list_chats(request: Request):
+    async def list_chats(request: Request, limit: int = 50, cursor: Optional[str] = None):
+        """Chat lista lapozva. A következő oldal kulcsa az X-Next-Cursor fejlécben érkezik."""
         if "user" not in request.session: raise HTTPException(status_code=403)
         core = check_core()
-        return core.db.get_all_chat_sessions(user_id=request.session["user"])
+        chats, next_cursor = core.db.get_chat_sessions_page(
+            user_id=request.session["user"], limit=_clamp_page(limit), cursor=cursor)
+        return _paged_response(chats, next_cursor)
 
     @app.get("/chats/history/{chat_id}")
-    async def get_history(chat_id: str, request: Request):
+    async def get_history(chat_id: str, request: Request, limit: int = 50, cursor: Optional[str] = None):
+        """Chat történet lapozva (legújabb oldal először, azon belül időrendben)."""
         if "user" not in request.session: raise HTTPException(status_code=403)
         core = check_core()
-        return core.db.get_chat_history(chat_id)
+        try:
+            history, next_cursor = core.db.get_chat_history_page(
+                chat_id, limit=_clamp_page(limit), cursor=cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Érvénytelen cursor")
+        return _paged_response(history, next_cursor)
 
     @app.post("/process")
     async def process(request: Request):
@@ -90,11 +101,19 @@ def integrate_web_interface(app: FastAPI):
         if not c_id or c_id == "null":
             c_id = f"chat_{str(uuid.uuid4())[:8]}"
         
-        result = await core.process_pipeline(
-            user_query=data.get("query"),
-            chat_id=c_id,
-            user_id=request.session.get("user")
-        )
+        if data.get("stream"):
+            return sse_pipeline_response(core, data.get("query"), c_id, request.session.get("user"))
+        
+        started, status, result = time.time(), 500, None
+        try:
+            result = await core.process_pipeline(
+                user_query=data.get("query"),
+                chat_id=c_id,
+                user_id=request.session.get("user")
+            )
+            status = 200
+        finally:
+            record_traffic(core, request.session.get("user"), c_id, data.get("query"), started, status, result=result)
         return JSONResponse(content=result)
 
     @app.get("/status")
@@ -107,8 +126,9 @@ def integrate_web_interface(app: FastAPI):
 
         core = _internal_core
         
-        # JAVÍTÁS: A core.last_hw_stats-ot használjuk, amit a main.py heartbeat-je frissít
-        hw_stats = getattr(core, 'last_hw_stats', [])
+        # A háttér mintavételező legutóbbi pillanatképe; régi úton a heartbeat által frissített last_hw_stats
+        telemetry = getattr(core, 'telemetry', None)
+        hw_stats = telemetry.latest() if telemetry else getattr(core, 'last_hw_stats', [])
         
         # Ha a heartbeat még nem futott le, vagy üres, adjunk egy alap CPU infót
         if not hw_stats:
@@ -134,6 +154,48 @@ def integrate_web_interface(app: FastAPI):
 
     return app
 
+def sse_pipeline_response(core, query, chat_id, user_id):
+    """A streamelt pipeline eseményeit Server-Sent Events formában küldi a böngészőnek."""
+    async def events():
+        started, status, ttft, result = time.time(), None, None, None
+        try:
+            async for event in core.process_pipeline_stream(user_query=query, chat_id=chat_id, user_id=user_id):
+                if ttft is None and event.get("type") == "token":
+                    ttft = time.time() - started
+                if event.get("type") == "done":
+                    result, status = event, 200
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            status = 500
+            logger.error(f"Stream hiba: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        finally:
+            # Megszakadt stream (a kliens bontott) is rögzül, 499-es státusszal
+            record_traffic(core, user_id, chat_id, query, started, status or 499,
+                           stream=True, ttft=ttft, result=result)
+    # X-Accel-Buffering: reverse proxy mögött se puffereljen
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def record_traffic(core, user_id, chat_id, query, started, status, stream=False, ttft=None, result=None):
+    """A kérés rögzítése a forgalomrögzítőbe, ha be van kapcsolva (api.traffic_recorder)."""
+    recorder = getattr(core, "traffic_recorder", None)
+    if not recorder:
+        return
+    cache = ((result or {}).get("metadata") or {}).get("cache", "miss") if result else None
+    recorder.record(user_id, chat_id, query, started, time.time() - started, status=status,
+                    stream=stream, ttft_sec=ttft, cache=cache)
+
+MAX_PAGE_SIZE = 200
+
+def _clamp_page(limit):
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def _paged_response(items, next_cursor):
+    """A törzs marad sima lista (GUI kompatibilitás), a cursor fejlécben utazik."""
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse(content=items, headers=headers)
+
 def set_core_reference(instance):
     global _internal_core
     _internal_core = instance
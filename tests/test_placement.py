@@ -0,0 +1,54 @@
+from src.placement import plan_placement, primary_gpu, compare_usage
+
+def test_pinned_slots_are_placed_first():
+    # Rögzítés nélkül a "big" best-fit alapján a 0-s GPU-ra kerülne, és a King kiszorulna
+    plan = plan_placement({"big": 9000, "king": 8000}, {0: 10000, 1: 20000}, pinned={"king": 0})
+    assert plan["assignments"] == {"king": {0: 8000}, "big": {1: 9000}}
+    assert plan["unplaced"] == []
+
+def test_pinned_slot_without_room_is_unplaced():
+    plan = plan_placement({"king": 12000, "valet": 4000}, {0: 10000, 1: 16000}, pinned={"king": 0})
+    assert plan["unplaced"] == ["king"]
+    assert plan["assignments"] == {"valet": {0: 4000}}
+
+def test_best_fit_decreasing():
+    # Csökkenő méret, mindig a legszűkebb elegendő eszköz: mindhárom elfér
+    plan = plan_placement({"a": 4000, "b": 3000, "c": 5000}, {0: 8000, 1: 5000})
+    assert plan["assignments"] == {"c": {1: 5000}, "a": {0: 4000}, "b": {0: 3000}}
+    assert plan["predicted_mb"] == {0: 7000, 1: 5000}
+    assert plan["free_mb"] == {0: 1000, 1: 0}
+    assert plan["unplaced"] == []
+
+def test_best_fit_tie_prefers_lower_gpu():
+    plan = plan_placement({"valet": 4000}, {1: 8000, 0: 8000})
+    assert plan["assignments"] == {"valet": {0: 4000}}
+
+def test_split_across_devices():
+    plan = plan_placement({"king": 15000}, {0: 10000, 1: 8000})
+    assert plan["assignments"] == {"king": {0: 10000, 1: 5000}}
+    assert plan["free_mb"] == {0: 0, 1: 3000}
+    assert primary_gpu(plan["assignments"]["king"]) == 0
+
+def test_split_disabled_leaves_slot_unplaced():
+    plan = plan_placement({"king": 15000}, {0: 10000, 1: 8000}, allow_split=False)
+    assert plan["assignments"] == {}
+    assert plan["unplaced"] == ["king"]
+
+def test_infeasible_plan():
+    plan = plan_placement({"king": 9000, "valet": 2000}, {0: 4000, 1: 4000})
+    assert plan["unplaced"] == ["king"]
+    assert plan["assignments"] == {"valet": {0: 2000}}
+    assert plan["predicted_mb"] == {0: 2000, 1: 0}
+
+def test_headroom_is_reserved():
+    plan = plan_placement({"king": 7500}, {0: 8000}, headroom_mb=1000)
+    assert plan["unplaced"] == ["king"]
+    assert plan["free_mb"] == {0: 7000}
+
+def test_compare_usage():
+    plan = plan_placement({"a": 4000, "b": 3000, "c": 5000}, {0: 8000, 1: 5000})
+    report = compare_usage(plan, {0: 7400})
+    assert report == {
+        0: {"predicted_mb": 7000, "actual_mb": 7400, "delta_mb": 400},
+        1: {"predicted_mb": 5000, "actual_mb": None, "delta_mb": None},
+    }
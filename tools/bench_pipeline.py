@@ -0,0 +1,321 @@
+"""
+SoulCore pipeline benchmark – valódi modellek nélkül (CPU-only gépen / CI-ban is fut).
+
+Az Orchestrator egy ideiglenes adatbázissal indul, a slotok helyén determinisztikus
+ál-slotok ülnek (beállítható prefill / dekódolási sebesség, tokenszám, hibainjektálás).
+A process_pipeline (vagy a stream változat) adott párhuzamossággal fut; az eredmény
+JSON: átbocsátás, p50/p95/p99 késleltetés, event loop késés, lépésenkénti idők.
+
+    python tools/bench_pipeline.py --requests 200 --concurrency 8 --out bench.json
+    python tools/bench_pipeline.py --requests 200 --concurrency 8 --compare bench.json
+
+A sebességek a --speed szorzóval skálázhatók (pl. --speed 10 a gyors CI futáshoz).
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import contextlib
+import tempfile
+import logging
+import threading
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.base_slot import BaseSlot
+from src.utils.event_log import get_event_log
+
+# Slotonkénti alapprofil: prompt feldolgozás és dekódolás tok/s-ban, válasz hossza tokenben
+DEFAULT_PROFILES = {
+    "scribe":     {"prefill_tps": 3000, "decode_tps": 120, "completion_tokens": 40,  "overhead_ms": 2},
+    "valet":      {"prefill_tps": 2500, "decode_tps": 90,  "completion_tokens": 80,  "overhead_ms": 2},
+    "translator": {"prefill_tps": 4000, "decode_tps": 150, "completion_tokens": 30,  "overhead_ms": 2},
+    "king":       {"prefill_tps": 800,  "decode_tps": 25,  "completion_tokens": 120, "overhead_ms": 5},
+}
+
+class FakeSlot(BaseSlot):
+    """
+    Determinisztikus ál-slot: a prompt szavai a prompt tokenek, a késleltetés
+    prefill (prompt / prefill_tps) + dekódolás (tokenek / decode_tps), alvással szimulálva
+    (a valódi backendhez hasonlóan a slot szálát foglalja, az event loopot nem).
+    """
+
+    def __init__(self, slot_name, profile, speed=1.0, fail_rate=0.0, seed=0):
+        super().__init__(slot_name, {"engine": "fake", "gpu_id": 0, "max_vram_mb": 0, "model_name": f"fake-{slot_name}"})
+        self.profile = profile
+        self.speed = speed
+        self.fail_rate = fail_rate
+        self._rng = random.Random(f"{seed}:{slot_name}")
+        self._rng_lock = threading.Lock()
+        self.failures = 0
+
+    def load(self):
+        self.is_loaded = True
+
+    def unload(self):
+        self.is_loaded = False
+
+    def _should_fail(self):
+        with self._rng_lock:
+            return self.fail_rate > 0 and self._rng.random() < self.fail_rate
+
+    def _tokens(self, prompt, params):
+        completion = min(self.profile["completion_tokens"], (params or {}).get("max_tokens", 10**6))
+        return max(1, len(prompt.split())), max(1, completion)
+
+    def _timed(self, prompt, params):
+        """Darabonként (token) adja a szöveget; a mérés a BaseSlot tokenszámlálásába kerül."""
+        if self._should_fail():
+            self.failures += 1
+            raise RuntimeError(f"{self.name}: injektált hiba")
+        prompt_tokens, completion_tokens = self._tokens(prompt, params)
+        started = time.perf_counter()
+        time.sleep((self.profile["overhead_ms"] / 1000 + prompt_tokens / self.profile["prefill_tps"]) / self.speed)
+        first_token_at = time.perf_counter()
+        step = 1 / self.profile["decode_tps"] / self.speed
+        try:
+            for i in range(completion_tokens):
+                if i: time.sleep(step)
+                yield i
+        finally:
+            self.record_generation(prompt_tokens, completion_tokens, started, first_token_at)
+
+    def generate(self, prompt, params=None):
+        n = sum(1 for _ in self._timed(prompt, params))
+        return " ".join(["tok"] * n)
+
+class FakeScribe(FakeSlot):
+    def memo_prompt(self, method, user_input):
+        return None  # a benchmark a modellt méri, nem a memo-t
+
+    def analyze(self, user_input):
+        self.generate(f"analyze {user_input}", {"max_tokens": 128})
+        return {"category": "chat", "intent": "question", "urgency": "low", "keywords": user_input}
+
+    def analyze_batch(self, user_inputs):
+        return [self.analyze(u) for u in user_inputs]
+
+    def run_synthesis(self, user_input, vault_data):
+        return self.generate(f"synthesis {user_input} {vault_data}", {"max_tokens": 64})
+
+class FakeValet(FakeSlot):
+    def run_report(self, vault_data, scribe_info, raw_input):
+        return self.generate(f"report {vault_data} {raw_input}", {"max_tokens": 256})
+
+class FakeSovereign(FakeSlot):
+    def _prompt(self, report, user_input):
+        return f"identity protocol {report} {user_input}"
+
+    def run_final(self, report, user_input, identity_data, session_id=None):
+        body = self.generate(self._prompt(report, user_input), {"max_tokens": 512})
+        return f"benchmark</note><message>{body}</message>"
+
+    def run_final_stream(self, report, user_input, identity_data, session_id=None):
+        yield "benchmark</note><message>"
+        for _ in self._timed(self._prompt(report, user_input), {"max_tokens": 512}):
+            yield "tok "
+        yield "</message>"
+
+SLOT_CLASSES = {"scribe": FakeScribe, "valet": FakeValet, "king": FakeSovereign, "translator": FakeSlot}
+
+def percentiles(values):
+    values = sorted(values)
+    if not values: return None
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"avg": round(sum(values) / len(values), 5), "p50": round(pick(0.50), 5), "p95": round(pick(0.95), 5),
+            "p99": round(pick(0.99), 5), "max": round(values[-1], 5)}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def build_orchestrator(workdir, args, profiles):
+    """Orchestrator ideiglenes DB-vel és ál-slotokkal (a boot_slots és a RAG modellek kimaradnak)."""
+    from src.orchestrator import Orchestrator
+    orch = Orchestrator(db_path=os.path.join(workdir, "bench.db"))
+    if not args.memo:
+        orch.stage_memo = None
+    for name, profile in profiles.items():
+        cls = SLOT_CLASSES.get(name, FakeSlot)
+        orch.slots[name] = cls(name, profile, speed=args.speed, fail_rate=args.fail_rate, seed=args.seed)
+        orch.slot_manager.ensure_loaded(name)
+
+    vault_sec = args.vault_ms / 1000 / args.speed
+    async def fake_vault(query_text, user_id=None, limit=None, trace=None):
+        # Vault keresés: I/O jellegű várakozás (nincs Qdrant / embedding modell)
+        with trace.span("vault.search") if trace else contextlib.nullcontext():
+            await asyncio.sleep(vault_sec)
+        return f"vault passages for {query_text}"
+    orch.db.aquery_vault = fake_vault
+    return orch
+
+@contextlib.contextmanager
+def fake_kernel(args, profiles=None):
+    """
+    Ál-slotos Orchestrator ideiglenes munkakönyvtárban (DB, napló, vault – a repó vault/ mappája
+    érintetlen marad); kilépéskor leáll és törlődik. `args`: speed, fail_rate, seed, vault_ms, memo.
+    """
+    profiles = profiles or {k: dict(v) for k, v in DEFAULT_PROFILES.items()}
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp(prefix="soulcore-bench-")
+    os.chdir(workdir)
+    orch = None
+    # Az indítási kiírások ne keveredjenek a stdout-ra írt JSON-nal
+    get_event_log(console=False)
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            orch = build_orchestrator(workdir, args, profiles)
+        yield orch
+    finally:
+        if orch:
+            with contextlib.redirect_stdout(sys.stderr):
+                orch.shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def loop_lag_probe(samples, stop, interval=0.01):
+    """Event loop késés: mennyivel ébred később egy `interval` hosszú alvás a vártnál."""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - expected))
+
+async def run_load(orch, args):
+    latencies, ttfts, stage_times, errors = [], [], {}, []
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def one(i):
+        query = f"benchmark kérdés {i % args.unique} a szuverén vár építéséről"
+        chat_id = f"bench-{i % max(1, args.chats)}"
+        started = time.perf_counter()
+        if args.stream:
+            result = None
+            async for event in orch.process_pipeline_stream(query, chat_id=chat_id, user_id="bench"):
+                if event["type"] == "done": result = event
+        else:
+            result = await orch.process_pipeline(query, chat_id=chat_id, user_id="bench")
+        latencies.append(time.perf_counter() - started)
+        meta = (result or {}).get("metadata", {})
+        if meta.get("ttft") is not None:
+            ttfts.append(meta["ttft"])
+        for stage, span in meta.get("stages", {}).items():
+            stage_times.setdefault(stage, []).append(span["end"] - span["start"])
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await one(i)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    lag, stop = [], asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(lag, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    return {
+        "requests": args.requests,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "wall_sec": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "latency_sec": percentiles(latencies),
+        "ttft_sec": percentiles(ttfts),
+        "loop_lag_ms": percentiles([v * 1000 for v in lag]),
+        "stages_sec": {stage: percentiles(v) for stage, v in sorted(stage_times.items())},
+        "slots": {name: {**slot.generation_stats(), "injected_failures": getattr(slot, "failures", 0)}
+                  for name, slot in orch.slots.items()},
+        "scheduler": orch.scheduler.stats(),
+    }
+
+def compare(current, baseline):
+    """Fő mutatók változása a korábbi futáshoz képest (pozitív = nagyobb érték)."""
+    def delta(path):
+        a, b = current, baseline
+        for key in path:
+            a = a.get(key) if isinstance(a, dict) else None
+            b = b.get(key) if isinstance(b, dict) else None
+        if a is None or b is None: return None
+        return {"current": a, "baseline": b, "change_pct": round((a - b) / b * 100, 2) if b else None}
+    keys = [("throughput_rps",), ("latency_sec", "p50"), ("latency_sec", "p95"), ("latency_sec", "p99"),
+            ("loop_lag_ms", "p99"), ("ttft_sec", "p95")]
+    return {"baseline_commit": baseline.get("commit"),
+            "metrics": {".".join(k): delta(("results",) + k) for k in keys}}
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="SoulCore pipeline benchmark ál-slotokkal.")
+    p.add_argument("--requests", type=int, default=100)
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--stream", action="store_true", help="process_pipeline_stream mérése")
+    p.add_argument("--speed", type=float, default=1.0, help="az ál-slotok sebesség szorzója")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="hívásonkénti hiba valószínűség (0-1)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--unique", type=int, default=10**9, help="különböző kérdések száma (ismétlés a cache-ekhez)")
+    p.add_argument("--chats", type=int, default=1, help="párhuzamos chat azonosítók száma")
+    p.add_argument("--vault-ms", type=float, default=15.0)
+    p.add_argument("--memo", action="store_true", help="stage memo bekapcsolva (alapból ki)")
+    p.add_argument("--profile", help="JSON fájl slot profilokkal (felülírja az alapértelmezést)")
+    p.add_argument("--out", help="eredmény JSON fájl (alapból stdout)")
+    p.add_argument("--compare", help="korábbi eredmény JSON, amihez képest a változás kiíródik")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    profiles = {k: dict(v) for k, v in DEFAULT_PROFILES.items()}
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            for name, override in json.load(f).items():
+                profiles.setdefault(name, dict(DEFAULT_PROFILES["valet"])).update(override)
+
+    out_path = os.path.abspath(args.out) if args.out else None
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with fake_kernel(args, profiles) as orch:
+        results = asyncio.run(run_load(orch, args))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "profiles": profiles,
+        "results": results,
+    }
+    if baseline:
+        report["comparison"] = compare(report, baseline)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"📊 {results['completed']}/{results['requests']} kérés, {results['throughput_rps']} req/s, "
+              f"p95 {results['latency_sec']['p95'] if results['latency_sec'] else '-'}s -> {out_path}")
+    else:
+        print(text)
+    return 1 if results["errors"] and not args.fail_rate else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Forgalom visszajátszó: a TrafficRecorder JSONL trace-ét (api.traffic_recorder) játssza vissza
+egy futó szerver ellen HTTP-n, vagy folyamaton belül ál-slotos Orchestratoron.
+
+A kérések az eredeti ütemezés szerint indulnak (nyílt hurok: nem várják meg egymást),
+--speed N esetén N-szer sűrítve. A kérdés szövege szintetikus, de a szószám, a chat
+újrahasznosítás (chat_turn), a felhasználók eloszlása és a stream / nem-stream arány
+a felvételt követi. Az eredmény JSON: késleltetés eloszlás, TTFT, hibaarány, indítási csúszás.
+
+    python tools/replay_traffic.py vault/traces/traffic.jsonl --url http://localhost:8000 \\
+        --user admin --password soulcore --speed 2 --out replay.json
+    python tools/replay_traffic.py vault/traces/traffic.jsonl --in-process --speed 10
+
+HTTP módban minden kérés a megadott felhasználóval fut (egy munkamenet); a felhasználók
+eloszlása csak folyamaton belüli módban játszódik vissza.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import http.cookiejar
+import urllib.request
+import urllib.error
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_pipeline import fake_kernel, percentiles, git_commit
+
+FILLER = ("vár kapu torony fal híd kert udvar terem kincs könyv levél térkép "
+          "tűz víz kő fa ég föld csillag hold nap szél eső hó").split()
+
+def synth_query(entry, index):
+    """Szintetikus kérdés az eredeti szószámmal; indexenként különböző (ne legyen hamis cache találat)."""
+    words = max(1, int(entry.get("query_words") or 1))
+    body = [FILLER[(index * 7 + i) % len(FILLER)] for i in range(max(0, words - 1))]
+    return " ".join([f"r{index}"] + body)
+
+def load_trace(path, limit=None):
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            entries.append(json.loads(line))
+            if limit and len(entries) >= limit: break
+    entries.sort(key=lambda e: e.get("t", 0))
+    if entries:
+        base = entries[0].get("t", 0)
+        for e in entries:
+            e["t"] = e.get("t", 0) - base
+    return entries
+
+class HttpTarget:
+    """Futó SoulCore szerver: /login munkamenet süti, majd /process (JSON vagy SSE)."""
+
+    def __init__(self, url, user, password, timeout):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self._post("/login", {"username": user, "password": password}).read()
+
+    def _post(self, path, payload):
+        req = urllib.request.Request(self.url + path, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        return self.opener.open(req, timeout=self.timeout)
+
+    def run(self, query, chat_id, user_id, stream):
+        """Visszatér: (státusz, TTFT vagy None). Blokkoló: szálkészletből hívjuk."""
+        started = time.perf_counter()
+        try:
+            resp = self._post("/process", {"query": query, "chat_id": chat_id, "stream": stream})
+        except urllib.error.HTTPError as e:
+            return e.code, None
+        with resp:
+            if not stream:
+                body = json.loads(resp.read() or b"{}")
+                return (500 if "error" in body else resp.status), None
+            ttft, status = None, 499
+            for raw in resp:
+                line = raw.decode("utf-8").strip()
+                if not line.startswith("data:"): continue
+                event = json.loads(line[5:])
+                if event.get("type") == "token" and ttft is None:
+                    ttft = time.perf_counter() - started
+                elif event.get("type") == "done":
+                    status = 200
+                elif event.get("type") == "error":
+                    status = 500
+            return status, ttft
+
+class InProcessTarget:
+    """Ál-slotos Orchestrator ugyanabban a folyamatban (lásd bench_pipeline.fake_kernel)."""
+
+    def __init__(self, orch):
+        self.orch = orch
+
+    async def run(self, query, chat_id, user_id, stream):
+        started = time.perf_counter()
+        if not stream:
+            await self.orch.process_pipeline(query, chat_id=chat_id, user_id=user_id)
+            return 200, None
+        ttft, status = None, 499
+        async for event in self.orch.process_pipeline_stream(query, chat_id=chat_id, user_id=user_id):
+            if event["type"] == "token" and ttft is None:
+                ttft = time.perf_counter() - started
+            elif event["type"] == "done":
+                status = 200
+        return status, ttft
+
+async def replay(entries, target, speed, max_concurrency):
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="Replay") \
+        if isinstance(target, HttpTarget) else None
+    limiter = asyncio.Semaphore(max_concurrency)
+    samples, send_lag = [], []
+
+    async def one(index, entry, scheduled):
+        query = synth_query(entry, index)
+        chat_id, user_id, stream = f"replay-{entry.get('chat')}", f"replay-{entry.get('user')}", bool(entry.get("stream"))
+        async with limiter:
+            send_lag.append(time.perf_counter() - scheduled)
+            started = time.perf_counter()
+            try:
+                if executor:
+                    status, ttft = await loop.run_in_executor(executor, target.run, query, chat_id, user_id, stream)
+                else:
+                    status, ttft = await target.run(query, chat_id, user_id, stream)
+            except Exception as e:
+                status, ttft = type(e).__name__, None
+            samples.append({"stream": stream, "status": status, "ttft": ttft,
+                            "latency": time.perf_counter() - started,
+                            "recorded_latency": entry.get("latency_sec")})
+
+    origin = time.perf_counter()
+    tasks = []
+    for index, entry in enumerate(entries):
+        scheduled = origin + entry["t"] / speed
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(index, entry, scheduled)))
+    await asyncio.gather(*tasks)
+    duration = time.perf_counter() - origin
+    if executor:
+        executor.shutdown(wait=False)
+    return samples, send_lag, duration
+
+def summarize(samples, send_lag, duration):
+    ok = [s for s in samples if s["status"] == 200]
+    statuses = {}
+    for s in samples:
+        statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+    by_mode = {}
+    for mode, flag in (("process", False), ("stream", True)):
+        group = [s["latency"] for s in ok if s["stream"] == flag]
+        if group:
+            by_mode[mode] = percentiles(group)
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "status_counts": statuses,
+        "duration_sec": round(duration, 3),
+        "throughput_rps": round(len(ok) / duration, 3) if duration else None,
+        "latency_sec": percentiles([s["latency"] for s in ok]),
+        "latency_by_mode": by_mode,
+        "ttft_sec": percentiles([s["ttft"] for s in ok if s["ttft"] is not None]),
+        "recorded_latency_sec": percentiles([s["recorded_latency"] for s in samples if s["recorded_latency"] is not None]),
+        "send_lag_ms": percentiles([v * 1000 for v in send_lag]),
+    }
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="SoulCore forgalom visszajátszás trace-ből.")
+    p.add_argument("trace", help="TrafficRecorder JSONL fájl")
+    p.add_argument("--speed", type=float, default=1.0, help="időskála szorzó (2 = kétszer sűrűbb forgalom)")
+    p.add_argument("--limit", type=int, help="csak az első N kérés")
+    p.add_argument("--max-concurrency", type=int, default=64, help="egyszerre futó kérések felső korlátja")
+    p.add_argument("--url", help="futó szerver címe (pl. http://localhost:8000)")
+    p.add_argument("--user", default="admin")
+    p.add_argument("--password", default=os.environ.get("SOULCORE_PASSWORD", ""))
+    p.add_argument("--timeout", type=float, default=300.0)
+    p.add_argument("--in-process", action="store_true", help="ál-slotos Orchestrator a folyamaton belül")
+    # Az ál-slotok beállításai (--in-process), a bench_pipeline-nal azonos jelentéssel
+    p.add_argument("--slot-speed", dest="speed_slots", type=float, default=1.0)
+    p.add_argument("--fail-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--vault-ms", type=float, default=15.0)
+    p.add_argument("--memo", action="store_true")
+    p.add_argument("--out", help="eredmény JSON fájl (alapból stdout)")
+    args = p.parse_args(argv)
+    if bool(args.url) == bool(args.in_process):
+        p.error("pontosan egy cél kell: --url vagy --in-process")
+    if args.speed <= 0:
+        p.error("--speed > 0 kell")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    entries = load_trace(args.trace, args.limit)
+    if not entries:
+        print("A trace üres.", file=sys.stderr)
+        return 1
+    out_path = os.path.abspath(args.out) if args.out else None
+
+    if args.in_process:
+        kernel_args = argparse.Namespace(speed=args.speed_slots, fail_rate=args.fail_rate, seed=args.seed,
+                                         vault_ms=args.vault_ms, memo=args.memo)
+        with fake_kernel(kernel_args) as orch:
+            samples, send_lag, duration = asyncio.run(
+                replay(entries, InProcessTarget(orch), args.speed, args.max_concurrency))
+    else:
+        target = HttpTarget(args.url, args.user, args.password, args.timeout)
+        samples, send_lag, duration = asyncio.run(replay(entries, target, args.speed, args.max_concurrency))
+
+    results = summarize(samples, send_lag, duration)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "trace": os.path.abspath(args.trace),
+        "target": args.url or "in-process",
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "password", "trace")},
+        "trace_span_sec": round(entries[-1]["t"], 3),
+        "users": len({e.get("user") for e in entries}),
+        "chats": len({e.get("chat") for e in entries}),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"🔁 {results['ok']}/{results['requests']} sikeres, hibaarány {results['error_rate']}, "
+              f"p95 {results['latency_sec']['p95'] if results['latency_sec'] else '-'}s -> {out_path}")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())